@@ -16,29 +16,69 @@ Description: تطبيق ويب تفاعلي يختبر مشاعر الحب ال
 """
 
 # ==================== المكتبات والاستيراد ====================
+import time
+# بداية قياس زمن الإقلاع البارد (قبل استيراد Flask)
+PROCESS_STARTED = time.perf_counter()
+
 from flask import (
     Flask, render_template, request, jsonify, 
-    redirect, url_for, session
+    redirect, url_for, session, Response, stream_with_context, has_request_context
 )
 import os
+import sys
 from functools import wraps
+from contextlib import contextmanager
+import click
 import secrets
+import re
 import json
-from datetime import datetime
+from json.encoder import encode_basestring
+import csv
+import io
+import codecs
+import hashlib
+import importlib
+import random
+import threading
+import queue
+import atexit
+import uuid
+import bisect
+import tempfile
+import shutil
+import hmac
+import contextvars
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
+
+# Brotli اختياري - بدونه نكتفي بـ gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-# Database imports
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import psycopg2.pool
+# مصغّرات اختيارية للأصول الثابتة - بدونها تُخدم الأصول كما هي (مضغوطة فقط)
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
+from werkzeug.http import quote_etag
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+# Load environment variables (Vercel يحقن المتغيرات مباشرة فلا حاجة لقراءة .env)
+if not os.environ.get('VERCEL'):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 
 # ==================== تهيئة التطبيق ====================
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
 
 
 # ==================== الإعدادات والثوابت ====================
@@ -46,35 +86,456 @@ class Config:
     """إعدادات التطبيق - يستخدم متغيرات البيئة"""
     DATABASE_URL = os.environ.get('DATABASE_URL')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', '0000')
+    # مفتاح الجلسات ورموز الاختبار: مطلوب مع DATABASE_URL (انظر validate_secret_key)؛
+    # بدونه مفتاح عشوائي لكل عملية (للتطوير المحلي فقط)
+    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+    SECRET_KEY_CONFIGURED = bool(os.environ.get('SECRET_KEY'))
     MAX_QUESTIONS = 100
     
-    # التحقق من وجود DATABASE_URL
-    if not DATABASE_URL:
-        raise ValueError("❌ DATABASE_URL environment variable is not set. "
-                        "Please add it to your Vercel environment variables.")
+    # الاستيراد الجماعي
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    IMPORT_MAX_ERRORS = 50
+    
+    # حفظ الإرسالات في الخلفية
+    PERSIST_SUBMISSIONS = os.environ.get('PERSIST_SUBMISSIONS', '1') != '0'
+    SUBMISSION_QUEUE_SIZE = int(os.environ.get('SUBMISSION_QUEUE_SIZE', 10000))
+    SUBMISSION_BATCH_SIZE = int(os.environ.get('SUBMISSION_BATCH_SIZE', 500))
+    SUBMISSION_FLUSH_INTERVAL = float(os.environ.get('SUBMISSION_FLUSH_INTERVAL', 1.0))
+    SUBMISSION_ENQUEUE_TIMEOUT = float(os.environ.get('SUBMISSION_ENQUEUE_TIMEOUT', 0.05))
+    SUBMISSION_SHUTDOWN_TIMEOUT = float(os.environ.get('SUBMISSION_SHUTDOWN_TIMEOUT', 10))
+    
+    # ترتيب النتائج (المئين والمركز) من مدرج تكراري في الذاكرة
+    RANKING_ENABLED = os.environ.get('RANKING_ENABLED', '1') != '0'
+    RANKING_SYNC_INTERVAL = float(os.environ.get('RANKING_SYNC_INTERVAL', 30))   # مزامنة محاولات العمال الآخرين
+    RANKING_SETTLE_SECONDS = float(os.environ.get('RANKING_SETTLE_SECONDS', 10))  # مهلة وصول الإرسالات للقاعدة
+    # لقطة المدرج حتى لا تعيد العملية الجديدة حساب كل المحاولات ('' = معطلة)
+    RANKING_SNAPSHOT_PATH = os.environ.get(
+        'RANKING_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'quiz_ranking.json')
+    )
+    
+    # الاختبارات القصيرة العشوائية (0 = جميع الأسئلة بالترتيب كما في السابق)
+    QUIZ_SIZE = int(os.environ.get('QUIZ_SIZE', 0))
+    QUIZ_TOKEN_MAX_AGE = int(os.environ.get('QUIZ_TOKEN_MAX_AGE', 6 * 3600))
+    
+    # الذاكرة المؤقتة للأسئلة (بالثواني)
+    QUESTION_CACHE_TTL = float(os.environ.get('QUESTION_CACHE_TTL', 300))
+    QUESTION_CACHE_CHECK_INTERVAL = float(os.environ.get('QUESTION_CACHE_CHECK_INTERVAL', 2))
+    
+    # مدة تخزين /api/questions في المتصفح (0 = إعادة التحقق دائماً عبر ETag)
+    QUESTIONS_HTTP_MAX_AGE = int(os.environ.get('QUESTIONS_HTTP_MAX_AGE', 0))
+    
+    # تضمين الأسئلة داخل الصفحة الرئيسية حتى لا يحتاج quiz.js لطلب ثانٍ
+    INLINE_QUESTIONS = os.environ.get('INLINE_QUESTIONS', '1') != '0'
+    
+    # لقطات JSON ثابتة للأسئلة تُنشر بعد كل تعديل (فارغ = معطل)
+    SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '')
+    # الرابط العام لـ SNAPSHOT_DIR (CDN أو nginx)؛ عند ضبطه يحوّل /api/questions إلى اللقطة
+    SNAPSHOT_URL_PREFIX = os.environ.get('SNAPSHOT_URL_PREFIX', '')
+    SNAPSHOT_PAGE_SIZE = int(os.environ.get('SNAPSHOT_PAGE_SIZE', 50))
+    SNAPSHOT_KEEP = int(os.environ.get('SNAPSHOT_KEEP', 5))          # عدد الإصدارات المحتفظ بها
+    
+    # الأصول الثابتة: تصغير وأسماء ببصمة المحتوى وتخزين immutable لمدة سنة
+    ASSETS_FINGERPRINT = os.environ.get('ASSETS_FINGERPRINT', '1') != '0'
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))
+    # ناتج flask build-assets؛ إن لم يوجد أو كان قديماً تُبنى الأصول في الذاكرة عند أول استخدام
+    ASSETS_BUILD_DIR = os.environ.get(
+        'ASSETS_BUILD_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'dist')
+    )
+    
+    # مجمع الاتصالات
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 20))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))          # مهلة انتظار اتصال (ثوانٍ)
+    DB_POOL_MAX_AGE = float(os.environ.get('DB_POOL_MAX_AGE', 1800))       # أقصى عمر للاتصال (ثوانٍ)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') != '0'      # فحص الاتصال قبل تسليمه
+    DB_POOL_PING_AFTER = float(os.environ.get('DB_POOL_PING_AFTER', 10))   # فحص فقط إذا كان خاملاً أكثر من هذا
+    
+    # عبارات محضّرة على الخادم للاستعلامات الساخنة
+    # (عطّلها مع pgbouncer بوضع transaction، مثل منفذ 6543 في Supabase)
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') != '0'
+    
+    # نسخ القراءة (read replicas) مفصولة بفواصل؛ القراءات تذهب إليها والكتابات إلى DATABASE_URL
+    DATABASE_REPLICA_URLS = [
+        url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+    ]
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))                  # أقصى تأخر مقبول (ثوانٍ)
+    REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))    # فحص الصحة والتأخر
+    # القراءات بعد كتابة في نفس الجلسة (أو نفس العملية) تذهب للأساسي خلال هذه المدة
+    READ_AFTER_WRITE_WINDOW = float(os.environ.get('READ_AFTER_WRITE_WINDOW', 5))
+    
+    # محرك التخزين: 'postgres' (الافتراضي)، 'sqlite' (ملف محلي بوضع WAL) أو 'memory'
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgres').lower()
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'quiz.db')
+    # أسئلة أولية لمحركات sqlite/memory عندما يكون المخزن فارغاً
+    STORAGE_SEED_FILE = os.environ.get(
+        'STORAGE_SEED_FILE',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'questions_ar.json')
+    )
+    
+    # الإقلاع البارد: إنشاء الجداول الناقصة عند أول استخدام لقاعدة البيانات
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', '1') != '0'
+    # لقطة أسئلة مرفقة مع النشر تخدم الطلبات الأولى بدون قاعدة البيانات
+    # (مثلاً ناتج: flask export-questions snapshot.json --format json)
+    QUESTION_WARM_FILE = os.environ.get('QUESTION_WARM_FILE', '')
+    
+    # الطبقة الثانية للذاكرة المؤقتة: خادم بروتوكول Redis مشترك بين العمال والنسخ
+    # (redis://host:6379/0؛ و fakeredis:// للاختبار داخل العملية). فارغ = معطل
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', '')
+    # بادئة المفاتيح؛ غيّرها مع كل نشر يغيّر القوالب أو شكل الحمولات
+    CACHE_NAMESPACE = os.environ.get('CACHE_NAMESPACE') or os.environ.get('VERCEL_GIT_COMMIT_SHA', '')[:12] or 'quiz'
+    CACHE_SHARED_TTL = int(os.environ.get('CACHE_SHARED_TTL', 3600))             # عمر المفاتيح (ثوانٍ)
+    CACHE_LOCK_TIMEOUT = float(os.environ.get('CACHE_LOCK_TIMEOUT', 10))         # مدة قفل single-flight
+    CACHE_SUBSCRIBE = os.environ.get('CACHE_SUBSCRIBE', '1') != '0'              # الاستماع لرسائل الإبطال
+    CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', 32))  # حجم LRU المحلي للحمولات
+    
+    # عدد الـ proxies الموثوقة أمام التطبيق (مثل ProxyFix(x_for=N)): عنوان العميل هو
+    # المدخل N من يمين X-Forwarded-For؛ 0 = عنوان الاتصال. TRUST_FORWARDED_FOR=1 القديم = 1
+    PROXY_COUNT_CONFIGURED = bool(
+        os.environ.get('TRUSTED_PROXY_COUNT') or os.environ.get('TRUST_FORWARDED_FOR') or os.environ.get('VERCEL')
+    )
+    TRUSTED_PROXY_COUNT = int(os.environ.get(
+        'TRUSTED_PROXY_COUNT', os.environ.get('TRUST_FORWARDED_FOR', '1' if os.environ.get('VERCEL') else '0')
+    ))
+    # تحديد المعدل لكل مسار: endpoint=requests/seconds[:burst] مفصولة بفواصل (فارغ = معطل).
+    # الحدود الافتراضية فقط إذا عُرف عدد الـ proxies: خلف nginx أو موازن حمل بدون
+    # TRUSTED_PROXY_COUNT يظهر كل المستخدمين بعنوان الـ proxy ويتشاركون دلواً واحداً
+    RATE_LIMITS = os.environ.get(
+        'RATE_LIMITS', 'submit_quiz=30/60:10,get_quiz=120/60:30' if PROXY_COUNT_CONFIGURED else ''
+    )
+    RATE_LIMIT_MAX_CLIENTS = int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 100000))   # حد الذاكرة (LRU)
+    # إعادة نفس النتيجة للإرسال المكرر خلال هذه المدة بدون تصحيح أو حفظ جديد (0 = معطل)
+    SUBMIT_DEDUP_WINDOW = float(os.environ.get('SUBMIT_DEDUP_WINDOW', 60))
+    SUBMIT_DEDUP_MAX_ENTRIES = int(os.environ.get('SUBMIT_DEDUP_MAX_ENTRIES', 50000))
+    
+    # مقاييس الطلبات و /metrics (بصيغة Prometheus)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    # رمز Bearer لجامع المقاييس (بديل عن جلسة المسؤول)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    # تسجيل الطلبات الأبطأ من هذا الحد مع تفصيل الاستعلامات (0 = معطل)
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+    
+    # المحلل الإحصائي (معطل افتراضياً؛ يُشغَّل أيضاً من /api/admin/profiler)
+    # نسبة الطلبات التي تُجمع عيناتها في مجاميع كل مسار
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    # الطلبات الأطول من هذا الحد تُحفظ بتحليل كامل (0 = معطل)
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+    PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+    # حد المكدسات المختلفة المحفوظة (الزائد يُحسب في إطار [truncated])
+    PROFILE_MAX_STACKS = int(os.environ.get('PROFILE_MAX_STACKS', 20000))
+    PROFILE_SLOW_KEEP = int(os.environ.get('PROFILE_SLOW_KEEP', 20))
+    
+    @staticmethod
+    def validate():
+        """التحقق من الإعدادات المطلوبة عند أول استخدام لقاعدة البيانات (وليس عند الاستيراد)"""
+        if Config.STORAGE_BACKEND not in ('postgres', 'sqlite', 'memory'):
+            raise ValueError(f"❌ Unknown STORAGE_BACKEND '{Config.STORAGE_BACKEND}'. "
+                            "Use 'postgres', 'sqlite' or 'memory'.")
+        
+        # التحقق من وجود DATABASE_URL (مطلوب فقط لمحرك postgres)
+        if Config.STORAGE_BACKEND == 'postgres' and not Config.DATABASE_URL:
+            raise ValueError("❌ DATABASE_URL environment variable is not set. "
+                            "Please add it to your Vercel environment variables.")
+    
+    @staticmethod
+    def validate_secret_key():
+        """
+        التحقق من SECRET_KEY عند الاستيراد (قبل أي طلب)
+        
+        نشر حقيقي: مفتاح عشوائي لكل عملية يكسر الجلسات بين العمال، ومفتاح مشتق
+        من أسرار أخرى يسمح بتزوير جلسة المسؤول لمن يعرفها؛ لذلك يفشل الإقلاع
+        برسالة واضحة بدلاً من 500 في كل طلب يصل لقاعدة البيانات.
+        
+        Raises:
+            ValueError: DATABASE_URL معرّف بدون SECRET_KEY
+        """
+        if Config.DATABASE_URL and not Config.SECRET_KEY_CONFIGURED:
+            raise ValueError("❌ SECRET_KEY environment variable is not set. "
+                            "It is required with DATABASE_URL; use a long random value "
+                            "(python -c \"import secrets; print(secrets.token_hex(32))\").")
 
 
+Config.validate_secret_key()
+app.secret_key = Config.SECRET_KEY
+
 # ==================== اتصال قاعدة البيانات ====================
+
+# psycopg2 يُستورد عند أول استخدام لـ Postgres (ConnectionPool أو PostgresBackend)
+# فلا تدفع محركات sqlite/memory ولا الإقلاع البارد كلفة تحميله
+psycopg2 = None
+RealDictCursor = None
+execute_values = None
+PoolTimeoutError = None
+PreparingConnection = None
+_psycopg2_lock = threading.Lock()
+
+
+def load_psycopg2():
+    """
+    استيراد psycopg2 وتعريف الفئات المبنية عليه (مرة واحدة لكل عملية)
+    
+    Returns:
+        module: psycopg2
+    """
+    global psycopg2, RealDictCursor, execute_values, PoolTimeoutError, PreparingConnection
+    if psycopg2 is not None:
+        return psycopg2
+    with _psycopg2_lock:
+        if psycopg2 is not None:
+            return psycopg2
+        driver = importlib.import_module('psycopg2')
+        extras = importlib.import_module('psycopg2.extras')
+        for submodule in ('psycopg2.pool', 'psycopg2.extensions', 'psycopg2.errors'):
+            importlib.import_module(submodule)
+        
+        class PoolTimeoutError(driver.pool.PoolError):
+            """انتهت مهلة انتظار اتصال متاح من pool"""
+        
+        class PreparingConnection(driver.extensions.connection):
+            """اتصال يتذكر أسماء العبارات المحضّرة عليه (PREPARE مرة واحدة لكل اتصال)"""
+            
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+        
+        RealDictCursor = extras.RealDictCursor
+        execute_values = extras.execute_values
+        Database.add_errors(driver.Error)
+        # آخر تعيين: الخيوط الأخرى تفحص psycopg2 وحده قبل القفل
+        psycopg2 = driver
+    return psycopg2
+
+
+class ConnectionPool:
+    """
+    مجمع اتصالات آمن للخيوط مع مهلة انتظار وفحص صحة وإعادة تدوير
+    Thread-safe connection pool with checkout timeout, pre-ping and recycling
+    
+    بديل لـ SimpleConnectionPool (غير آمن للخيوط) مع نفس واجهة getconn/putconn.
+    """
+    
+    def __init__(self, dsn, min_size=1, max_size=20, timeout=5.0,
+                 max_age=1800.0, pre_ping=True, ping_after=10.0):
+        load_psycopg2()
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.pre_ping = pre_ping
+        self.ping_after = ping_after
+        
+        self._cond = threading.Condition()
+        self._idle = []       # [(conn, created_at, last_used)] - LIFO
+        self._created = {}    # id(conn) -> created_at للاتصالات المستخدمة
+        self._size = 0        # جميع الاتصالات المفتوحة (خاملة + مستخدمة)
+        self._in_use = 0
+        self._closed = False
+        
+        # المقاييس
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.timeouts = 0
+        self.recycled = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        
+        for _ in range(min_size):
+            now = time.monotonic()
+            self._idle.append((self._connect(), now, now))
+            self._size += 1
+    
+    def _connect(self):
+        """فتح اتصال جديد"""
+        return psycopg2.connect(self.dsn, connection_factory=PreparingConnection)
+    
+    @staticmethod
+    def _discard(conn):
+        """إغلاق اتصال بدون رفع أخطاء"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+    
+    def _is_usable(self, conn, created_at, last_used, now):
+        """هل الاتصال الخامل صالح للتسليم؟"""
+        if conn.closed:
+            return False
+        if self.max_age and now - created_at >= self.max_age:
+            self.recycled += 1
+            return False
+        if self.pre_ping and now - last_used >= self.ping_after:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('SELECT 1')
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+    
+    def getconn(self):
+        """
+        الحصول على اتصال (ينتظر حتى timeout ثم يرفع PoolTimeoutError)
+        
+        Returns:
+            connection: اتصال psycopg2
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.pool.PoolError("connection pool is closed")
+                if self._idle:
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn, created_at, last_used = None, None, None
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    self.checkout_failures += 1
+                    raise PoolTimeoutError(
+                        f"timed out after {self.timeout}s waiting for a connection "
+                        f"({self._in_use}/{self.max_size} in use)"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self.checkouts += 1
+            self.wait_time_total += waited
+            if waited > self.wait_time_max:
+                self.wait_time_max = waited
+        Metrics.record_pool_wait(waited)
+        
+        # الاتصال والفحص خارج القفل حتى لا تُحجب الخيوط الأخرى
+        try:
+            now = time.monotonic()
+            if conn is not None and not self._is_usable(conn, created_at, last_used, now):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                created_at = time.monotonic()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self.checkout_failures += 1
+                self._cond.notify()
+            raise
+        
+        self._created[id(conn)] = created_at
+        return conn
+    
+    def putconn(self, conn, close=False):
+        """
+        إرجاع اتصال إلى pool (الاتصالات المعطوبة تُغلق ولا تُعاد)
+        
+        Args:
+            conn: الاتصال
+            close (bool): إغلاق الاتصال بدلاً من إعادته
+        """
+        created_at = self._created.pop(id(conn), time.monotonic())
+        
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        
+        with self._cond:
+            self._in_use -= 1
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+    
+    def closeall(self):
+        """إغلاق جميع الاتصالات الخاملة ورفض أي طلبات جديدة"""
+        with self._cond:
+            self._closed = True
+            for conn, _, _ in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+    
+    def stats(self):
+        """مقاييس pool"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'timeouts': self.timeouts,
+                'recycled': self.recycled,
+                'wait_time_total': round(self.wait_time_total, 6),
+                'wait_time_max': round(self.wait_time_max, 6),
+                'wait_time_avg': round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0
+            }
+
+
 class Database:
     """فئة للتعامل مع قاعدة البيانات"""
     
+    # أخطاء قاعدة البيانات من أي محرك تخزين (يُضاف كل نوع عند تحميل مكتبته)
+    ERRORS = ()
+    _errors_lock = threading.Lock()
+    
     _connection_pool = None
+    _pool_lock = threading.Lock()
+    _backend = None
+    _statement_stats = {}      # name -> [calls, errors, rows, total_seconds, max_seconds]
+    _stats_lock = threading.Lock()
+    _backend_lock = threading.Lock()
+    
+    @staticmethod
+    def add_errors(*errors):
+        """إضافة أنواع أخطاء مكتبة قاعدة بيانات حُمّلت للتو إلى Database.ERRORS"""
+        with Database._errors_lock:
+            Database.ERRORS = Database.ERRORS + tuple(e for e in errors if e not in Database.ERRORS)
     
     @staticmethod
     def get_pool():
-        """الحصول على connection pool"""
+        """الحصول على connection pool (يُنشأ مرة واحدة حتى مع الطلبات المتزامنة)"""
         if Database._connection_pool is None:
-            try:
-                Database._connection_pool = psycopg2.pool.SimpleConnectionPool(
-                    1, 20,
-                    Config.DATABASE_URL
-                )
-                print("✅ Database connection pool created successfully")
-            except psycopg2.Error as e:
-                print(f"❌ Database connection error: {e}")
-                raise
+            # قبل أي except psycopg2.Error في المستدعين
+            load_psycopg2()
+            with Database._pool_lock:
+                if Database._connection_pool is None:
+                    Config.validate()
+                    try:
+                        Database._connection_pool = ConnectionPool(
+                            Config.DATABASE_URL,
+                            min_size=Config.DB_POOL_MIN_SIZE,
+                            max_size=Config.DB_POOL_MAX_SIZE,
+                            timeout=Config.DB_POOL_TIMEOUT,
+                            max_age=Config.DB_POOL_MAX_AGE,
+                            pre_ping=Config.DB_POOL_PRE_PING,
+                            ping_after=Config.DB_POOL_PING_AFTER
+                        )
+                        print("✅ Database connection pool created successfully")
+                    except psycopg2.Error as e:
+                        print(f"❌ Database connection error: {e}")
+                        raise
         return Database._connection_pool
     
+    @staticmethod
+    def pool_stats():
+        """مقاييس pool (أو None إذا لم يُنشأ بعد)"""
+        pool = Database._connection_pool
+        return pool.stats() if pool is not None else None
+    
     @staticmethod
     def get_connection():
         """الحصول على اتصال من pool"""
@@ -92,34 +553,50 @@ class Database:
             Database.get_pool().putconn(conn)
     
     @staticmethod
-    def execute_query(query, params=None, fetch=False):
-        """تنفيذ استعلام مع معالجة الأخطاء"""
-        conn = None
+    def _query_on(pool, query, params, fetch):
+        """تنفيذ استعلام على اتصال من pool محدد (صفوف كـ dict)"""
+        conn = pool.getconn()
         try:
-            conn = Database.get_connection()
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute(query, params or ())
-                
-                if fetch:
-                    result = cur.fetchall()
-                    conn.commit()
-                    return result
-                else:
-                    conn.commit()
-                    return True
-        except psycopg2.Error as e:
-            if conn:
+                result = cur.fetchall() if fetch else True
+            conn.commit()
+            return result
+        except psycopg2.Error:
+            if not conn.closed:
                 conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+    
+    @staticmethod
+    def execute_query(query, params=None, fetch=False, readonly=False):
+        """تنفيذ استعلام مع معالجة الأخطاء (readonly=True يسمح بتوجيهه لنسخة قراءة مع الرجوع للأساسي)"""
+        started = time.perf_counter()
+        try:
+            pool, replica = ReplicaRouter.read_pool() if readonly else (Database.get_pool(), None)
+            try:
+                result = Database._query_on(pool, query, params, fetch)
+            except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+                if replica is None:
+                    raise
+                # كما في execute_prepared: نستبعد النسخة حتى الفحص التالي ونقرأ من الأساسي
+                ReplicaRouter.mark_failed(replica, e)
+                result = Database._query_on(Database.get_pool(), query, params, fetch)
+            if not readonly:
+                ReplicaRouter.record_write()
+            return result
+        except psycopg2.Error as e:
             print(f"❌ Database error: {e}")
             raise
         finally:
-            if conn:
-                Database.return_connection(conn)
+            Metrics.record_query('execute_query', time.perf_counter() - started)
     
     @staticmethod
     def execute_query_one(query, params=None):
         """تنفيذ استعلام وإرجاع صف واحد فقط"""
         conn = None
+        started = time.perf_counter()
         try:
             conn = Database.get_connection()
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
@@ -128,149 +605,4834 @@ class Database:
                 conn.commit()
                 return result
         except psycopg2.Error as e:
-            if conn:
+            if conn and not conn.closed:
                 conn.rollback()
             print(f"❌ Database error: {e}")
             raise
         finally:
+            Metrics.record_query('execute_query_one', time.perf_counter() - started)
             if conn:
                 Database.return_connection(conn)
     
     @staticmethod
-    def init_db():
-        """إنشء جداول قاعدة البيانات إذا لم تكن موجودة"""
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS questions (
-            id SERIAL PRIMARY KEY,
-            type VARCHAR(10) NOT NULL,
-            question TEXT NOT NULL,
-            options JSONB NOT NULL,
-            correct_answer TEXT NOT NULL,
-            category VARCHAR(50) DEFAULT 'رومانسي',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
+    def _server_params(query):
+        """تحويل علامات %s إلى $1, $2, ... لـ PREPARE"""
+        parts = query.split('%s')
+        return parts[0] + ''.join(f'${i}{part}' for i, part in enumerate(parts[1:], 1))
+    
+    @staticmethod
+    def _run_prepared(conn, cur, name, query, params):
+        """PREPARE عند أول استخدام على هذا الاتصال ثم EXECUTE"""
+        prepared = conn.prepared
+        execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {name}"
+        for retry in (False, True):
+            try:
+                if name not in prepared:
+                    cur.execute(f"PREPARE {name} AS {Database._server_params(query)}")
+                    prepared.add(name)
+                cur.execute(execute_sql, params)
+                return
+            except (psycopg2.errors.DuplicatePreparedStatement,
+                    psycopg2.errors.InvalidSqlStatementName) as e:
+                # حالة الخادم لا تطابق ما نتذكره (اتصال خادم مختلف خلف pooler مثلاً)
+                if retry:
+                    raise
+                conn.rollback()
+                if isinstance(e, psycopg2.errors.DuplicatePreparedStatement):
+                    prepared.add(name)
+                else:
+                    prepared.discard(name)
+    
+    @staticmethod
+    def _record_statement(name, elapsed, rows, failed):
+        """تحديث عدادات التوقيت للعبارة"""
+        with Database._stats_lock:
+            stats = Database._statement_stats.get(name)
+            if stats is None:
+                stats = Database._statement_stats[name] = [0, 0, 0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += failed
+            stats[2] += rows
+            stats[3] += elapsed
+            if elapsed > stats[4]:
+                stats[4] = elapsed
+        Metrics.record_query(name, elapsed)
+    
+    @staticmethod
+    def _execute_on(pool, name, query, params, fetch):
+        """تنفيذ عبارة على اتصال من pool محدد"""
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                if Config.DB_PREPARED_STATEMENTS and isinstance(conn, PreparingConnection):
+                    Database._run_prepared(conn, cur, name, query, params)
+                else:
+                    cur.execute(query, params)
+                if fetch == 'all':
+                    result = cur.fetchall()
+                elif fetch == 'one':
+                    result = cur.fetchone()
+                else:
+                    result = cur.rowcount
+            conn.commit()
+            return result
+        except psycopg2.Error:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn)
+    
+    @staticmethod
+    def execute_prepared(name, query, params=(), fetch='all', readonly=False):
+        """
+        تنفيذ عبارة ساخنة كعبارة محضّرة وإرجاع الصفوف كـ tuples
         
-        CREATE INDEX IF NOT EXISTS idx_questions_id ON questions(id);
+        Args:
+            name (str): اسم العبارة (معرّف SQL ومفتاح عدادات التوقيت)
+            query (str): SQL بعلامات %s
+            params (tuple): القيم
+            fetch (str): 'all' أو 'one' أو None (عدد الصفوف المتأثرة)
+            readonly (bool): قراءة يمكن توجيهها لنسخة قراءة (مع الرجوع للأساسي عند الفشل)
+        
+        Returns:
+            list, tuple or int: حسب fetch
         """
+        rows = 0
+        failed = False
+        started = time.perf_counter()
         try:
-            Database.execute_query(create_table_sql)
-            print("✅ Database tables initialized successfully")
+            pool, replica = ReplicaRouter.read_pool() if readonly else (Database.get_pool(), None)
+            try:
+                result = Database._execute_on(pool, name, query, params, fetch)
+            except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+                if replica is None:
+                    raise
+                # النسخة غير متاحة: نستبعدها حتى الفحص التالي ونقرأ من الأساسي
+                ReplicaRouter.mark_failed(replica, e)
+                result = Database._execute_on(Database.get_pool(), name, query, params, fetch)
+            if fetch == 'all':
+                rows = len(result)
+            elif fetch == 'one':
+                rows = int(result is not None)
+            else:
+                rows = result
+            if not readonly:
+                ReplicaRouter.record_write()
+            return result
+        except psycopg2.Error as e:
+            failed = True
+            print(f"❌ Database error ({name}): {e}")
+            raise
+        finally:
+            Database._record_statement(name, time.perf_counter() - started, rows, failed)
+    
+    @staticmethod
+    def statement_stats():
+        """عدادات التوقيت لكل عبارة"""
+        with Database._stats_lock:
+            items = [(name, list(stats)) for name, stats in Database._statement_stats.items()]
+        return {
+            name: {
+                'calls': calls,
+                'errors': errors,
+                'rows': rows,
+                'total_ms': round(total * 1000, 3),
+                'avg_ms': round(total / calls * 1000, 3) if calls else 0.0,
+                'max_ms': round(max_time * 1000, 3)
+            }
+            for name, (calls, errors, rows, total, max_time) in sorted(items)
+        }
+    
+    @staticmethod
+    @contextmanager
+    def transaction(cursor_factory=None):
+        """
+        تنفيذ عدة عمليات في معاملة واحدة على اتصال واحد
+        
+        Usage:
+            with Database.transaction() as cur:
+                cur.execute(...)
+        
+        يتم commit عند النجاح و rollback عند أي استثناء.
+        """
+        conn = None
+        started = time.perf_counter()
+        try:
+            conn = Database.get_connection()
+            with conn.cursor(cursor_factory=cursor_factory) as cur:
+                yield cur
+            conn.commit()
+            ReplicaRouter.record_write()
         except Exception as e:
-            print(f"⚠️ Database init warning: {e}")
+            if conn and not conn.closed:
+                conn.rollback()
+            if isinstance(e, psycopg2.Error):
+                print(f"❌ Database error: {e}")
+            raise
+        finally:
+            Metrics.record_query('transaction', time.perf_counter() - started)
+            if conn:
+                Database.return_connection(conn)
+    
+    @staticmethod
+    def backend():
+        """
+        محرك التخزين الحالي (يُنشأ مرة واحدة حسب Config.STORAGE_BACKEND)
+        
+        الجداول تُنشأ عند أول استخدام (AUTO_INIT_DB) لأن init_database() لا تعمل
+        على Vercel، ومحركات sqlite/memory تُملأ من STORAGE_SEED_FILE إذا كانت فارغة.
+        """
+        if Database._backend is None:
+            with Database._backend_lock:
+                if Database._backend is None:
+                    Config.validate()
+                    backend = STORAGE_BACKENDS[Config.STORAGE_BACKEND]()
+                    if Config.AUTO_INIT_DB or backend.name != 'postgres':
+                        backend.ensure_schema()
+                    if backend.name != 'postgres':
+                        seed_storage(backend)
+                    Database._backend = backend
+                    print(f"✅ Storage backend: {backend.name}")
+        return Database._backend
+    
+    @staticmethod
+    def init_db():
+        """إنشء جداول قاعدة البيانات إذا لم تكن موجودة"""
+        Database.backend().init_schema()
 
 
-# ==================== دوال المساعدة ====================
+class Replica:
+    """حالة نسخة قراءة واحدة"""
+    
+    def __init__(self, url):
+        self.url = url
+        parts = urlsplit(url)
+        # اسم بدون كلمة المرور للسجلات والمقاييس
+        self.name = f"{parts.hostname}:{parts.port or 5432}{parts.path}"
+        self.pool = None
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+        self.checking = False
+        self.failures = 0
+        self.reads = 0
 
-def load_questions():
+
+class ReplicaRouter:
     """
-    تحميل جميع الأسئلة من قاعدة البيانات
+    توجيه القراءات إلى نسخ القراءة مع فحص الصحة والتأخر
+    Read/write split across Config.DATABASE_REPLICA_URLS
     
-    Returns:
-        list: قائمة الأسئلة
+    - الكتابات دائماً على DATABASE_URL (pool مستقل لكل نسخة)
+    - القراءات بالتناوب على النسخ السليمة التي تأخرها <= REPLICA_MAX_LAG
+    - بعد كتابة من طلب: القراءات تذهب للأساسي لمدة READ_AFTER_WRITE_WINDOW
+      (في العملية نفسها، وفي جلسة المستخدم عبر ملف تعريف الارتباط)
+    - لا نسخ سليمة أو فشل اتصال: الرجوع للأساسي
     """
-    try:
-        query = """
-        SELECT id, type, question, options, correct_answer, category, 
-               created_at, updated_at
-        FROM questions
-        ORDER BY id ASC
+    
+    LAG_SQL = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+    """
+    
+    _lock = threading.Lock()
+    _replicas = None
+    _next = 0
+    _primary_until = 0.0
+    primary_reads = 0
+    replica_reads = 0
+    
+    @staticmethod
+    def replicas():
+        """النسخ المعرفة في Config (تُنشأ مرة واحدة)"""
+        if ReplicaRouter._replicas is None:
+            with ReplicaRouter._lock:
+                if ReplicaRouter._replicas is None:
+                    ReplicaRouter._replicas = [Replica(url) for url in Config.DATABASE_REPLICA_URLS]
+        return ReplicaRouter._replicas
+    
+    @staticmethod
+    def check(replica):
+        """فحص الصحة والتأخر (خيط واحد لكل نسخة؛ البقية يستخدمون آخر نتيجة)"""
+        conn = None
+        try:
+            if replica.pool is None:
+                replica.pool = ConnectionPool(
+                    replica.url,
+                    min_size=0,
+                    max_size=Config.DB_POOL_MAX_SIZE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    max_age=Config.DB_POOL_MAX_AGE,
+                    pre_ping=Config.DB_POOL_PRE_PING,
+                    ping_after=Config.DB_POOL_PING_AFTER
+                )
+            conn = replica.pool.getconn()
+            with conn.cursor() as cur:
+                cur.execute(ReplicaRouter.LAG_SQL)
+                lag = float(cur.fetchone()[0])
+            conn.rollback()
+            healthy = lag <= Config.REPLICA_MAX_LAG
+            if healthy != replica.healthy:
+                print(f"{'✅' if healthy else '⚠️'} Replica {replica.name} "
+                      f"{'healthy' if healthy else 'lagging'} (lag {lag:.1f}s)")
+            replica.lag = lag
+            replica.healthy = healthy
+        except psycopg2.Error as e:
+            if replica.healthy or replica.checked_at is None:
+                print(f"⚠️ Replica {replica.name} unavailable: {e}")
+            replica.healthy = False
+            replica.failures += 1
+        finally:
+            if conn is not None:
+                replica.pool.putconn(conn)
+            replica.checked_at = time.monotonic()
+            replica.checking = False
+    
+    @staticmethod
+    def _session_wrote_recently():
+        """هل كتبت جلسة المستخدم الحالية مؤخراً؟ (بدون لمس الجلسة إن لم تكن موجودة)"""
+        if not has_request_context() or app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+            return False
+        return time.time() - session.get('db_write_at', 0) < Config.READ_AFTER_WRITE_WINDOW
+    
+    @staticmethod
+    def read_pool():
         """
-        results = Database.execute_query(query, fetch=True)
-        
-        # تحويل النتائج إلى قاموس يسهل التعامل معه
-        questions = []
-        for row in results:
-            question = {
-                'id': row['id'],
-                'type': row['type'],
-                'question': row['question'],
-                'options': row['options'] if isinstance(row['options'], list) else json.loads(row['options']),
-                'correct_answer': row['correct_answer'],
-                'category': row['category']
-            }
-            questions.append(question)
+        pool للقراءة
         
-        return questions
-    except Exception as e:
-        print(f"❌ Error loading questions: {e}")
-        return []
+        Returns:
+            tuple: (pool, replica or None للأساسي)
+        """
+        replicas = ReplicaRouter.replicas()
+        if not replicas:
+            return Database.get_pool(), None
+        now = time.monotonic()
+        if now < ReplicaRouter._primary_until or ReplicaRouter._session_wrote_recently():
+            ReplicaRouter.primary_reads += 1
+            return Database.get_pool(), None
+        
+        for replica in replicas:
+            if replica.checked_at is None or now - replica.checked_at >= Config.REPLICA_CHECK_INTERVAL:
+                with ReplicaRouter._lock:
+                    claimed = not replica.checking
+                    replica.checking = True
+                if claimed:
+                    ReplicaRouter.check(replica)
+        
+        count = len(replicas)
+        start = ReplicaRouter._next
+        for offset in range(count):
+            replica = replicas[(start + offset) % count]
+            if replica.healthy:
+                ReplicaRouter._next = (start + offset + 1) % count
+                replica.reads += 1
+                ReplicaRouter.replica_reads += 1
+                return replica.pool, replica
+        ReplicaRouter.primary_reads += 1
+        return Database.get_pool(), None
+    
+    @staticmethod
+    def mark_failed(replica, error):
+        """استبعاد نسخة فشل الاتصال بها حتى الفحص التالي"""
+        print(f"⚠️ Replica {replica.name} failed, reading from primary: {error}")
+        replica.healthy = False
+        replica.failures += 1
+        ReplicaRouter.primary_reads += 1
+        replica.checked_at = time.monotonic()
+    
+    @staticmethod
+    def record_write():
+        """بعد كتابة من طلب: تثبيت القراءات على الأساسي لمدة READ_AFTER_WRITE_WINDOW"""
+        if not Config.DATABASE_REPLICA_URLS or not has_request_context():
+            # كاتب الإرسالات في الخلفية لا يثبت القراءات
+            return
+        ReplicaRouter._primary_until = time.monotonic() + Config.READ_AFTER_WRITE_WINDOW
+        session['db_write_at'] = time.time()
+    
+    @staticmethod
+    def stats():
+        """حالة النسخ وعدادات التوجيه"""
+        return {
+            'primary_reads': ReplicaRouter.primary_reads,
+            'replica_reads': ReplicaRouter.replica_reads,
+            'replicas': [
+                {
+                    'name': replica.name,
+                    'healthy': replica.healthy,
+                    'lag_seconds': replica.lag,
+                    'failures': replica.failures,
+                    'reads': replica.reads,
+                    'pool': replica.pool.stats() if replica.pool is not None else None
+                }
+                for replica in ReplicaRouter.replicas()
+            ]
+        }
 
 
-def find_question_by_id(q_id):
+# ==================== محركات التخزين ====================
+
+class VersionConflictError(Exception):
     """
-    البحث عن سؤال بواسطة المعرف من قاعدة البيانات
+    تعارض التزامن المتفائل: السؤال تغيّر أو حُذف منذ قراءته
+    Optimistic concurrency conflict
+    
+    Attributes:
+        conflicts (dict): {question_id: الإصدار الحالي، أو None إذا لم يعد موجوداً}
+    """
+    
+    def __init__(self, conflicts):
+        super().__init__(f"Version conflict for questions {sorted(conflicts)}")
+        self.conflicts = conflicts
+
+
+def version_conflicts(current, items, missing_is_conflict):
+    """
+    مقارنة الإصدارات الحالية بالمتوقعة لعملية جماعية
     
     Args:
-        q_id (int): معرف السؤال
+        current (dict): {q_id: version} للأسئلة الموجودة
+        items (list): أزواج (q_id, expected_version)؛ None يعني بدون تحقق
+        missing_is_conflict (bool): اعتبار السؤال غير الموجود تعارضاً
     
     Returns:
-        dict or None: السؤال المطلوب أو None
+        dict: {q_id: الإصدار الحالي أو None}
     """
-    try:
-        query = """
-        SELECT id, type, question, options, correct_answer, category
-        FROM questions
-        WHERE id = %s
-        """
-        result = Database.execute_query_one(query, (q_id,))
-        
-        if result:
-            return {
-                'id': result['id'],
-                'type': result['type'],
-                'question': result['question'],
-                'options': result['options'] if isinstance(result['options'], list) else json.loads(result['options']),
-                'correct_answer': result['correct_answer'],
-                'category': result['category']
-            }
-        return None
-    except Exception as e:
-        print(f"❌ Error finding question: {e}")
-        return None
+    conflicts = {}
+    for q_id, expected in items:
+        version = current.get(q_id)
+        if version is None:
+            if missing_is_conflict:
+                conflicts[q_id] = None
+        elif expected is not None and version != expected:
+            conflicts[q_id] = version
+    return conflicts
 
 
-def validate_question_data(data):
+class StorageBackend:
     """
-    التحقق من صحة بيانات السؤال
+    واجهة محرك التخزين
+    Storage backend interface
     
-    Args:
-        data (dict): بيانات السؤال
+    جميع عمليات البيانات في التطبيق تمر عبر هذه الواجهة، ويُختار المحرك من
+    Config.STORAGE_BACKEND: 'postgres' (الافتراضي)، 'sqlite' أو 'memory'.
     
-    Returns:
-        tuple: (is_valid, error_message)
+    الصفوف المستوردة (import_rows) بصيغة prepare_import_row:
+        (type, question, options_json, correct_answer, category)
+        مسبوقة بـ id في وضع upsert.
+    
+    حقول التحديث (update_question/update_questions) بنفس الترتيب، و None في
+    أي حقل يعني إبقاء قيمته. كل كتابة على سؤال تزيد عمود version بواحد،
+    و expected_version (إن لم يكن None) يجعل الكتابة مشروطة به.
     """
-    required_fields = ['question', 'options', 'correct_answer']
     
-    for field in required_fields:
-        if field not in data or not data[field]:
-            return False, f"الحقل '{field}' مطلوب"
+    name = None
     
-    if data.get('type') not in ['mcq', 'tf']:
-        return False, "نوع السؤال يجب أن يكون 'mcq' أو 'tf'"
+    def init_schema(self):
+        """إنشاء الجداول والفهارس إذا لم تكن موجودة"""
+        raise NotImplementedError
     
-    if not isinstance(data.get('options'), list) or len(data.get('options', [])) == 0:
-        return False, "الخيارات يجب أن تكون قائمة غير فارغة"
+    def ensure_schema(self):
+        """تهيئة الجداول عند أول استخدام (المحركات المحلية: دائماً)"""
+        self.init_schema()
     
-    return True, None
-
-
-def require_admin(f):
-    """
-    ديكوريتور للتحقق من مصادقة المسؤول
+    def version_token(self):
+        """بصمة رخيصة تتغير مع أي كتابة على جدول الأسئلة"""
+        raise NotImplementedError
     
-    Args:
-        f (function): الدالة المراد حمايتها
+    def fetch_questions(self):
+        """جميع الأسئلة مرتبة حسب المعرف"""
+        raise NotImplementedError
+    
+    def get_question(self, q_id):
+        """سؤال واحد أو None"""
+        raise NotImplementedError
+    
+    def insert_question(self, fields):
+        """
+        إدراج سؤال
+        
+        Args:
+            fields (tuple): (type, question, options, correct_answer, category)
+        
+        Returns:
+            Question: السؤال الجديد
+        """
+        raise NotImplementedError
+    
+    def update_question(self, q_id, fields, expected_version=None):
+        """
+        تحديث سؤال في عبارة شرطية واحدة
+        
+        Returns:
+            Question or None: السؤال المحدث، أو None إذا لم يوجد
+        
+        Raises:
+            VersionConflictError: الإصدار الحالي لا يطابق expected_version
+        """
+        raise NotImplementedError
+    
+    def delete_question(self, q_id, expected_version=None):
+        """حذف سؤال - يُرجع False إذا لم يوجد، ويرفع VersionConflictError عند التعارض"""
+        raise NotImplementedError
+    
+    def update_questions(self, items):
+        """
+        تحديث عدة أسئلة في معاملة واحدة (كلها أو لا شيء)
+        
+        Args:
+            items (list): (q_id, fields, expected_version)
+        
+        Returns:
+            list: الأسئلة المحدثة
+        
+        Raises:
+            VersionConflictError: سؤال غير موجود أو إصداره تغيّر (لا يُكتب شيء)
+        """
+        raise NotImplementedError
+    
+    def delete_questions(self, items):
+        """
+        حذف عدة أسئلة في معاملة واحدة (المعرفات غير الموجودة تُتجاهل)
+        
+        Args:
+            items (list): (q_id, expected_version)
+        
+        Returns:
+            list: المعرفات المحذوفة
+        
+        Raises:
+            VersionConflictError: سؤال موجود تغيّر إصداره (لا يُحذف شيء)
+        """
+        raise NotImplementedError
+    
+    def list_questions(self, after, limit, category=None, q_type=None, search=None):
+        """حتى limit سؤال بمعرف أكبر من after مع التصفية"""
+        raise NotImplementedError
+    
+    def import_rows(self, batches, mode, replace=False):
+        """
+        كتابة دفعات صفوف في معاملة واحدة
+        
+        Args:
+            batches (iterable): قوائم صفوف؛ أي استثناء أثناء التكرار يلغي المعاملة
+            mode (str): 'append' أو 'upsert'
+            replace (bool): حذف جميع الأسئلة أولاً
+        
+        Returns:
+            int: عدد الصفوف المكتوبة
+        """
+        raise NotImplementedError
+    
+    def iter_questions(self):
+        """تكرار جميع الأسئلة بدون تحميلها كلها في الذاكرة"""
+        raise NotImplementedError
+    
+    def write_submissions(self, attempts, answers, question_counts, option_counts):
+        """
+        كتابة دفعة إرسالات مع تحديث العدادات في معاملة واحدة
+        
+        Args:
+            attempts (list): (id, submitted_at, score, total, percentage)
+            answers (list): (attempt_id, question_id, answer, is_correct)
+            question_counts (dict): {question_id: [attempts, correct]}
+            option_counts (dict): {(question_id, answer): picks}
+        """
+        raise NotImplementedError
+    
+    def load_stats(self):
+        """
+        Returns:
+            tuple: ({question_id: (attempts, correct)}, {question_id: {answer: picks}})
+        """
+        raise NotImplementedError
+    
+    def score_histogram(self, after, until):
+        """
+        عدد المحاولات لكل (total, score) ضمن فترة زمنية
+        
+        Args:
+            after (datetime): بداية الفترة (غير مشمولة)، None = من البداية
+            until (datetime): نهاية الفترة (مشمولة)
+        
+        Returns:
+            list: (total, score, count)
+        """
+        raise NotImplementedError
+    
+    def rebuild_stats(self):
+        """إعادة حساب العدادات من المحاولات - يُرجع عدد الأسئلة"""
+        raise NotImplementedError
+
+
+class PostgresBackend(StorageBackend):
+    """محرك PostgreSQL (Supabase) عبر Database و ConnectionPool"""
+    
+    name = 'postgres'
+    
+    def __init__(self):
+        load_psycopg2()
+    
+    def ensure_schema(self):
+        """استعلام واحد رخيص، وتنفيذ DDL فقط إذا كان آخر جدول أو عمود غير موجود"""
+        try:
+            row = Database.execute_query_one("""
+                SELECT to_regclass('question_option_stats') AS name,
+                       to_regclass('questions_version') AS version_table,
+                       EXISTS (SELECT 1 FROM pg_attribute
+                               WHERE attrelid = to_regclass('questions') AND attname = 'version'
+                                 AND NOT attisdropped) AS has_version
+            """)
+            if row is None or row['name'] is None or row['version_table'] is None or not row['has_version']:
+                self.init_schema()
+        except Exception as e:
+            print(f"⚠️ Database init warning: {e}")
+    
+    def init_schema(self):
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS questions (
+            id SERIAL PRIMARY KEY,
+            type VARCHAR(10) NOT NULL,
+            question TEXT NOT NULL,
+            options JSONB NOT NULL,
+            correct_answer TEXT NOT NULL,
+            category VARCHAR(50) DEFAULT 'رومانسي',
+            version INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        -- جداول أُنشئت قبل عمود version
+        ALTER TABLE questions ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+        
+        CREATE INDEX IF NOT EXISTS idx_questions_id ON questions(id);
+        
+        -- بصمة QuestionCache كما في SQLite: صف واحد يزيده trigger مع كل كتابة
+        -- (يبدأ من وقت الإنشاء بالمللي ثانية حتى لا يكرر جدول أُعيد إنشاؤه وسوم SharedCache القديمة)
+        CREATE TABLE IF NOT EXISTS questions_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL
+        );
+        INSERT INTO questions_version (id, version)
+        VALUES (1, (EXTRACT(EPOCH FROM clock_timestamp()) * 1000)::BIGINT)
+        ON CONFLICT (id) DO NOTHING;
+        
+        CREATE OR REPLACE FUNCTION bump_questions_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE questions_version SET version = version + 1 WHERE id = 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        
+        -- مرة لكل عبارة: الاستيراد الجماعي يزيد العداد مرة واحدة
+        DROP TRIGGER IF EXISTS trg_questions_version ON questions;
+        CREATE TRIGGER trg_questions_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON questions
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_questions_version();
+        
+        CREATE TABLE IF NOT EXISTS attempts (
+            id UUID PRIMARY KEY,
+            submitted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            percentage REAL NOT NULL
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_attempts_submitted_at ON attempts(submitted_at);
+        
+        CREATE TABLE IF NOT EXISTS attempt_answers (
+            attempt_id UUID NOT NULL REFERENCES attempts(id) ON DELETE CASCADE,
+            question_id INTEGER NOT NULL,
+            answer TEXT,
+            is_correct BOOLEAN NOT NULL,
+            PRIMARY KEY (attempt_id, question_id)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_attempt_answers_question ON attempt_answers(question_id);
+        
+        CREATE TABLE IF NOT EXISTS question_stats (
+            question_id INTEGER PRIMARY KEY,
+            attempts BIGINT NOT NULL DEFAULT 0,
+            correct BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        
+        CREATE TABLE IF NOT EXISTS question_option_stats (
+            question_id INTEGER NOT NULL,
+            answer TEXT NOT NULL,
+            picks BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (question_id, answer)
+        );
+        """
+        # فهارس التصفية في لوحة التحكم: لا تعتمد على أي امتداد
+        filter_index_sql = """
+        CREATE INDEX IF NOT EXISTS idx_questions_category_id ON questions(category, id);
+        CREATE INDEX IF NOT EXISTS idx_questions_type_id ON questions(type, id);
+        """
+        # فهرس البحث: pg_trgm قد يحتاج صلاحيات إضافية، وفشله لا يلغي الفهارس أعلاه
+        search_index_sql = """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_questions_question_trgm
+            ON questions USING GIN (question gin_trgm_ops);
+        """
+        try:
+            Database.execute_query(create_table_sql)
+            print("✅ Database tables initialized successfully")
+        except Exception as e:
+            print(f"⚠️ Database init warning: {e}")
+        try:
+            Database.execute_query(filter_index_sql)
+            print("✅ Filter indexes initialized successfully")
+        except Exception as e:
+            print(f"⚠️ Filter index init warning: {e}")
+        try:
+            Database.execute_query(search_index_sql)
+            print("✅ Search index initialized successfully")
+        except Exception as e:
+            print(f"⚠️ Search index init warning (search falls back to a sequential scan): {e}")
+    
+    COLUMNS = "id, type, question, options, correct_answer, category, version"
+    
+    # العبارات الساخنة: تُحضّر مرة واحدة لكل اتصال عبر Database.execute_prepared
+    VERSION_SQL = "SELECT version FROM questions_version WHERE id = 1"
+    FETCH_ALL_SQL = f"SELECT {COLUMNS} FROM questions ORDER BY id ASC"
+    GET_SQL = f"SELECT {COLUMNS} FROM questions WHERE id = %s"
+    INSERT_SQL = f"""
+        INSERT INTO questions (type, question, options, correct_answer, category)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING {COLUMNS}
+    """
+    # كتابة شرطية في رحلة واحدة: target يميّز "غير موجود" (لا صفوف) عن
+    # "تعارض" (صف بدون نتيجة الكتابة ومعه الإصدار الحالي)
+    UPDATE_SQL = f"""
+        WITH target AS (
+            SELECT version FROM questions WHERE id = %s
+        ), updated AS (
+            UPDATE questions
+            SET type = COALESCE(%s, type),
+                question = COALESCE(%s, question),
+                options = COALESCE(%s::jsonb, options),
+                correct_answer = COALESCE(%s::text, correct_answer),
+                category = COALESCE(%s, category),
+                version = version + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND (%s::int IS NULL OR version = %s::int)
+            RETURNING {COLUMNS}
+        )
+        SELECT target.version AS current_version, updated.*
+        FROM target LEFT JOIN updated ON true
+    """
+    DELETE_SQL = """
+        WITH target AS (
+            SELECT version FROM questions WHERE id = %s
+        ), deleted AS (
+            DELETE FROM questions
+            WHERE id = %s AND (%s::int IS NULL OR version = %s::int)
+            RETURNING id
+        )
+        SELECT target.version AS current_version, deleted.id
+        FROM target LEFT JOIN deleted ON true
+    """
+    # ترتيب ثابت للأقفال: دفعتان متداخلتان بترتيب مختلف لا تتبادلان الانتظار (deadlock)
+    LOCK_SQL = "SELECT id, version FROM questions WHERE id = ANY(%s) ORDER BY id FOR UPDATE"
+    BATCH_UPDATE_SQL = f"""
+        UPDATE questions AS q
+        SET type = COALESCE(v.type, q.type),
+            question = COALESCE(v.question, q.question),
+            options = COALESCE(v.options::jsonb, q.options),
+            correct_answer = COALESCE(v.correct_answer, q.correct_answer),
+            category = COALESCE(v.category, q.category),
+            version = q.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+        FROM (VALUES %s) AS v (id, type, question, options, correct_answer, category)
+        WHERE q.id = v.id
+        RETURNING {', '.join('q.' + column for column in COLUMNS.split(', '))}
+    """
+    
+    @staticmethod
+    def insert_params(fields):
+        """معاملات INSERT_SQL (مشتركة مع asgi.py؛ asyncpg لا يقبل رقماً لعمود نصي)"""
+        q_type, question, options, correct_answer, category = fields
+        return (q_type, question, json.dumps(options, ensure_ascii=False), str(correct_answer), category)
+    
+    @staticmethod
+    def update_params(q_id, fields, expected_version=None):
+        """معاملات UPDATE_SQL (مشتركة مع asgi.py)"""
+        q_type, question, options, correct_answer, category = fields
+        return (
+            q_id, q_type, question,
+            None if options is None else json.dumps(options, ensure_ascii=False),
+            None if correct_answer is None else str(correct_answer),
+            category, q_id, expected_version, expected_version
+        )
+    
+    @staticmethod
+    def write_result(q_id, row):
+        """
+        تفسير نتيجة UPDATE_SQL / DELETE_SQL
+        
+        Returns:
+            tuple or None: صف الكتابة (بدون current_version)، أو None إذا لم يوجد السؤال
+        
+        Raises:
+            VersionConflictError: وُجد السؤال ولم تُنفذ الكتابة
+        """
+        if row is None:
+            return None
+        if row[1] is None:
+            raise VersionConflictError({q_id: row[0]})
+        return tuple(row[1:])
+    
+    def version_token(self):
+        row = Database.execute_prepared('q_version', self.VERSION_SQL, fetch='one', readonly=True)
+        return row[0] if row else None
+    
+    def fetch_questions(self):
+        rows = Database.execute_prepared('q_fetch_all', self.FETCH_ALL_SQL, readonly=True)
+        return [Question(*row) for row in rows]
+    
+    def get_question(self, q_id):
+        row = Database.execute_prepared('q_get', self.GET_SQL, (q_id,), fetch='one', readonly=True)
+        return Question(*row) if row else None
+    
+    def insert_question(self, fields):
+        row = Database.execute_prepared('q_insert', self.INSERT_SQL, self.insert_params(fields), fetch='one')
+        return Question(*row) if row else None
+    
+    def update_question(self, q_id, fields, expected_version=None):
+        row = Database.execute_prepared(
+            'q_update', self.UPDATE_SQL, self.update_params(q_id, fields, expected_version), fetch='one'
+        )
+        row = self.write_result(q_id, row)
+        return Question(*row) if row else None
+    
+    def delete_question(self, q_id, expected_version=None):
+        row = Database.execute_prepared(
+            'q_delete', self.DELETE_SQL, (q_id, q_id, expected_version, expected_version), fetch='one'
+        )
+        return self.write_result(q_id, row) is not None
+    
+    def update_questions(self, items):
+        ids = [q_id for q_id, _, _ in items]
+        with Database.transaction() as cur:
+            # قفل الصفوف يمنع تغيّرها بين التحقق والكتابة
+            cur.execute(self.LOCK_SQL, (sorted(ids),))
+            current = dict(cur.fetchall())
+            conflicts = version_conflicts(current, [(q_id, expected) for q_id, _, expected in items], True)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            rows = execute_values(cur, self.BATCH_UPDATE_SQL, [
+                self.update_params(q_id, fields)[:6] for q_id, fields, _ in items
+            ], template="(%s::int, %s::varchar, %s::text, %s::text, %s::text, %s::varchar)",
+                page_size=len(items), fetch=True)
+        by_id = {row[0]: Question(*row) for row in rows}
+        return [by_id[q_id] for q_id in ids]
+    
+    def delete_questions(self, items):
+        ids = [q_id for q_id, _ in items]
+        with Database.transaction() as cur:
+            cur.execute(self.LOCK_SQL, (sorted(ids),))
+            current = dict(cur.fetchall())
+            conflicts = version_conflicts(current, items, False)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            cur.execute("DELETE FROM questions WHERE id = ANY(%s) RETURNING id", (ids,))
+            return [row[0] for row in cur.fetchall()]
+    
+    @classmethod
+    def list_query(cls, after, limit, category=None, q_type=None, search=None):
+        """استعلام صفحة keyset مع الفلاتر: (query, params)"""
+        conditions = ['id > %s']
+        params = [after]
+        if category:
+            conditions.append('category = %s')
+            params.append(category)
+        if q_type:
+            conditions.append('type = %s')
+            params.append(q_type)
+        if search:
+            conditions.append("question ILIKE %s ESCAPE '\\'")
+            params.append(f'%{escape_like(search)}%')
+        params.append(limit)
+        
+        query = f"""
+        SELECT {cls.COLUMNS}
+        FROM questions
+        WHERE {' AND '.join(conditions)}
+        ORDER BY id ASC
+        LIMIT %s
+        """
+        return query, tuple(params)
+    
+    def list_questions(self, after, limit, category=None, q_type=None, search=None):
+        query, params = self.list_query(after, limit, category, q_type, search)
+        # عبارة محضّرة لكل تركيبة فلاتر (8 على الأكثر)
+        name = 'q_page_' + ''.join('1' if value else '0' for value in (category, q_type, search))
+        rows = Database.execute_prepared(name, query, params, readonly=True)
+        return [Question(*row) for row in rows]
+    
+    @staticmethod
+    def _write_import_batch(cur, batch, mode):
+        """كتابة دفعة صفوف: COPY للإضافة، و execute_values مع ON CONFLICT للتحديث"""
+        if mode == 'append':
+            buf = io.StringIO()
+            csv.writer(buf).writerows(batch)
+            buf.seek(0)
+            cur.copy_expert(
+                "COPY questions (type, question, options, correct_answer, category) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buf
+            )
+        else:
+            execute_values(cur, """
+                INSERT INTO questions (id, type, question, options, correct_answer, category)
+                VALUES %s
+                ON CONFLICT (id) DO UPDATE
+                SET type = EXCLUDED.type,
+                    question = EXCLUDED.question,
+                    options = EXCLUDED.options,
+                    correct_answer = EXCLUDED.correct_answer,
+                    category = EXCLUDED.category,
+                    version = questions.version + 1,
+                    updated_at = CURRENT_TIMESTAMP
+            """, batch, page_size=len(batch))
+    
+    def import_rows(self, batches, mode, replace=False):
+        imported = 0
+        with Database.transaction() as cur:
+            if replace:
+                cur.execute("DELETE FROM questions")
+            for batch in batches:
+                self._write_import_batch(cur, batch, mode)
+                imported += len(batch)
+            if mode == 'upsert':
+                cur.execute(
+                    "SELECT setval(pg_get_serial_sequence('questions', 'id'), "
+                    "COALESCE((SELECT MAX(id) FROM questions), 0) + 1, false)"
+                )
+        return imported
+    
+    def iter_questions(self):
+        pool, _ = ReplicaRouter.read_pool()
+        conn = pool.getconn()
+        try:
+            with conn.cursor(name='questions_export') as cur:
+                cur.itersize = Config.IMPORT_BATCH_SIZE
+                cur.execute(EXPORT_QUERY)
+                for row in cur:
+                    yield Question(*row)
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+    
+    def write_submissions(self, attempts, answers, question_counts, option_counts):
+        with Database.transaction() as cur:
+            execute_values(cur, """
+                INSERT INTO attempts (id, submitted_at, score, total, percentage)
+                VALUES %s
+                ON CONFLICT (id) DO NOTHING
+            """, attempts, page_size=len(attempts))
+            if answers:
+                execute_values(cur, """
+                    INSERT INTO attempt_answers (attempt_id, question_id, answer, is_correct)
+                    VALUES %s
+                    ON CONFLICT (attempt_id, question_id) DO NOTHING
+                """, answers, page_size=1000)
+            # ترتيب ثابت للمفاتيح لتجنب deadlock بين العمال
+            if question_counts:
+                execute_values(cur, """
+                    INSERT INTO question_stats (question_id, attempts, correct)
+                    VALUES %s
+                    ON CONFLICT (question_id) DO UPDATE
+                    SET attempts = question_stats.attempts + EXCLUDED.attempts,
+                        correct = question_stats.correct + EXCLUDED.correct,
+                        updated_at = CURRENT_TIMESTAMP
+                """, [(q_id, c[0], c[1]) for q_id, c in sorted(question_counts.items())], page_size=1000)
+            if option_counts:
+                execute_values(cur, """
+                    INSERT INTO question_option_stats (question_id, answer, picks)
+                    VALUES %s
+                    ON CONFLICT (question_id, answer) DO UPDATE
+                    SET picks = question_option_stats.picks + EXCLUDED.picks
+                """, [key + (picks,) for key, picks in sorted(option_counts.items())], page_size=1000)
+    
+    def load_stats(self):
+        question_rows = Database.execute_query(
+            "SELECT question_id, attempts, correct FROM question_stats", fetch=True, readonly=True
+        )
+        option_rows = Database.execute_query(
+            "SELECT question_id, answer, picks FROM question_option_stats", fetch=True, readonly=True
+        )
+        counts = {row['question_id']: (row['attempts'], row['correct']) for row in question_rows}
+        distributions = {}
+        for row in option_rows:
+            distributions.setdefault(row['question_id'], {})[row['answer']] = row['picks']
+        return counts, distributions
+    
+    def score_histogram(self, after, until):
+        # من الأساسي: نسخة متأخرة قد تفقد محاولات الفترة نهائياً
+        rows = Database.execute_query(
+            "SELECT total, score, COUNT(*) AS count FROM attempts "
+            "WHERE submitted_at > %s AND submitted_at <= %s GROUP BY total, score",
+            (after or datetime.min, until), fetch=True
+        )
+        return [(row['total'], row['score'], row['count']) for row in rows]
+    
+    def rebuild_stats(self):
+        with Database.transaction() as cur:
+            # قفل الجداول يمنع تداخل كاتب الإرسالات أثناء إعادة البناء
+            cur.execute("LOCK TABLE question_stats, question_option_stats IN EXCLUSIVE MODE")
+            cur.execute("DELETE FROM question_stats")
+            cur.execute("DELETE FROM question_option_stats")
+            cur.execute("""
+                INSERT INTO question_stats (question_id, attempts, correct)
+                SELECT question_id, COUNT(*), COUNT(*) FILTER (WHERE is_correct)
+                FROM attempt_answers
+                GROUP BY question_id
+            """)
+            count = cur.rowcount
+            cur.execute("""
+                INSERT INTO question_option_stats (question_id, answer, picks)
+                SELECT question_id, answer, COUNT(*)
+                FROM attempt_answers
+                WHERE answer IS NOT NULL
+                GROUP BY question_id, answer
+            """)
+        return count
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    محرك SQLite مضمّن بوضع WAL
+    Embedded SQLite backend (WAL)
+    
+    اتصال لكل خيط، والكتابة تمر بقفل واحد (SQLite يسمح بكاتب واحد).
+    عداد الإصدار يُحدَّث بواسطة triggers فيبقى version_token قراءة صف واحد.
+    """
+    
+    name = 'sqlite'
+    
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        question TEXT NOT NULL,
+        options TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        category TEXT DEFAULT 'رومانسي',
+        version INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_questions_category_id ON questions(category, id);
+    CREATE INDEX IF NOT EXISTS idx_questions_type_id ON questions(type, id);
+    
+    CREATE TABLE IF NOT EXISTS questions_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO questions_version (id, version) VALUES (1, 0);
+    
+    CREATE TRIGGER IF NOT EXISTS trg_questions_insert AFTER INSERT ON questions
+    BEGIN UPDATE questions_version SET version = version + 1 WHERE id = 1; END;
+    CREATE TRIGGER IF NOT EXISTS trg_questions_update AFTER UPDATE ON questions
+    BEGIN UPDATE questions_version SET version = version + 1 WHERE id = 1; END;
+    CREATE TRIGGER IF NOT EXISTS trg_questions_delete AFTER DELETE ON questions
+    BEGIN UPDATE questions_version SET version = version + 1 WHERE id = 1; END;
+    
+    CREATE TABLE IF NOT EXISTS attempts (
+        id TEXT PRIMARY KEY,
+        submitted_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        score INTEGER NOT NULL,
+        total INTEGER NOT NULL,
+        percentage REAL NOT NULL
+    );
+    
+    CREATE TABLE IF NOT EXISTS attempt_answers (
+        attempt_id TEXT NOT NULL REFERENCES attempts(id) ON DELETE CASCADE,
+        question_id INTEGER NOT NULL,
+        answer TEXT,
+        is_correct INTEGER NOT NULL,
+        PRIMARY KEY (attempt_id, question_id)
+    );
+    
+    CREATE INDEX IF NOT EXISTS idx_attempt_answers_question ON attempt_answers(question_id);
+    
+    CREATE TABLE IF NOT EXISTS question_stats (
+        question_id INTEGER PRIMARY KEY,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    
+    CREATE TABLE IF NOT EXISTS question_option_stats (
+        question_id INTEGER NOT NULL,
+        answer TEXT NOT NULL,
+        picks INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (question_id, answer)
+    );
+    """
+    
+    COLUMNS = "id, type, question, options, correct_answer, category, version"
+    
+    UPDATE_SQL = f"""
+        UPDATE questions
+        SET type = COALESCE(?, type),
+            question = COALESCE(?, question),
+            options = COALESCE(?, options),
+            correct_answer = COALESCE(?, correct_answer),
+            category = COALESCE(?, category),
+            version = version + 1,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND (? IS NULL OR version = ?)
+        RETURNING {COLUMNS}
+    """
+    
+    def __init__(self, path):
+        # sqlite3 يُستورد فقط عند استخدام هذا المحرك
+        import sqlite3
+        Database.add_errors(sqlite3.Error)
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+    
+    def _conn(self):
+        """اتصال الخيط الحالي (يُفتح مرة واحدة لكل خيط)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            if Config.METRICS_ENABLED:
+                # عدّ عبارات sqlite لكل طلب (بدون توقيت - sqlite لا يوفره)
+                conn.set_trace_callback(Metrics.record_sqlite)
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _transaction(self):
+        """معاملة كتابة (BEGIN IMMEDIATE) مع commit أو rollback"""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+    
+    def init_schema(self):
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(self.SCHEMA)
+            # ملفات أُنشئت قبل عمود version
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(questions)")}
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE questions ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    
+    def version_token(self):
+        row = self._conn().execute("SELECT version FROM questions_version WHERE id = 1").fetchone()
+        return row['version'] if row else None
+    
+    def fetch_questions(self):
+        rows = self._conn().execute(f"SELECT {self.COLUMNS} FROM questions ORDER BY id ASC").fetchall()
+        return [Question(*row) for row in rows]
+    
+    def get_question(self, q_id):
+        row = self._conn().execute(f"SELECT {self.COLUMNS} FROM questions WHERE id = ?", (q_id,)).fetchone()
+        return Question(*row) if row else None
+    
+    def insert_question(self, fields):
+        q_type, question, options, correct_answer, category = fields
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO questions (type, question, options, correct_answer, category) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (q_type, question, json.dumps(options, ensure_ascii=False), correct_answer, category)
+            )
+            q_id = cur.lastrowid
+        return self.get_question(q_id)
+    
+    @staticmethod
+    def _update_params(q_id, fields, expected_version):
+        q_type, question, options, correct_answer, category = fields
+        return (
+            q_type, question,
+            None if options is None else json.dumps(options, ensure_ascii=False),
+            None if correct_answer is None else str(correct_answer),
+            category, q_id, expected_version, expected_version
+        )
+    
+    @staticmethod
+    def _current_versions(conn, ids):
+        placeholders = ', '.join('?' * len(ids))
+        rows = conn.execute(f"SELECT id, version FROM questions WHERE id IN ({placeholders})", ids)
+        return {row['id']: row['version'] for row in rows}
+    
+    def update_question(self, q_id, fields, expected_version=None):
+        with self._transaction() as conn:
+            row = conn.execute(self.UPDATE_SQL, self._update_params(q_id, fields, expected_version)).fetchone()
+            if row is None:
+                # داخل نفس المعاملة: التمييز بين غير موجود وتعارض
+                current = self._current_versions(conn, [q_id])
+                if not current:
+                    return None
+                raise VersionConflictError(current)
+        return Question(*row)
+    
+    def delete_question(self, q_id, expected_version=None):
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM questions WHERE id = ? AND (? IS NULL OR version = ?)",
+                (q_id, expected_version, expected_version)
+            ).rowcount > 0
+            if not deleted:
+                current = self._current_versions(conn, [q_id])
+                if current:
+                    raise VersionConflictError(current)
+        return deleted
+    
+    def update_questions(self, items):
+        with self._transaction() as conn:
+            current = self._current_versions(conn, [q_id for q_id, _, _ in items])
+            conflicts = version_conflicts(current, [(q_id, expected) for q_id, _, expected in items], True)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            return [
+                Question(*conn.execute(self.UPDATE_SQL, self._update_params(q_id, fields, None)).fetchone())
+                for q_id, fields, _ in items
+            ]
+    
+    def delete_questions(self, items):
+        ids = [q_id for q_id, _ in items]
+        with self._transaction() as conn:
+            current = self._current_versions(conn, ids)
+            conflicts = version_conflicts(current, items, False)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            conn.executemany("DELETE FROM questions WHERE id = ?", [(q_id,) for q_id in current])
+        return [q_id for q_id in ids if q_id in current]
+    
+    def list_questions(self, after, limit, category=None, q_type=None, search=None):
+        conditions = ['id > ?']
+        params = [after]
+        if category:
+            conditions.append('category = ?')
+            params.append(category)
+        if q_type:
+            conditions.append('type = ?')
+            params.append(q_type)
+        if search:
+            conditions.append("question LIKE ? ESCAPE '\\'")
+            params.append(f'%{escape_like(search)}%')
+        params.append(limit)
+        rows = self._conn().execute(
+            f"SELECT {self.COLUMNS} FROM questions WHERE {' AND '.join(conditions)} "
+            f"ORDER BY id ASC LIMIT ?",
+            params
+        ).fetchall()
+        return [Question(*row) for row in rows]
+    
+    def import_rows(self, batches, mode, replace=False):
+        imported = 0
+        with self._transaction() as conn:
+            if replace:
+                conn.execute("DELETE FROM questions")
+            for batch in batches:
+                if mode == 'append':
+                    conn.executemany(
+                        "INSERT INTO questions (type, question, options, correct_answer, category) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        batch
+                    )
+                else:
+                    conn.executemany(
+                        "INSERT INTO questions (id, type, question, options, correct_answer, category) "
+                        "VALUES (?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET type = excluded.type, question = excluded.question, "
+                        "options = excluded.options, correct_answer = excluded.correct_answer, "
+                        "category = excluded.category, version = questions.version + 1, "
+                        "updated_at = CURRENT_TIMESTAMP",
+                        batch
+                    )
+                imported += len(batch)
+        return imported
+    
+    def iter_questions(self):
+        # cursor خاص بهذا المولد حتى لا يتداخل مع استعلامات أخرى على نفس الاتصال
+        cur = self._conn().cursor()
+        try:
+            for row in cur.execute(f"SELECT {self.COLUMNS} FROM questions ORDER BY id ASC"):
+                yield Question(*row)
+        finally:
+            cur.close()
+    
+    def write_submissions(self, attempts, answers, question_counts, option_counts):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO attempts (id, submitted_at, score, total, percentage) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(a[0], str(a[1]), a[2], a[3], a[4]) for a in attempts]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO attempt_answers (attempt_id, question_id, answer, is_correct) "
+                "VALUES (?, ?, ?, ?)",
+                answers
+            )
+            conn.executemany(
+                "INSERT INTO question_stats (question_id, attempts, correct) VALUES (?, ?, ?) "
+                "ON CONFLICT (question_id) DO UPDATE SET attempts = attempts + excluded.attempts, "
+                "correct = correct + excluded.correct, updated_at = CURRENT_TIMESTAMP",
+                [(q_id, c[0], c[1]) for q_id, c in question_counts.items()]
+            )
+            conn.executemany(
+                "INSERT INTO question_option_stats (question_id, answer, picks) VALUES (?, ?, ?) "
+                "ON CONFLICT (question_id, answer) DO UPDATE SET picks = picks + excluded.picks",
+                [key + (picks,) for key, picks in option_counts.items()]
+            )
+    
+    def load_stats(self):
+        conn = self._conn()
+        counts = {
+            row['question_id']: (row['attempts'], row['correct'])
+            for row in conn.execute("SELECT question_id, attempts, correct FROM question_stats")
+        }
+        distributions = {}
+        for row in conn.execute("SELECT question_id, answer, picks FROM question_option_stats"):
+            distributions.setdefault(row['question_id'], {})[row['answer']] = row['picks']
+        return counts, distributions
+    
+    def score_histogram(self, after, until):
+        # submitted_at نص بصيغة str(datetime) فالمقارنة النصية تحافظ على الترتيب
+        rows = self._conn().execute(
+            "SELECT total, score, COUNT(*) FROM attempts "
+            "WHERE submitted_at > ? AND submitted_at <= ? GROUP BY total, score",
+            (str(after) if after else '', str(until))
+        )
+        return [tuple(row) for row in rows]
+    
+    def rebuild_stats(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM question_stats")
+            conn.execute("DELETE FROM question_option_stats")
+            count = conn.execute("""
+                INSERT INTO question_stats (question_id, attempts, correct)
+                SELECT question_id, COUNT(*), SUM(is_correct)
+                FROM attempt_answers
+                GROUP BY question_id
+            """).rowcount
+            conn.execute("""
+                INSERT INTO question_option_stats (question_id, answer, picks)
+                SELECT question_id, answer, COUNT(*)
+                FROM attempt_answers
+                WHERE answer IS NOT NULL
+                GROUP BY question_id, answer
+            """)
+        return count
+
+
+class MemoryBackend(StorageBackend):
+    """
+    محرك داخل الذاكرة بالكامل (للاختبارات وقياس الأداء والنشر للقراءة فقط)
+    Pure in-memory backend
+    
+    يخزن كائنات Question مباشرة؛ لأنها غير قابلة للتعديل تُعاد بدون نسخ، وكل
+    تحديث يستبدل الكائن بآخر جديد إصداره أعلى بواحد.
+    
+    البيانات تُفقد عند إعادة التشغيل؛ استخدم STORAGE_SEED_FILE لتحميل أسئلة أولية.
+    """
+    
+    name = 'memory'
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._questions = {}     # id -> Question
+        self._ids = []           # معرفات مرتبة للترقيم
+        self._next_id = 1
+        self._version = 0
+        self._attempts = {}
+        self._answers = {}       # (attempt_id, question_id) -> (answer, is_correct)
+        self._question_stats = {}
+        self._option_stats = {}
+    
+    def init_schema(self):
+        pass
+    
+    def version_token(self):
+        return self._version
+    
+    def fetch_questions(self):
+        with self._lock:
+            return [self._questions[q_id] for q_id in self._ids]
+    
+    def get_question(self, q_id):
+        return self._questions.get(q_id)
+    
+    def _put(self, q_id, fields):
+        """إدراج أو استبدال سؤال (يُستدعى مع القفل)"""
+        old = self._questions.get(q_id)
+        if old is None:
+            bisect.insort(self._ids, q_id)
+        q_type, question_text, options, correct_answer, category = fields
+        # correct_answer عمود نصي في postgres و SQLite؛ لوحة التحكم قد ترسل رقماً
+        question = self._questions[q_id] = Question(
+            q_id, q_type, question_text, options, str(correct_answer), category,
+            version=old.version + 1 if old else 1
+        )
+        self._next_id = max(self._next_id, q_id + 1)
+        self._version += 1
+        return question
+    
+    def _merge(self, q_id, fields):
+        """تطبيق حقول التحديث (None = إبقاء القيمة) على السؤال الحالي"""
+        old = self._questions[q_id]
+        current = (old.type, old.question, old.options, old.correct_answer, old.category)
+        return self._put(q_id, tuple(
+            value if value is not None else kept for value, kept in zip(fields, current)
+        ))
+    
+    def _remove(self, q_id):
+        del self._questions[q_id]
+        del self._ids[bisect.bisect_left(self._ids, q_id)]
+        self._version += 1
+    
+    def _check(self, q_id, expected_version):
+        question = self._questions.get(q_id)
+        if question is not None and expected_version is not None and question.version != expected_version:
+            raise VersionConflictError({q_id: question.version})
+        return question is not None
+    
+    def insert_question(self, fields):
+        with self._lock:
+            return self._put(self._next_id, fields)
+    
+    def update_question(self, q_id, fields, expected_version=None):
+        with self._lock:
+            if not self._check(q_id, expected_version):
+                return None
+            return self._merge(q_id, fields)
+    
+    def delete_question(self, q_id, expected_version=None):
+        with self._lock:
+            if not self._check(q_id, expected_version):
+                return False
+            self._remove(q_id)
+            return True
+    
+    def _versions(self, ids):
+        return {q_id: self._questions[q_id].version for q_id in ids if q_id in self._questions}
+    
+    def update_questions(self, items):
+        with self._lock:
+            current = self._versions(q_id for q_id, _, _ in items)
+            conflicts = version_conflicts(current, [(q_id, expected) for q_id, _, expected in items], True)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            return [self._merge(q_id, fields) for q_id, fields, _ in items]
+    
+    def delete_questions(self, items):
+        with self._lock:
+            current = self._versions(q_id for q_id, _ in items)
+            conflicts = version_conflicts(current, items, False)
+            if conflicts:
+                raise VersionConflictError(conflicts)
+            deleted = [q_id for q_id, _ in items if q_id in current]
+            for q_id in deleted:
+                self._remove(q_id)
+            return deleted
+    
+    def list_questions(self, after, limit, category=None, q_type=None, search=None):
+        results = []
+        with self._lock:
+            for q_id in self._ids[bisect.bisect_right(self._ids, after):]:
+                question = self._questions[q_id]
+                if category and question.category != category:
+                    continue
+                if q_type and question.type != q_type:
+                    continue
+                if search and search.casefold() not in question.question.casefold():
+                    continue
+                results.append(question)
+                if len(results) >= limit:
+                    break
+        return results
+    
+    def import_rows(self, batches, mode, replace=False):
+        imported = 0
+        with self._lock:
+            # نسخة للتراجع: الاستيراد كله أو لا شيء
+            saved = (dict(self._questions), list(self._ids), self._next_id, self._version)
+            try:
+                if replace:
+                    self._questions.clear()
+                    self._ids.clear()
+                for batch in batches:
+                    for row in batch:
+                        if mode == 'append':
+                            q_id, fields = self._next_id, row
+                        else:
+                            q_id, fields = row[0], row[1:]
+                        self._put(q_id, fields)
+                    imported += len(batch)
+            except BaseException:
+                self._questions, self._ids, self._next_id, self._version = saved
+                raise
+            self._version += 1
+        return imported
+    
+    def iter_questions(self):
+        return iter(self.fetch_questions())
+    
+    def write_submissions(self, attempts, answers, question_counts, option_counts):
+        with self._lock:
+            for attempt in attempts:
+                self._attempts.setdefault(attempt[0], attempt)
+            for attempt_id, question_id, answer, is_correct in answers:
+                self._answers.setdefault((attempt_id, question_id), (answer, is_correct))
+            for q_id, (count, correct) in question_counts.items():
+                current = self._question_stats.get(q_id, (0, 0))
+                self._question_stats[q_id] = (current[0] + count, current[1] + correct)
+            for key, picks in option_counts.items():
+                self._option_stats[key] = self._option_stats.get(key, 0) + picks
+    
+    def load_stats(self):
+        with self._lock:
+            distributions = {}
+            for (q_id, answer), picks in self._option_stats.items():
+                distributions.setdefault(q_id, {})[answer] = picks
+            return dict(self._question_stats), distributions
+    
+    def score_histogram(self, after, until):
+        counts = {}
+        with self._lock:
+            for _, submitted_at, score, total, _ in self._attempts.values():
+                if (after is None or submitted_at > after) and submitted_at <= until:
+                    counts[(total, score)] = counts.get((total, score), 0) + 1
+        return [key + (count,) for key, count in counts.items()]
+    
+    def rebuild_stats(self):
+        with self._lock:
+            self._question_stats = {}
+            self._option_stats = {}
+            for (_, q_id), (answer, is_correct) in self._answers.items():
+                current = self._question_stats.get(q_id, (0, 0))
+                self._question_stats[q_id] = (current[0] + 1, current[1] + int(is_correct))
+                if answer is not None:
+                    key = (q_id, answer)
+                    self._option_stats[key] = self._option_stats.get(key, 0) + 1
+            return len(self._question_stats)
+
+
+STORAGE_BACKENDS = {
+    'postgres': PostgresBackend,
+    'sqlite': lambda: SQLiteBackend(Config.SQLITE_PATH),
+    'memory': MemoryBackend
+}
+
+
+# ==================== دوال المساعدة ====================
+
+def utc_now():
+    """
+    الوقت الحالي بتوقيت UTC بدون tzinfo (بديل datetime.utcnow المهمل)
+    
+    الأعمدة TIMESTAMP في postgres والنصوص في SQLite تخزن UTC بدون منطقة زمنية،
+    ومقارنات Ranking تجري عليها، لذلك يبقى الناتج naive.
+    
+    Returns:
+        datetime: الآن (UTC)
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# مُرمّز واحد مشترك (json.dumps بخيارات غير افتراضية ينشئ مُرمّزاً في كل استدعاء)
+QUESTION_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def json_value(value, _string=encode_basestring, _encode=QUESTION_JSON_ENCODER.encode):
+    """ترميز قيمة JSON واحدة؛ النصوص والأعداد الصحيحة (الحالة الغالبة) بدون المُرمّز العام"""
+    value_type = type(value)
+    if value_type is str:
+        return _string(value)
+    if value_type is int:
+        return int.__repr__(value)
+    return _encode(value)
+
+
+class Question:
+    """
+    نموذج سؤال مضغوط وغير قابل للتعديل
+    Compact, immutable question model
+    
+    يُشارك بين محركات التخزين والذاكرة المؤقتة والمصحح والمسارات:
+    - __slots__ بدل dict لكل سؤال، والخيارات tuple
+    - answer_key: الإجابة الصحيحة موحدة مسبقاً (normalize_answer)
+    - to_json(): بايتات JSON للسؤال تُسلسل مرة واحدة وتُعاد
+    - version: رقم مراجعة الصف للتزامن المتفائل في لوحة التحكم
+    """
+    
+    __slots__ = ('id', 'type', 'question', 'options', 'correct_answer', 'category', 'version', 'answer_key', '_json')
+    
+    def __init__(self, q_id, q_type, question, options, correct_answer, category, version=1):
+        # الترتيب يطابق أعمدة الاستعلامات: Question(*row)
+        if isinstance(options, str):
+            options = json.loads(options)
+        init = object.__setattr__
+        init(self, 'id', q_id)
+        init(self, 'type', sys.intern(q_type) if isinstance(q_type, str) else q_type)
+        init(self, 'question', question)
+        init(self, 'options', tuple(options))
+        init(self, 'correct_answer', correct_answer)
+        init(self, 'category', sys.intern(category) if isinstance(category, str) else category)
+        init(self, 'version', version)
+        init(self, 'answer_key', normalize_answer(correct_answer))
+        init(self, '_json', None)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("Question is immutable")
+    
+    def _key(self):
+        return (self.id, self.type, self.question, self.options, self.correct_answer, self.category)
+    
+    def __eq__(self, other):
+        return isinstance(other, Question) and self._key() == other._key()
+    
+    def __hash__(self):
+        return hash(self._key())
+    
+    def __repr__(self):
+        return f"Question(id={self.id!r}, type={self.type!r})"
+    
+    def to_dict(self):
+        """قاموس السؤال (لواجهات لوحة التحكم - مع version)"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'question': self.question,
+            'options': list(self.options),
+            'correct_answer': self.correct_answer,
+            'category': self.category,
+            'version': self.version
+        }
+    
+    def to_json(self):
+        """
+        JSON السؤال بترميز UTF-8 (يُحسب مرة واحدة لكل كائن)
+        
+        Returns:
+            bytes: JSON
+        """
+        body = self._json
+        if body is None:
+            # نفس مخرجات to_dict() بدون version (الاختبار العام لا يحتاجه)
+            # مع ترميز كل حقل مباشرة بدون قاموس وسيط
+            encode = json_value
+            body = (
+                '{"id":' + encode(self.id)
+                + ',"type":' + encode(self.type)
+                + ',"question":' + encode(self.question)
+                + ',"options":[' + ','.join(map(encode, self.options))
+                + '],"correct_answer":' + encode(self.correct_answer)
+                + ',"category":' + encode(self.category) + '}'
+            ).encode('utf-8')
+            object.__setattr__(self, '_json', body)
+        return body
+
+
+def questions_to_json(questions):
+    """
+    مصفوفة JSON من الأسئلة بتجميع بايتات كل سؤال المخزنة
+    
+    Args:
+        questions (iterable): كائنات Question
+    
+    Returns:
+        bytes: JSON
+    """
+    return b'[' + b','.join(q.to_json() for q in questions) + b']'
+
+
+def fetch_questions_from_db():
+    """
+    قراءة جميع الأسئلة مباشرة من قاعدة البيانات (بدون ذاكرة مؤقتة)
+    
+    Returns:
+        list: قائمة الأسئلة
+    """
+    return Database.backend().fetch_questions()
+
+
+# ==================== الذاكرة المؤقتة المشتركة ====================
+
+class LRUCache:
+    """
+    ذاكرة LRU محلية محدودة الحجم وآمنة للخيوط (الطبقة الأولى)
+    Bounded thread-safe local LRU (first tier)
+    """
+    
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class SharedCache:
+    """
+    الطبقة الثانية: مخزن مفتاح/قيمة مشترك يتكلم بروتوكول Redis
+    Shared Redis-protocol tier across workers and serverless instances
+    
+    - المفاتيح موسومة ببصمة قاعدة البيانات (version_token) فلا تُقرأ بيانات قديمة أبداً
+    - single-flight: عند الفقد يحصل عامل واحد على قفل SET NX ويبني القيمة،
+      والبقية ينتظرون ظهورها (ثم يبنون بأنفسهم بعد CACHE_LOCK_TIMEOUT)
+    - عمليات الكتابة في لوحة التحكم تنشر رسالة إبطال يستقبلها كل عامل
+    - أي خطأ في الاتصال = فقد؛ والطبقة تُعطل لثوانٍ بدلاً من إبطاء كل طلب
+    """
+    
+    RETRY_AFTER = 5.0
+    POLL_INTERVAL = 0.05
+    # أخطاء الطبقة تُعامل كفقد ولا تُفشل الطلب (يُضاف redis.RedisError عند الاتصال)
+    ERRORS = (OSError,)
+    
+    _lock = threading.Lock()
+    _client = None
+    _down_until = 0.0
+    _subscriber = None
+    # معرف هذه العملية لتجاهل رسائل الإبطال التي نشرتها بنفسها
+    instance_id = uuid.uuid4().hex
+    hits = 0
+    misses = 0
+    errors = 0
+    builds = 0
+    lock_waits = 0
+    published = 0
+    received = 0
+    
+    @staticmethod
+    def key(*parts):
+        """مفتاح بالبادئة Config.CACHE_NAMESPACE"""
+        return ':'.join((Config.CACHE_NAMESPACE,) + tuple(str(part) for part in parts))
+    
+    @staticmethod
+    def tag(token):
+        """وسم ثابت بين العمال لبصمة قاعدة البيانات (None = لا تخزين مشترك)"""
+        if token is None:
+            return None
+        return hashlib.sha1(repr(token).encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def client():
+        """
+        عميل Redis (أو None إذا كانت الطبقة معطلة أو متوقفة مؤقتاً)
+        """
+        if not Config.CACHE_REDIS_URL or time.monotonic() < SharedCache._down_until:
+            return None
+        if SharedCache._client is None:
+            with SharedCache._lock:
+                if SharedCache._client is None:
+                    SharedCache._client = SharedCache._connect()
+                    if SharedCache._client is not None and Config.CACHE_SUBSCRIBE:
+                        SharedCache._start_subscriber()
+        return SharedCache._client
+    
+    @staticmethod
+    def _connect():
+        """إنشاء العميل من Config.CACHE_REDIS_URL"""
+        url = Config.CACHE_REDIS_URL
+        # redis اختياري ويُستورد هنا فقط حتى لا يكلف الإقلاع البارد بدون CACHE_REDIS_URL
+        try:
+            import redis
+        except ImportError:
+            print("⚠️ CACHE_REDIS_URL is set but the redis package is not installed; shared cache disabled")
+            Config.CACHE_REDIS_URL = ''
+            return None
+        SharedCache.ERRORS = (redis.RedisError, OSError)
+        if url.startswith('fakeredis://'):
+            try:
+                import fakeredis
+            except ImportError:
+                print("⚠️ CACHE_REDIS_URL uses fakeredis:// but fakeredis is not installed; shared cache disabled")
+                Config.CACHE_REDIS_URL = ''
+                return None
+            return fakeredis.FakeRedis()
+        return redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+    
+    @staticmethod
+    def _failed(e):
+        """تسجيل خطأ وتعطيل الطبقة مؤقتاً"""
+        SharedCache.errors += 1
+        if time.monotonic() >= SharedCache._down_until:
+            print(f"⚠️ Shared cache unavailable for {SharedCache.RETRY_AFTER:.0f}s: {e}")
+        SharedCache._down_until = time.monotonic() + SharedCache.RETRY_AFTER
+    
+    @staticmethod
+    def get_or_build(key, build, encode, decode):
+        """
+        قراءة من الطبقة المشتركة أو البناء مرة واحدة عبر جميع العمال
+        
+        Args:
+            key (str): المفتاح الموسوم بالإصدار
+            build (callable): تُرجع القيمة عند الفقد
+            encode (callable): قيمة -> dict من bytes (حقول hash في Redis)
+            decode (callable): dict من bytes -> قيمة
+        
+        Returns:
+            القيمة (تُبنى محلياً إذا كانت الطبقة معطلة)
+        """
+        client = SharedCache.client()
+        if client is None:
+            return build()
+        try:
+            fields = client.hgetall(key)
+            if fields:
+                SharedCache.hits += 1
+                return decode(fields)
+            SharedCache.misses += 1
+            lock_key = key + ':lock'
+            token = uuid.uuid4().hex
+            lock_ms = int(Config.CACHE_LOCK_TIMEOUT * 1000)
+            if not client.set(lock_key, token, nx=True, px=lock_ms):
+                # عامل آخر يبني القيمة الآن
+                SharedCache.lock_waits += 1
+                deadline = time.monotonic() + Config.CACHE_LOCK_TIMEOUT
+                while time.monotonic() < deadline:
+                    time.sleep(SharedCache.POLL_INTERVAL)
+                    fields = client.hgetall(key)
+                    if fields:
+                        return decode(fields)
+                    if not client.exists(lock_key):
+                        break
+        except SharedCache.ERRORS as e:
+            SharedCache._failed(e)
+            return build()
+        
+        value = build()
+        SharedCache.builds += 1
+        try:
+            pipe = client.pipeline()
+            pipe.hset(key, mapping=encode(value))
+            pipe.expire(key, Config.CACHE_SHARED_TTL)
+            pipe.execute()
+            # حذف القفل فقط إذا كان ما زال لنا
+            if client.get(lock_key) == token.encode('ascii'):
+                client.delete(lock_key)
+        except SharedCache.ERRORS as e:
+            SharedCache._failed(e)
+        return value
+    
+    @staticmethod
+    def publish_invalidation():
+        """إبلاغ جميع العمال بتغير الأسئلة"""
+        client = SharedCache.client()
+        if client is None:
+            return
+        try:
+            client.publish(SharedCache.key('invalidate'), SharedCache.instance_id)
+            SharedCache.published += 1
+        except SharedCache.ERRORS as e:
+            SharedCache._failed(e)
+    
+    @staticmethod
+    def _start_subscriber():
+        """خيط خلفي يستقبل رسائل الإبطال (مع إعادة الاتصال)"""
+        client = SharedCache._client
+        
+        def listen():
+            channel = SharedCache.key('invalidate')
+            while True:
+                try:
+                    pubsub = client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(channel)
+                    while True:
+                        message = pubsub.get_message(timeout=1.0)
+                        if message is None:
+                            continue
+                        data = message.get('data')
+                        if isinstance(data, bytes):
+                            data = data.decode('utf-8', 'replace')
+                        if data != SharedCache.instance_id:
+                            SharedCache.received += 1
+                            QuestionCache.invalidate(publish=False)
+                except Exception as e:
+                    SharedCache._failed(e)
+                    time.sleep(SharedCache.RETRY_AFTER)
+        
+        SharedCache._subscriber = threading.Thread(target=listen, name='cache-invalidation', daemon=True)
+        SharedCache._subscriber.start()
+    
+    @staticmethod
+    def stats():
+        """عدادات الطبقة المشتركة"""
+        return {
+            'enabled': bool(Config.CACHE_REDIS_URL),
+            'available': SharedCache._client is not None and time.monotonic() >= SharedCache._down_until,
+            'hits': SharedCache.hits,
+            'misses': SharedCache.misses,
+            'builds': SharedCache.builds,
+            'lock_waits': SharedCache.lock_waits,
+            'errors': SharedCache.errors,
+            'published': SharedCache.published,
+            'received': SharedCache.received
+        }
+
+
+def encode_questions(questions):
+    """
+    لقطة الأسئلة للطبقة المشتركة: نفس JSON الخاص بـ /api/questions، وإصدارات
+    الصفوف بنفس الترتيب (للتزامن المتفائل في لوحة التحكم)
+    """
+    return {
+        'json': questions_to_json(questions),
+        'versions': json.dumps([question.version for question in questions], separators=(',', ':'))
+    }
+
+
+def decode_questions(fields):
+    """إعادة بناء كائنات Question من الطبقة المشتركة"""
+    return [
+        Question(q['id'], q['type'], q['question'], q['options'], q['correct_answer'], q['category'], version)
+        for q, version in zip(json.loads(fields[b'json']), json.loads(fields[b'versions']))
+    ]
+
+
+def load_shared_questions(token, loader):
+    """
+    الأسئلة لبصمة قاعدة البيانات من الطبقة المشتركة أو من loader (مرة واحدة عبر العمال)
+    
+    Args:
+        token: بصمة قاعدة البيانات الحالية
+        loader (callable): تحميل الأسئلة من قاعدة البيانات
+    
+    Returns:
+        list: كائنات Question
+    """
+    tag = SharedCache.tag(token)
+    if tag is None or not Config.CACHE_REDIS_URL:
+        return loader()
+    # questions2: مدخلات الصيغة السابقة (بدون versions) لا تُقرأ
+    return SharedCache.get_or_build(SharedCache.key('questions2', tag), loader, encode_questions, decode_questions)
+
+
+# ==================== الذاكرة المؤقتة للأسئلة ====================
+
+class QuestionCache:
+    """
+    ذاكرة مؤقتة للأسئلة على مستوى العملية
+    Process-wide question cache
+    
+    تحتفظ بلقطة غير قابلة للتعديل (tuple) ورقم إصدار يزداد مع كل تحميل.
+    - عمليات الكتابة في لوحة التحكم تستدعي invalidate() فيرى القراء التغيير فوراً
+    - فحص رخيص لقاعدة البيانات (عداد الإصدار الذي تزيده triggers) يبقي عمال gunicorn متزامنين
+    - TTL كحد أقصى لعمر اللقطة في كل الأحوال
+    """
+    
+    # _lock يحمي تبديل الحالة فقط؛ التحميل من قاعدة البيانات (أو انتظار
+    # SharedCache) يجري تحت _refresh_lock حتى لا يحجب القراء واللقطة موجودة
+    _lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+    _snapshot = None
+    _version = 0
+    _db_token = None
+    _loaded_at = 0.0
+    _checked_at = 0.0
+    _stale = True
+    _warmed = False
+    # في وضع ASGI يتولى asgi.py التحديث (بدون استعلامات متزامنة داخل حلقة الأحداث)
+    external_refresh = False
+    hits = 0
+    misses = 0
+    
+    @staticmethod
+    def _probe():
+        """بصمة رخيصة لحالة جدول الأسئلة"""
+        return Database.backend().version_token()
+    
+    @staticmethod
+    def _reload(now):
+        """إعادة تحميل اللقطة من قاعدة البيانات (مع _refresh_lock؛ التبديل فقط مع _lock)"""
+        version = QuestionCache._version
+        # البصمة أولاً: إذا حدثت كتابة أثناء التحميل سيكتشفها الفحص التالي
+        token = QuestionCache._probe()
+        questions = load_shared_questions(token, fetch_questions_from_db)
+        with QuestionCache._lock:
+            return QuestionCache.install(token, questions, now, version)
+    
+    @staticmethod
+    def install(token, questions, now, version=None):
+        """
+        تثبيت لقطة جديدة (يُستدعى مع القفل أو من محمّل asgi.py)
+        
+        Args:
+            token: بصمة قاعدة البيانات المقروءة قبل الأسئلة
+            questions (iterable): كائنات Question
+            now (float): time.monotonic()
+            version (int): _version قبل بدء التحميل؛ إذا تغيّر (invalidate أثناء
+                التحميل) تبقى اللقطة stale فيُعاد تحميلها في الطلب التالي
+        
+        Returns:
+            tuple: اللقطة
+        """
+        # الأسئلة التي لم تتغير تحتفظ بكائناتها السابقة (و JSON المخزن فيها)
+        previous = {q.id: q for q in QuestionCache._snapshot or ()}
+        snapshot = tuple(
+            previous.get(q.id) if previous.get(q.id) == q else q
+            for q in questions
+        )
+        QuestionCache._stale = version is not None and version != QuestionCache._version
+        QuestionCache._snapshot = snapshot
+        QuestionCache._db_token = token
+        QuestionCache._version += 1
+        QuestionCache._loaded_at = now
+        QuestionCache._checked_at = now
+        return snapshot
+    
+    @staticmethod
+    def _warm(now):
+        """
+        لقطة أولية من Config.QUESTION_WARM_FILE بدون قاعدة البيانات (يُستدعى مع _lock)
+        
+        البصمة تبقى None فيستبدلها أول فحص بعد QUESTION_CACHE_CHECK_INTERVAL
+        بالبيانات الحقيقية.
+        
+        Returns:
+            bool: هل تم التحميل
+        """
+        QuestionCache._warmed = True
+        path = Config.QUESTION_WARM_FILE
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            questions = []
+            with open(path, 'rb') as f:
+                for position, record in iter_json_records(f):
+                    row, error_msg = prepare_import_row(record, with_id=True)
+                    if error_msg:
+                        raise ValueError(f"row {position}: {error_msg}")
+                    questions.append(Question(*row))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Question warm file ignored: {e}")
+            return False
+        QuestionCache._snapshot = tuple(questions)
+        QuestionCache._db_token = None
+        QuestionCache._version += 1
+        QuestionCache._loaded_at = now
+        QuestionCache._checked_at = now
+        QuestionCache._stale = False
+        print(f"✅ Question cache warmed with {len(questions)} questions from {path}")
+        return True
+    
+    @staticmethod
+    def refresh_action(now):
+        """
+        ما المطلوب لإبقاء اللقطة حديثة (بدون أي استعلام)
+        
+        Returns:
+            str or None: 'reload' أو 'probe' (مقارنة البصمة) أو None
+        """
+        if QuestionCache._stale or QuestionCache._snapshot is None:
+            return 'reload'
+        if now - QuestionCache._loaded_at >= Config.QUESTION_CACHE_TTL:
+            return 'reload'
+        if now - QuestionCache._checked_at >= Config.QUESTION_CACHE_CHECK_INTERVAL:
+            return 'probe'
+        return None
+    
+    @staticmethod
+    def mark_checked(now, token):
+        """
+        تسجيل نتيجة فحص البصمة
+        
+        Returns:
+            bool: True إذا تغيرت البيانات (يجب إعادة التحميل)
+        """
+        QuestionCache._checked_at = now
+        return token != QuestionCache._db_token
+    
+    @staticmethod
+    def _needs_reload(now):
+        """هل يجب إعادة التحميل؟ (يُستدعى مع _refresh_lock)"""
+        action = QuestionCache.refresh_action(now)
+        if action == 'probe':
+            return QuestionCache.mark_checked(now, QuestionCache._probe())
+        return action == 'reload'
+    
+    @staticmethod
+    def get():
+        """
+        الحصول على اللقطة الحالية
+        
+        Returns:
+            tuple: (version, snapshot)
+        """
+        now = time.monotonic()
+        snapshot = QuestionCache._snapshot
+        if (snapshot is not None and not QuestionCache._stale
+                and now - QuestionCache._checked_at < Config.QUESTION_CACHE_CHECK_INTERVAL
+                and now - QuestionCache._loaded_at < Config.QUESTION_CACHE_TTL):
+            QuestionCache.hits += 1
+            return QuestionCache._version, snapshot
+        if QuestionCache.external_refresh and snapshot is not None and not QuestionCache._stale:
+            # asgi.py حدّث اللقطة قبل الطلب؛ لا نحجب حلقة الأحداث بفحص متزامن.
+            # بعد invalidate() (كتابة من مسار Flask في خيط) يُعاد التحميل هنا مباشرة
+            QuestionCache.hits += 1
+            return QuestionCache._version, snapshot
+        
+        # بعد invalidate() ننتظر التحميل الجاري (يرى الكاتب كتابته)؛ أما انتهاء
+        # TTL أو موعد الفحص فلا يحجب أحداً: اللقطة الحالية تُخدم حتى ينتهي التحميل
+        wait = snapshot is None or QuestionCache._stale
+        if not QuestionCache._refresh_lock.acquire(blocking=wait):
+            QuestionCache.hits += 1
+            return QuestionCache._version, snapshot
+        try:
+            if QuestionCache._snapshot is None and not QuestionCache._warmed:
+                with QuestionCache._lock:
+                    warmed = QuestionCache._snapshot is None and QuestionCache._warm(now)
+            else:
+                warmed = False
+            if warmed:
+                QuestionCache.misses += 1
+            elif QuestionCache._needs_reload(now):
+                QuestionCache.misses += 1
+                QuestionCache._reload(now)
+            else:
+                QuestionCache.hits += 1
+        except Exception as e:
+            # نخدم اللقطة القديمة إن وجدت بدلاً من الفشل
+            print(f"❌ Error refreshing question cache: {e}")
+            if QuestionCache._snapshot is None:
+                raise
+        finally:
+            QuestionCache._refresh_lock.release()
+        with QuestionCache._lock:
+            return QuestionCache._version, QuestionCache._snapshot
+    
+    @staticmethod
+    def invalidate(publish=True):
+        """
+        إبطال اللقطة بعد أي عملية كتابة على الأسئلة
+        
+        Args:
+            publish (bool): إبلاغ العمال الآخرين عبر الطبقة المشتركة ونشر لقطة ثابتة جديدة
+        """
+        with QuestionCache._lock:
+            QuestionCache._stale = True
+            QuestionCache._version += 1
+        if publish:
+            SharedCache.publish_invalidation()
+            SnapshotPublisher.schedule()
+    
+    @staticmethod
+    def shared_tag(version):
+        """وسم الطبقة المشتركة لإصدار محلي (None إذا لم يعد الإصدار الحالي أو بدون بصمة)"""
+        token = QuestionCache._db_token
+        if version != QuestionCache._version or QuestionCache._stale:
+            return None
+        return SharedCache.tag(token)
+    
+    @staticmethod
+    def stats():
+        """إحصائيات الذاكرة المؤقتة"""
+        snapshot = QuestionCache._snapshot
+        total = QuestionCache.hits + QuestionCache.misses
+        return {
+            'version': QuestionCache._version,
+            'size': len(snapshot) if snapshot is not None else 0,
+            'hits': QuestionCache.hits,
+            'misses': QuestionCache.misses,
+            'hit_ratio': round(QuestionCache.hits / total, 4) if total else 0.0,
+            'age_seconds': round(time.monotonic() - QuestionCache._loaded_at, 3) if snapshot is not None else None
+        }
+
+
+def load_questions():
+    """
+    تحميل جميع الأسئلة (من الذاكرة المؤقتة)
+    
+    Returns:
+        list: قائمة الأسئلة
+    """
+    try:
+        _, snapshot = QuestionCache.get()
+        return list(snapshot)
+    except Exception as e:
+        print(f"❌ Error loading questions: {e}")
+        return []
+
+
+def find_question_by_id(q_id):
+    """
+    البحث عن سؤال بواسطة المعرف من محرك التخزين
+    
+    Args:
+        q_id (int): معرف السؤال
+    
+    Returns:
+        Question or None: السؤال المطلوب أو None
+    """
+    try:
+        return Database.backend().get_question(q_id)
+    except Exception as e:
+        print(f"❌ Error finding question: {e}")
+        return None
+
+
+def validate_question_data(data):
+    """
+    التحقق من صحة بيانات السؤال
+    
+    Args:
+        data (dict): بيانات السؤال
+    
+    Returns:
+        tuple: (is_valid, error_message)
+    """
+    required_fields = ['question', 'options', 'correct_answer']
+    
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return False, f"الحقل '{field}' مطلوب"
+    
+    if data.get('type') not in ['mcq', 'tf']:
+        return False, "نوع السؤال يجب أن يكون 'mcq' أو 'tf'"
+    
+    if not isinstance(data.get('options'), list) or len(data.get('options', [])) == 0:
+        return False, "الخيارات يجب أن تكون قائمة غير فارغة"
+    
+    return True, None
+
+
+def question_fields(data, partial=False):
+    """
+    حقول السؤال للكتابة من بيانات الطلب
+    
+    Args:
+        data (dict): بيانات الطلب
+        partial (bool): للتحديث - الحقول الغائبة تصبح None فيُبقي المحرك قيمها
+    
+    Returns:
+        tuple: (type, question, options, correct_answer, category)
+    """
+    if partial:
+        return tuple(
+            data.get(field) for field in ('type', 'question', 'options', 'correct_answer', 'category')
+        )
+    return (
+        data.get('type', 'mcq'),
+        data.get('question'),
+        data.get('options'),
+        data.get('correct_answer'),
+        data.get('category', 'رومانسي')
+    )
+
+
+def validate_question_update(data):
+    """
+    التحقق من حقول التحديث الجزئي (الحقول الموجودة فقط)
+    
+    Args:
+        data (dict): بيانات الطلب
+    
+    Returns:
+        tuple: (is_valid, error_message)
+    """
+    if not isinstance(data, dict):
+        return False, 'بيانات غير صحيحة'
+    for field in ('question', 'correct_answer'):
+        if field in data and not data[field]:
+            return False, f"الحقل '{field}' لا يمكن أن يكون فارغاً"
+    if 'type' in data and data['type'] not in ['mcq', 'tf']:
+        return False, "نوع السؤال يجب أن يكون 'mcq' أو 'tf'"
+    if 'options' in data and (not isinstance(data['options'], list) or not data['options']):
+        return False, "الخيارات يجب أن تكون قائمة غير فارغة"
+    return True, None
+
+
+def expected_version(data, if_match=None):
+    """
+    الإصدار المتوقع للكتابة المشروطة: حقل version في الطلب أو ترويسة If-Match
+    
+    Args:
+        data (dict): بيانات الطلب
+        if_match (str): قيمة ترويسة If-Match (مثل "3" أو W/"3")
+    
+    Returns:
+        int or None: None يعني كتابة بدون تحقق (آخر كاتب يفوز)
+    
+    Raises:
+        ValueError: إصدار غير صالح
+    """
+    value = data.get('version') if isinstance(data, dict) else None
+    if value is None and if_match:
+        value = if_match.strip().removeprefix('W/').strip('"')
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(value)
+    return int(value)
+
+
+def conflict_response(error):
+    """
+    استجابة 409 لتعارض الإصدارات
+    
+    Args:
+        error (VersionConflictError): التعارض
+    
+    Returns:
+        tuple: (dict, 409) - conflicts بمفاتيح نصية كما في JSON
+    """
+    conflicts = {str(q_id): version for q_id, version in sorted(error.conflicts.items())}
+    body = {
+        'success': False,
+        'error': 'تم تعديل السؤال أو حذفه من جلسة أخرى، أعد التحميل وحاول مجدداً',
+        'conflicts': conflicts
+    }
+    if len(conflicts) == 1:
+        body['current_version'] = next(iter(conflicts.values()))
+    return body, 409
+
+
+def parse_batch_items(data, with_fields):
+    """
+    عناصر طلب جماعي من لوحة التحكم
+    
+    Args:
+        data (dict): {"items": [{"id", "version"?, ...حقول}]} أو {"ids": [...]} للحذف
+        with_fields (bool): عناصر تحديث (مع الحقول) أو حذف
+    
+    Returns:
+        list: (q_id, fields, expected_version) أو (q_id, expected_version)
+    
+    Raises:
+        ValueError: رسالة خطأ للمستخدم
+    """
+    if not isinstance(data, dict):
+        raise ValueError('بيانات غير صحيحة')
+    items = data.get('items')
+    if items is None and not with_fields:
+        items = [{'id': q_id} for q_id in data.get('ids') or []]
+    if not isinstance(items, list) or not items:
+        raise ValueError('لا توجد عناصر')
+    if len(items) > Config.MAX_QUESTIONS:
+        raise ValueError(f'الحد الأقصى {Config.MAX_QUESTIONS} عنصر في الطلب')
+    
+    parsed = []
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict) or isinstance(item.get('id'), bool):
+            raise ValueError('عنصر غير صالح')
+        try:
+            q_id = int(item.get('id'))
+            version = expected_version(item)
+        except (TypeError, ValueError):
+            raise ValueError('معرف أو إصدار غير صالح')
+        if q_id in seen:
+            raise ValueError(f'السؤال برقم {q_id} مكرر')
+        seen.add(q_id)
+        if with_fields:
+            fields = {key: value for key, value in item.items() if key not in ('id', 'version')}
+            is_valid, error_msg = validate_question_update(fields)
+            if not is_valid:
+                raise ValueError(f'السؤال برقم {q_id}: {error_msg}')
+            parsed.append((q_id, question_fields(fields, partial=True), version))
+        else:
+            parsed.append((q_id, version))
+    return parsed
+
+
+def require_admin(f):
+    """
+    ديكوريتور للتحقق من مصادقة المسؤول
+    
+    Args:
+        f (function): الدالة المراد حمايتها
+    
+    Returns:
+        function: دالة مزينة
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('admin_authenticated'):
+            return redirect(url_for('admin_login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+# ==================== الحمولات المضغوطة مسبقاً ====================
+
+class CompressedPayload:
+    """
+    جسم استجابة مُسلسل مع نسخ gzip و brotli وبصمة ETag قوية
+    Serialized response body with precompressed variants
+    """
+    
+    __slots__ = ('body', 'gzip', 'br', 'etag', 'mimetype')
+    
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        # البصمة من المحتوى نفسه لتتطابق بين جميع العمال
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        import gzip
+        self.gzip = gzip.compress(body, compresslevel=9)
+        self.br = brotli.compress(body, quality=11) if brotli is not None else None
+    
+    def etags(self):
+        """جميع بصمات النسخ (كل ترميز تمثيل مختلف)"""
+        return (self.etag, f'{self.etag}-gz', f'{self.etag}-br')
+    
+    def to_fields(self):
+        """حقول التخزين في الطبقة المشتركة"""
+        fields = {'body': self.body, 'gzip': self.gzip, 'etag': self.etag, 'mimetype': self.mimetype}
+        if self.br is not None:
+            fields['br'] = self.br
+        return fields
+    
+    @classmethod
+    def from_fields(cls, fields):
+        """إعادة البناء من الطبقة المشتركة بدون إعادة الضغط"""
+        payload = cls.__new__(cls)
+        payload.body = fields[b'body']
+        payload.gzip = fields[b'gzip']
+        payload.br = fields.get(b'br') if brotli is not None else None
+        payload.etag = fields[b'etag'].decode('ascii')
+        payload.mimetype = fields[b'mimetype'].decode('ascii')
+        return payload
+
+
+class PayloadCache:
+    """
+    ذاكرة مؤقتة للحمولات مفتاحها إصدار مجموعة الأسئلة
+    Per-version cache of serialized payloads
+    
+    الطبقة الأولى LRU محلية بمفتاح (name, version)، والثانية SharedCache بمفتاح
+    بصمة قاعدة البيانات حتى لا يعيد كل عامل ضغط brotli نفس الحمولة.
+    """
+    
+    # القفل العام يحمي جدول الأقفال فقط؛ الضغط نفسه يجري تحت قفل المفتاح حتى
+    # لا يحجب بناء brotli-11 لحمولة واحدة قراءة أي حمولة أخرى
+    _lock = threading.Lock()
+    _building = {}
+    _entries = LRUCache(Config.CACHE_LOCAL_MAX_ENTRIES)
+    
+    @staticmethod
+    def peek(name, version):
+        """
+        الحمولة المبنية لهذا الإصدار إن وُجدت (بدون بناء)
+        
+        Returns:
+            CompressedPayload: الحمولة أو None
+        """
+        return PayloadCache._entries.get((name, version))
+    
+    @staticmethod
+    def get(name, version, builder, mimetype='application/json'):
+        """
+        الحصول على حمولة مبنية لهذا الإصدار أو بناؤها مرة واحدة
+        
+        single-flight لكل مفتاح: طلب واحد يبني ويضغط، والطلبات المتزامنة على
+        نفس المفتاح تنتظره ثم تقرأ النتيجة (وتبني بنفسها إن فشل البناء).
+        
+        Args:
+            name (str): اسم الحمولة
+            version (int): إصدار مجموعة الأسئلة
+            builder (callable): دالة تُرجع الجسم كـ bytes
+            mimetype (str): نوع المحتوى
+        
+        Returns:
+            CompressedPayload: الحمولة
+        """
+        key = (name, version)
+        payload = PayloadCache._entries.get(key)
+        if payload is not None:
+            return payload
+        with PayloadCache._lock:
+            key_lock = PayloadCache._building.setdefault(key, threading.Lock())
+        # بعض الحمولات تُبنى من حمولات أخرى (الصفحة الرئيسية من /api/questions) بمفاتيح مختلفة
+        with key_lock:
+            try:
+                payload = PayloadCache._entries.get(key)
+                if payload is not None:
+                    return payload
+                
+                def build():
+                    return CompressedPayload(builder(), mimetype)
+                tag = QuestionCache.shared_tag(version) if Config.CACHE_REDIS_URL else None
+                if tag is None:
+                    payload = build()
+                else:
+                    payload = SharedCache.get_or_build(
+                        SharedCache.key('payload', name, tag), build,
+                        CompressedPayload.to_fields, CompressedPayload.from_fields
+                    )
+                PayloadCache._entries.put(key, payload)
+                return payload
+            finally:
+                # من ينتظر على key_lock يجد الحمولة في _entries؛ والقادمون الجدد لا يحتاجون القفل
+                with PayloadCache._lock:
+                    if PayloadCache._building.get(key) is key_lock:
+                        del PayloadCache._building[key]
+
+
+def send_payload(payload, max_age=0, immutable=False):
+    """
+    إرسال حمولة مع اختيار الترميز والرد بـ 304 عند تطابق If-None-Match
+    
+    Args:
+        payload (CompressedPayload): الحمولة
+        max_age (int): مدة التخزين في المتصفح بالثواني
+        immutable (bool): المحتوى لا يتغير تحت هذا الرابط (أصول ببصمة)
+    
+    Returns:
+        Response: الاستجابة
+    """
+    status, body, headers = negotiate_payload(
+        payload, request.accept_encodings, request.if_none_match, max_age, immutable
+    )
+    response = Response(body, status=status, mimetype=payload.mimetype)
+    response.headers.extend(headers)
+    return response
+
+
+def negotiate_payload(payload, accept_encodings, if_none_match, max_age=0, immutable=False):
+    """
+    اختيار نسخة الحمولة وترويساتها (مشترك بين Flask و asgi.py)
+    
+    Args:
+        payload (CompressedPayload): الحمولة
+        accept_encodings (Accept): ترويسة Accept-Encoding المحللة
+        if_none_match (ETags): ترويسة If-None-Match المحللة
+        max_age (int): مدة التخزين في المتصفح بالثواني
+        immutable (bool): إضافة immutable حتى لا يعيد المتصفح التحقق عند التحديث
+    
+    Returns:
+        tuple: (status, body, [(header, value), ...])
+    """
+    if payload.br is not None and accept_encodings['br']:
+        body, encoding, etag = payload.br, 'br', f'{payload.etag}-br'
+    elif accept_encodings['gzip']:
+        body, encoding, etag = payload.gzip, 'gzip', f'{payload.etag}-gz'
+    else:
+        body, encoding, etag = payload.body, None, payload.etag
+    
+    headers = [('ETag', quote_etag(etag)), ('Vary', 'Accept-Encoding')]
+    if if_none_match and any(if_none_match.contains_weak(tag) for tag in payload.etags()):
+        status, body = 304, b''
+    else:
+        status = 200
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+    
+    if max_age > 0:
+        headers.append(('Cache-Control', f'public, max-age={max_age}' + (', immutable' if immutable else '')))
+    else:
+        headers.append(('Cache-Control', 'public, no-cache'))
+    return status, body, headers
+
+
+def serialize_questions(questions):
+    """تسلسل الأسئلة إلى JSON بترميز UTF-8 مباشرة (أصغر حجماً للنص العربي)"""
+    return questions_to_json(questions)
+
+
+def get_questions_payload():
+    """
+    حمولة /api/questions للإصدار الحالي
+    
+    Returns:
+        CompressedPayload: الحمولة
+    """
+    version, snapshot = QuestionCache.get()
+    return PayloadCache.get('questions', version, lambda: serialize_questions(snapshot))
+
+
+def html_safe_json(body):
+    """
+    تحويل JSON إلى نص آمن للتضمين داخل <script> (نفس هروب tojson)
+    
+    Args:
+        body (bytes): JSON بترميز UTF-8
+    
+    Returns:
+        str: النص الآمن
+    """
+    return (body.decode('utf-8')
+            .replace('<', '\\u003c')
+            .replace('>', '\\u003e')
+            .replace('&', '\\u0026')
+            .replace("'", '\\u0027'))
+
+
+def render_index_page():
+    """
+    عرض الصفحة الرئيسية (يُستدعى مرة واحدة لكل إصدار من الأسئلة)
+    
+    Returns:
+        bytes: HTML
+    """
+    questions_json = None
+    if Config.INLINE_QUESTIONS and not Config.QUIZ_SIZE:
+        # إعادة استخدام جسم /api/questions بدلاً من تسلسل الأسئلة مرة أخرى
+        questions_json = html_safe_json(get_questions_payload().body)
+    # بدون أسئلة مضمنة يقرأ quiz.js المؤشر واللقطة من CDN مباشرة
+    snapshot_base = Config.SNAPSHOT_URL_PREFIX.rstrip('/') if SnapshotPublisher.enabled() else ''
+    return render_template(
+        'index_ar.html',
+        questions_json=questions_json,
+        quiz_size=Config.QUIZ_SIZE,
+        snapshot_base=snapshot_base if questions_json is None else ''
+    ).encode('utf-8')
+
+
+# ==================== الأصول الثابتة ====================
+
+def minify_css(text):
+    """تصغير CSS بـ rcssmin إن كان مثبتاً، وإلا يُرجع النص كما هو"""
+    if rcssmin is not None:
+        return rcssmin.cssmin(text)
+    return text
+
+
+def minify_js(text):
+    """
+    تصغير JavaScript بـ rjsmin إن كان مثبتاً، وإلا يُرجع النص كما هو
+    
+    لا تصغير بديل بالتعبيرات النمطية: بدون محلل لا يمكن تمييز التعليقات من
+    النصوص والتعبيرات النمطية داخل الكود، وgzip/brotli يعوضان معظم الفرق.
+    """
+    if rjsmin is not None:
+        return rjsmin.jsmin(text)
+    return text
+
+
+class StaticAssets:
+    """
+    الأصول الثابتة المصغّرة بأسماء تحمل بصمة المحتوى
+    Fingerprinted, minified and precompressed static assets
+    
+    كل ملف .js/.css في static/ يُصغّر ويُسمى ببصمة محتواه (quiz.3f2a9c1b0d.js)
+    ويُضغط gzip/brotli مرة واحدة، ثم يُخدم من /assets/ مع Cache-Control
+    immutable لمدة سنة: الزيارات المتكررة لا تطلب أي أصل، وأي تعديل ينتج
+    اسماً جديداً.
+    
+    flask build-assets يكتب الناتج في ASSETS_BUILD_DIR فيُحمّل عند الإقلاع
+    بدون إعادة الضغط؛ وبدونه (أو إذا تغيرت المصادر) يُبنى في الذاكرة.
+    """
+    
+    SOURCE_DIR = app.static_folder
+    MIMETYPES = {'.js': 'application/javascript', '.css': 'text/css'}
+    MINIFIERS = {'.js': minify_js, '.css': minify_css}
+    
+    _lock = threading.Lock()
+    _manifest = None   # الاسم المنطقي -> الاسم ببصمة
+    _files = {}        # الاسم ببصمة -> CompressedPayload
+    
+    @staticmethod
+    def sources():
+        """
+        Returns:
+            dict: {الاسم المنطقي (مثل js/quiz.js): bytes}
+        """
+        sources = {}
+        build_dir = os.path.abspath(Config.ASSETS_BUILD_DIR)
+        for root, dirs, files in os.walk(StaticAssets.SOURCE_DIR):
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != build_dir]
+            for filename in files:
+                if os.path.splitext(filename)[1] in StaticAssets.MIMETYPES:
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, StaticAssets.SOURCE_DIR).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        sources[name] = f.read()
+        return sources
+    
+    @staticmethod
+    def fingerprint(name, body):
+        """اسم الملف ببصمة محتواه"""
+        stem, ext = os.path.splitext(name)
+        return f"{stem}.{hashlib.sha256(body).hexdigest()[:10]}{ext}"
+    
+    @staticmethod
+    def build(sources):
+        """
+        تصغير وضغط المصادر
+        
+        Returns:
+            tuple: (manifest, files)
+        """
+        manifest, files = {}, {}
+        for name, source in sorted(sources.items()):
+            ext = os.path.splitext(name)[1]
+            body = StaticAssets.MINIFIERS[ext](source.decode('utf-8')).encode('utf-8')
+            fingerprinted = StaticAssets.fingerprint(name, body)
+            manifest[name] = fingerprinted
+            files[fingerprinted] = CompressedPayload(body, StaticAssets.MIMETYPES[ext])
+        return manifest, files
+    
+    @staticmethod
+    def load_built(sources):
+        """
+        تحميل ناتج flask build-assets إذا كان مبنياً من نفس المصادر
+        
+        Returns:
+            tuple or None: (manifest, files)
+        """
+        path = os.path.join(Config.ASSETS_BUILD_DIR, 'manifest.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                built = json.load(f)['assets']
+            if set(built) != set(sources) or any(
+                built[name]['source'] != hashlib.sha256(body).hexdigest() for name, body in sources.items()
+            ):
+                print(f"⚠️ {path} is out of date; building assets in memory (run flask build-assets)")
+                return None
+            manifest, files = {}, {}
+            for name, entry in built.items():
+                fields = {b'mimetype': StaticAssets.MIMETYPES[os.path.splitext(name)[1]].encode('ascii')}
+                for suffix, field in (('', b'body'), ('.gz', b'gzip'), ('.br', b'br')):
+                    file_path = os.path.join(Config.ASSETS_BUILD_DIR, entry['file'] + suffix)
+                    if suffix != '.br' or os.path.exists(file_path):
+                        with open(file_path, 'rb') as f:
+                            fields[field] = f.read()
+                fields[b'etag'] = hashlib.sha256(fields[b'body']).hexdigest()[:32].encode('ascii')
+                manifest[name] = entry['file']
+                files[entry['file']] = CompressedPayload.from_fields(fields)
+            return manifest, files
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Ignoring unreadable asset build {path}: {e}")
+            return None
+    
+    @staticmethod
+    def manifest():
+        """خريطة الأسماء (تُبنى مرة واحدة لكل عملية)"""
+        if StaticAssets._manifest is None:
+            with StaticAssets._lock:
+                if StaticAssets._manifest is None:
+                    sources = StaticAssets.sources()
+                    manifest, files = StaticAssets.load_built(sources) or StaticAssets.build(sources)
+                    StaticAssets._files = files
+                    StaticAssets._manifest = manifest
+        return StaticAssets._manifest
+    
+    @staticmethod
+    def get(name):
+        """الأصل بالاسم ذي البصمة أو None"""
+        StaticAssets.manifest()
+        return StaticAssets._files.get(name)
+    
+    @staticmethod
+    def url(filename):
+        """
+        بديل url_for('static', filename=...) للقوالب
+        
+        Args:
+            filename (str): المسار داخل static/ (مثل js/quiz.js)
+        
+        Returns:
+            str: رابط /assets/ ذو البصمة، أو رابط static العادي للملفات الأخرى
+        """
+        if Config.ASSETS_FINGERPRINT:
+            name = StaticAssets.manifest().get(filename)
+            if name is not None:
+                return url_for('static_asset', filename=name)
+        return url_for('static', filename=filename)
+    
+    @staticmethod
+    def write(build_dir=None):
+        """
+        كتابة الأصول وملفات .gz/.br و manifest.json (flask build-assets)
+        
+        النسخ القديمة تبقى حتى تجد الصفحات المخزنة عند CDN ملفاتها.
+        
+        Returns:
+            dict: الخريطة المكتوبة
+        """
+        build_dir = build_dir or Config.ASSETS_BUILD_DIR
+        sources = StaticAssets.sources()
+        manifest, files = StaticAssets.build(sources)
+        built = {}
+        for name, fingerprinted in manifest.items():
+            payload = files[fingerprinted]
+            path = os.path.join(build_dir, fingerprinted)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            for suffix, data in (('', payload.body), ('.gz', payload.gzip), ('.br', payload.br)):
+                if data is not None:
+                    with open(path + suffix, 'wb') as f:
+                        f.write(data)
+            built[name] = {'file': fingerprinted, 'source': hashlib.sha256(sources[name]).hexdigest()}
+        tmp_path = os.path.join(build_dir, f"manifest.json.{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'assets': built}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, os.path.join(build_dir, 'manifest.json'))
+        return manifest
+
+
+app.jinja_env.globals['asset_url'] = StaticAssets.url
+
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    """
+    أصل ثابت ذو بصمة: مضغوط مسبقاً ومخزن في المتصفح لمدة سنة
+    Fingerprinted static asset (immutable)
+    """
+    payload = StaticAssets.get(filename)
+    if payload is None:
+        # بصمة قديمة أو خاطئة: لا نخدم محتوى آخر تحت رابط immutable
+        return jsonify({'error': 'الملف غير موجود'}), 404
+    return send_payload(payload, max_age=Config.ASSETS_MAX_AGE, immutable=True)
+
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    """url_for('static', filename=...) يعطي أيضاً الاسم ذا البصمة (يُخدم عبر static_file أدناه)"""
+    if endpoint == 'static' and Config.ASSETS_FINGERPRINT:
+        name = StaticAssets.manifest().get(values.get('filename'))
+        if name is not None:
+            values['filename'] = name
+
+
+serve_static_file = app.view_functions['static']
+
+
+def static_file(filename):
+    """
+    /static/ مع الأسماء ذات البصمة من url_for('static'): نفس حمولة /assets/
+    Flask's static view, extended with fingerprinted names
+    """
+    if Config.ASSETS_FINGERPRINT:
+        payload = StaticAssets.get(filename)
+        if payload is not None:
+            return send_payload(payload, max_age=Config.ASSETS_MAX_AGE, immutable=True)
+    return serve_static_file(filename=filename)
+
+
+app.view_functions['static'] = static_file
+
+
+# ==================== النشر الثابت للأسئلة ====================
+
+class SnapshotPublisher:
+    """
+    لقطات JSON ثابتة لمجموعة الأسئلة تُخدم من CDN أو من القرص مباشرة
+    Versioned, immutable question snapshots for CDN/edge serving
+    
+    الترتيب داخل SNAPSHOT_DIR:
+        current.json                    المؤشر للإصدار الحالي (الملف الوحيد الذي يتغير)
+        <version>/questions.json        نفس جسم /api/questions
+        <version>/categories.json       [{"name", "file", "count"}]
+        <version>/category-<n>.json     أسئلة فئة واحدة
+        <version>/page-<n>.json         {"page", "pages", "total", "questions"}
+    
+    version بصمة محتوى questions.json، فكل ملف تحت الإصدار immutable.
+    كل ملف يُكتب مع نسخ .gz و .br (gzip_static/brotli_static في nginx).
+    النشر يعمل في خيط خلفي بعد أي كتابة على الأسئلة، والطلبات المتتالية تُدمج.
+    """
+    
+    POINTER = 'current.json'
+    
+    _lock = threading.Lock()
+    _start_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _stopping = threading.Event()
+    _requested = False
+    _thread = None
+    _published = set()   # إصدارات موجودة على القرص (للتحويل من /api/questions)
+    
+    publishes = 0
+    failures = 0
+    last_version = None
+    
+    @staticmethod
+    def enabled():
+        return bool(Config.SNAPSHOT_DIR)
+    
+    @staticmethod
+    def version_of(payload):
+        """إصدار اللقطة لحمولة /api/questions"""
+        return payload.etag[:16]
+    
+    @staticmethod
+    def _write(path, body):
+        """كتابة ملف مع نسخه المضغوطة"""
+        payload = CompressedPayload(body, 'application/json')
+        for suffix, data in (('', payload.body), ('.gz', payload.gzip), ('.br', payload.br)):
+            if data is not None:
+                with open(path + suffix, 'wb') as f:
+                    f.write(data)
+    
+    @staticmethod
+    def publish():
+        """
+        نشر الإصدار الحالي (بدون عمل إذا كان منشوراً)
+        
+        Returns:
+            str: الإصدار
+        """
+        with SnapshotPublisher._lock:
+            # من قاعدة البيانات مباشرة: ذاكرة الأسئلة قد لا تكون حُدّثت بعد (وضع ASGI)
+            questions = Database.backend().fetch_questions()
+            body = serialize_questions(questions)
+            # نفس بصمة CompressedPayload لهذا الجسم (انظر version_of)
+            version = hashlib.sha256(body).hexdigest()[:16]
+            root = Config.SNAPSHOT_DIR
+            target = os.path.join(root, version)
+            if not os.path.exists(os.path.join(target, 'questions.json')):
+                # الكتابة في مجلد مؤقت ثم إعادة تسميته: لا يرى أحد إصداراً ناقصاً
+                tmp_dir = f"{target}.{os.getpid()}.tmp"
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                os.makedirs(tmp_dir)
+                try:
+                    SnapshotPublisher._write(os.path.join(tmp_dir, 'questions.json'), body)
+                    
+                    categories = {}
+                    for question in questions:
+                        categories.setdefault(question.category, []).append(question)
+                    index = []
+                    for n, (name, members) in enumerate(sorted(categories.items(), key=lambda item: str(item[0])), 1):
+                        filename = f"category-{n}.json"
+                        SnapshotPublisher._write(os.path.join(tmp_dir, filename), questions_to_json(members))
+                        index.append({'name': name, 'file': filename, 'count': len(members)})
+                    SnapshotPublisher._write(
+                        os.path.join(tmp_dir, 'categories.json'),
+                        json.dumps(index, ensure_ascii=False).encode('utf-8')
+                    )
+                    
+                    size = Config.SNAPSHOT_PAGE_SIZE
+                    pages = max(1, -(-len(questions) // size))
+                    for page in range(1, pages + 1):
+                        chunk = questions[(page - 1) * size:page * size]
+                        header = f'{{"page":{page},"pages":{pages},"total":{len(questions)},"questions":'
+                        SnapshotPublisher._write(
+                            os.path.join(tmp_dir, f"page-{page}.json"),
+                            header.encode('ascii') + questions_to_json(chunk) + b'}'
+                        )
+                    
+                    try:
+                        os.rename(tmp_dir, target)
+                    except OSError:
+                        # عامل آخر نشر نفس الإصدار أولاً
+                        if not os.path.exists(os.path.join(target, 'questions.json')):
+                            raise
+                        shutil.rmtree(tmp_dir, ignore_errors=True)
+                except BaseException:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+                pages_count = pages
+            else:
+                pages_count = max(1, -(-len(questions) // Config.SNAPSHOT_PAGE_SIZE))
+            
+            pointer = {
+                'version': version,
+                'published_at': utc_now().isoformat() + 'Z',
+                'total': len(questions),
+                'questions': f"{version}/questions.json",
+                'categories': f"{version}/categories.json",
+                'pages': pages_count
+            }
+            tmp_path = os.path.join(root, f"{SnapshotPublisher.POINTER}.{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(pointer, f, ensure_ascii=False)
+            os.replace(tmp_path, os.path.join(root, SnapshotPublisher.POINTER))
+            
+            SnapshotPublisher._published.add(version)
+            SnapshotPublisher.last_version = version
+            SnapshotPublisher.publishes += 1
+            SnapshotPublisher.prune(version)
+            return version
+    
+    @staticmethod
+    def prune(current):
+        """حذف الإصدارات الأقدم من SNAPSHOT_KEEP (بترتيب وقت التعديل)"""
+        root = Config.SNAPSHOT_DIR
+        versions = sorted(
+            (entry for entry in os.scandir(root)
+             if entry.is_dir() and '.' not in entry.name and entry.name != current),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True
+        )
+        for entry in versions[max(Config.SNAPSHOT_KEEP - 1, 0):]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            SnapshotPublisher._published.discard(entry.name)
+    
+    @staticmethod
+    def schedule():
+        """طلب نشر في الخلفية (يُستدعى بعد كل كتابة على الأسئلة)"""
+        if not SnapshotPublisher.enabled():
+            return
+        SnapshotPublisher._requested = True
+        SnapshotPublisher._wakeup.set()
+        if SnapshotPublisher._thread is None:
+            with SnapshotPublisher._start_lock:
+                if SnapshotPublisher._thread is None:
+                    SnapshotPublisher._stopping.clear()
+                    thread = threading.Thread(target=SnapshotPublisher._run, name='snapshot-publisher', daemon=True)
+                    thread.start()
+                    SnapshotPublisher._thread = thread
+                    # أوامر CLI (مثل import-questions) تنشر قبل خروج العملية
+                    atexit.register(SnapshotPublisher.stop)
+    
+    @staticmethod
+    def _run():
+        """حلقة خيط النشر: طلبات متعددة أثناء نشر واحد تُدمج في نشر تالٍ واحد"""
+        while True:
+            SnapshotPublisher._wakeup.wait()
+            SnapshotPublisher._wakeup.clear()
+            if SnapshotPublisher._requested:
+                SnapshotPublisher._requested = False
+                try:
+                    version = SnapshotPublisher.publish()
+                    print(f"✅ Published question snapshot {version}")
+                except Exception as e:
+                    SnapshotPublisher.failures += 1
+                    print(f"❌ Error publishing question snapshot: {e}")
+            if SnapshotPublisher._stopping.is_set() and not SnapshotPublisher._requested:
+                return
+    
+    @staticmethod
+    def stop(timeout=30):
+        """انتظار النشر المعلق قبل خروج العملية"""
+        thread = SnapshotPublisher._thread
+        if thread is None:
+            return
+        SnapshotPublisher._stopping.set()
+        SnapshotPublisher._wakeup.set()
+        thread.join(timeout)
+        SnapshotPublisher._thread = None
+    
+    @staticmethod
+    def snapshot_url(payload):
+        """
+        رابط اللقطة المنشورة لحمولة /api/questions
+        
+        Returns:
+            str or None: None إذا لم يُنشر هذا المحتوى بعد (أو بدون SNAPSHOT_URL_PREFIX)
+        """
+        if not Config.SNAPSHOT_URL_PREFIX or not SnapshotPublisher.enabled():
+            return None
+        version = SnapshotPublisher.version_of(payload)
+        if version not in SnapshotPublisher._published:
+            if not os.path.exists(os.path.join(Config.SNAPSHOT_DIR, version, 'questions.json')):
+                return None
+            SnapshotPublisher._published.add(version)
+        return f"{Config.SNAPSHOT_URL_PREFIX.rstrip('/')}/{version}/questions.json"
+    
+    @staticmethod
+    def stats():
+        return {
+            'enabled': SnapshotPublisher.enabled(),
+            'publishes': SnapshotPublisher.publishes,
+            'failures': SnapshotPublisher.failures,
+            'version': SnapshotPublisher.last_version
+        }
+
+
+# ==================== محرك التصحيح ====================
+
+def normalize_answer(value):
+    """
+    توحيد الإجابة للمقارنة: رقم صحيح إن أمكن، وإلا نص
+    
+    Args:
+        value: الإجابة (نص أو رقم)
+    
+    Returns:
+        tuple: (int_value or None, str_value)
+    """
+    if isinstance(value, bool):
+        return None, str(value)
+    if isinstance(value, int):
+        return value, str(value)
+    if isinstance(value, str):
+        try:
+            return int(value), value
+        except ValueError:
+            return None, value
+    return None, str(value)
+
+
+class ScoringEngine:
+    """
+    محرك تصحيح الاختبار
+    Single-pass quiz scoring engine
+    
+    يبني فهرس (معرف السؤال ← الإجابة الصحيحة الموحدة) مرة واحدة لكل
+    إصدار من مجموعة الأسئلة، ثم يصحح أي إرسال في مرور واحد بدون أي
+    استعلام لقاعدة البيانات.
+    """
+    
+    _lock = threading.Lock()
+    # (version, index, total) - تُستبدل كوحدة واحدة لتجنب السباق بين الخيوط
+    _state = (None, {}, 0)
+    
+    @staticmethod
+    def build_index(questions):
+        """
+        بناء فهرس الإجابات الصحيحة
+        
+        Args:
+            questions (iterable): الأسئلة
+        
+        Returns:
+            dict: {str(id): (id, int_value or None, str_value)}
+        """
+        return {str(q.id): (q.id,) + q.answer_key for q in questions}
+    
+    @staticmethod
+    def get_index():
+        """
+        الحصول على الفهرس الحالي (يُعاد بناؤه عند تغير إصدار الأسئلة)
+        
+        Returns:
+            tuple: (index, total)
+        """
+        version, snapshot = QuestionCache.get()
+        state = ScoringEngine._state
+        if state[0] != version:
+            with ScoringEngine._lock:
+                state = ScoringEngine._state
+                if state[0] != version:
+                    state = (version, ScoringEngine.build_index(snapshot), len(snapshot))
+                    ScoringEngine._state = state
+        return state[1], state[2]
+    
+    @staticmethod
+    def is_correct(expected, user_answer):
+        """مقارنة إجابة المستخدم بالإجابة الصحيحة الموحدة"""
+        _, correct_int, correct_str = expected
+        if correct_int is None:
+            return correct_str == str(user_answer)
+        if isinstance(user_answer, str):
+            try:
+                return int(user_answer) == correct_int
+            except ValueError:
+                return correct_str == user_answer
+        if isinstance(user_answer, (int, float)):
+            return user_answer == correct_int
+        return correct_str == str(user_answer)
+    
+    @staticmethod
+    def score(answers, index=None, total=None, details=None, allowed=None):
+        """
+        تصحيح إرسال واحد
+        
+        Args:
+            answers (dict): {question_id: selected_answer}
+            index (dict): فهرس جاهز (اختياري)
+            total (int): عدد الأسئلة (اختياري)
+            details (list): إن وُجدت تُضاف إليها (question_id, answer, is_correct) لكل إجابة
+            allowed (set): معرفات الأسئلة المقدمة فعلاً (رمز الاختبار)؛ غيرها يُتجاهل
+        
+        Returns:
+            dict: {"score": int, "total": int, "percentage": float}
+        
+        Raises:
+            ValueError: إذا كان معرف السؤال غير رقمي
+        """
+        if index is None:
+            index, total = ScoringEngine.get_index()
+        
+        score = 0
+        is_correct = ScoringEngine.is_correct
+        seen = set()
+        for q_id, user_answer in answers.items():
+            expected = index.get(q_id if isinstance(q_id, str) else str(q_id))
+            if expected is None:
+                # المسار النادر: معرف بصيغة مختلفة ("01") أو غير رقمي (ValueError)
+                expected = index.get(str(int(q_id)))
+                if expected is None:
+                    continue
+            if allowed is not None and expected[0] not in allowed:
+                continue
+            # نفس السؤال بمفتاحين ("1" و "01") يُصحح مرة واحدة (الأول، كما في SubmissionWriter)
+            if expected[0] in seen:
+                continue
+            seen.add(expected[0])
+            correct = is_correct(expected, user_answer)
+            if correct:
+                score += 1
+            if details is not None:
+                details.append((expected[0], user_answer, correct))
+        
+        percentage = (score / total * 100) if total > 0 else 0
+        return {
+            'score': score,
+            'total': total,
+            'percentage': round(percentage, 2)
+        }
+    
+    @staticmethod
+    def score_many(submissions):
+        """
+        تصحيح عدة إرسالات دفعة واحدة (لإعادة التشغيل ومهام التقييم)
+        
+        Args:
+            submissions (iterable): قوائم إجابات أو قواميس {"answers": {...}}
+        
+        Returns:
+            list: نتيجة لكل إرسال، أو {"error": ...} للإرسال غير الصالح
+        """
+        index, total = ScoringEngine.get_index()
+        results = []
+        for submission in submissions:
+            answers = submission.get('answers', submission) if isinstance(submission, dict) else None
+            if not isinstance(answers, dict):
+                results.append({'error': 'الإجابات يجب أن تكون قاموس صحيح'})
+                continue
+            try:
+                results.append(ScoringEngine.score(answers, index, total))
+            except (ValueError, TypeError) as e:
+                results.append({'error': f'خطأ في معالجة البيانات: {str(e)}'})
+        return results
+
+
+# ==================== تجميع الاختبارات العشوائية ====================
+
+quiz_serializer = URLSafeTimedSerializer(Config.SECRET_KEY, salt='quiz-token')
+
+
+class QuizAssembler:
+    """
+    تجميع اختبارات قصيرة بعينات طبقية حسب الفئة
+    Stratified quiz assembly from the cached question set
+    
+    يحتفظ بمصفوفات معرفات لكل فئة مبنية مرة واحدة لكل إصدار من الأسئلة،
+    ويسحب عينة من N سؤال في O(N) بدون ORDER BY random().
+    """
+    
+    _lock = threading.Lock()
+    # (version, {category: tuple(ids)}, {id: question})
+    _state = (None, {}, {})
+    _random = random.SystemRandom()
+    
+    @staticmethod
+    def get_state():
+        """الحصول على مصفوفات الفئات للإصدار الحالي"""
+        version, snapshot = QuestionCache.get()
+        state = QuizAssembler._state
+        if state[0] != version:
+            with QuizAssembler._lock:
+                state = QuizAssembler._state
+                if state[0] != version:
+                    by_category = {}
+                    for q in snapshot:
+                        by_category.setdefault(q.category, []).append(q.id)
+                    state = (
+                        version,
+                        {c: tuple(ids) for c, ids in by_category.items()},
+                        {q.id: q for q in snapshot}
+                    )
+                    QuizAssembler._state = state
+        return state[1], state[2]
+    
+    @staticmethod
+    def allocate(size, counts):
+        """
+        توزيع حجم الاختبار على الفئات بالتناسب (طريقة أكبر باقٍ)
+        
+        Args:
+            size (int): عدد الأسئلة المطلوب
+            counts (dict): {category: available}
+        
+        Returns:
+            dict: {category: quota}
+        """
+        available = sum(counts.values())
+        if size >= available:
+            return dict(counts)
+        quotas = {}
+        remainders = []
+        for category, count in counts.items():
+            exact = size * count / available
+            quotas[category] = int(exact)
+            remainders.append((exact - int(exact), QuizAssembler._random.random(), category))
+        for _, _, category in sorted(remainders, reverse=True)[:size - sum(quotas.values())]:
+            quotas[category] += 1
+        return quotas
+    
+    @staticmethod
+    def assemble(size, categories=None):
+        """
+        تجميع اختبار عشوائي
+        
+        Args:
+            size (int): عدد الأسئلة
+            categories (list): الفئات المسموحة (None = الكل)
+        
+        Returns:
+            list: الأسئلة بترتيب عشوائي
+        """
+        by_category, by_id = QuizAssembler.get_state()
+        if categories:
+            by_category = {c: ids for c, ids in by_category.items() if c in categories}
+        quotas = QuizAssembler.allocate(size, {c: len(ids) for c, ids in by_category.items()})
+        
+        ids = []
+        for category, quota in quotas.items():
+            if quota:
+                ids.extend(QuizAssembler._random.sample(by_category[category], quota))
+        QuizAssembler._random.shuffle(ids)
+        return [by_id[q_id] for q_id in ids]
+    
+    @staticmethod
+    def issue_token(questions):
+        """رمز موقّع يحمل معرفات الأسئلة المقدمة"""
+        return quiz_serializer.dumps([q.id for q in questions])
+    
+    @staticmethod
+    def read_token(token):
+        """
+        قراءة رمز الاختبار والتحقق منه
+        
+        Returns:
+            set: معرفات الأسئلة
+        
+        Raises:
+            ValueError: إذا كان الرمز غير صالح أو منتهي الصلاحية
+        """
+        try:
+            ids = quiz_serializer.loads(token, max_age=Config.QUIZ_TOKEN_MAX_AGE)
+        except SignatureExpired:
+            raise ValueError('انتهت صلاحية الاختبار، يرجى البدء من جديد')
+        except BadSignature:
+            raise ValueError('رمز الاختبار غير صالح')
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            raise ValueError('رمز الاختبار غير صالح')
+        return set(ids)
+
+
+@app.route('/api/quiz')
+def get_quiz():
+    """
+    نقطة API لتجميع اختبار قصير عشوائي
+    Assemble a Randomized Quiz
+    
+    Query Parameters:
+        size (int): عدد الأسئلة (الافتراضي QUIZ_SIZE أو 10)
+        category (str): فئة مسموحة (يمكن تكرارها)
+    
+    Returns:
+        JSON: {"quiz_token": str, "questions": [...]}
+    """
+    try:
+        size = request.args.get('size', Config.QUIZ_SIZE or 10, type=int)
+        size = max(1, min(size, Config.MAX_QUESTIONS))
+        questions = QuizAssembler.assemble(size, request.args.getlist('category') or None)
+        if not questions:
+            return jsonify({'error': 'لا توجد أسئلة محفوظة. يرجى إضافة أسئلة من لوحة التحكم'}), 404
+        
+        # بايتات الأسئلة المخزنة تُجمع مباشرة بدلاً من تسلسلها في كل طلب
+        body = (b'{"quiz_token":' + json.dumps(QuizAssembler.issue_token(questions)).encode('utf-8')
+                + b',"questions":' + questions_to_json(questions) + b'}')
+        response = Response(body, mimetype='application/json')
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    except Exception as e:
+        print(f"❌ Error assembling quiz: {e}")
+        return jsonify({'error': 'خطأ في تحميل الأسئلة'}), 500
+
+
+# ==================== حفظ الإرسالات في الخلفية ====================
+
+class SubmissionWriter:
+    """
+    كاتب الإرسالات في الخلفية
+    Background, batched submission writer
+    
+    مسار الطلب يضيف الإرسال إلى طابور محدود فقط، وخيط في الخلفية يكتب
+    الدفعات عند امتلاء الدفعة أو مرور SUBMISSION_FLUSH_INTERVAL.
+    - الضغط العكسي: إذا امتلأ الطابور ينتظر الطلب مهلة قصيرة ثم يتخلى عن الحفظ
+    - الإيقاف الآمن: atexit يفرغ الطابور قبل خروج العملية
+    """
+    
+    _queue = queue.Queue(maxsize=Config.SUBMISSION_QUEUE_SIZE)
+    _thread = None
+    _lock = threading.Lock()
+    _stopping = threading.Event()
+    _SENTINEL = object()
+    
+    enqueued = 0
+    dropped = 0
+    written = 0
+    flushes = 0
+    failures = 0
+    
+    @staticmethod
+    def start():
+        """تشغيل خيط الكتابة (مرة واحدة لكل عملية)"""
+        if SubmissionWriter._thread is not None:
+            return
+        with SubmissionWriter._lock:
+            if SubmissionWriter._thread is None:
+                SubmissionWriter._stopping.clear()
+                thread = threading.Thread(
+                    target=SubmissionWriter._run,
+                    name='submission-writer',
+                    daemon=True
+                )
+                thread.start()
+                SubmissionWriter._thread = thread
+                atexit.register(SubmissionWriter.stop)
+    
+    @staticmethod
+    def enqueue(record, timeout=None):
+        """
+        إضافة إرسال إلى الطابور
+        
+        Args:
+            record (dict): الإرسال (انظر build_submission_record)
+            timeout (float): مهلة الانتظار عند امتلاء الطابور (0 = بدون انتظار)
+        
+        Returns:
+            bool: False إذا كان الطابور ممتلئاً (لم يُحفظ الإرسال)
+        """
+        if SubmissionWriter._stopping.is_set():
+            SubmissionWriter.dropped += 1
+            return False
+        SubmissionWriter.start()
+        try:
+            SubmissionWriter._queue.put(
+                record, timeout=Config.SUBMISSION_ENQUEUE_TIMEOUT if timeout is None else timeout
+            )
+        except queue.Full:
+            SubmissionWriter.dropped += 1
+            return False
+        SubmissionWriter.enqueued += 1
+        return True
+    
+    @staticmethod
+    def write_batch(batch):
+        """
+        كتابة دفعة إرسالات في معاملة واحدة
+        
+        Args:
+            batch (list): قائمة الإرسالات
+        """
+        attempts = []
+        answers = []
+        question_counts = {}   # question_id -> [attempts, correct]
+        option_counts = {}     # (question_id, answer) -> picks
+        for record in batch:
+            attempts.append((
+                record['id'], record['submitted_at'],
+                record['score'], record['total'], record['percentage']
+            ))
+            seen = set()
+            for question_id, answer, is_correct in record['answers']:
+                # نفس السؤال بمفتاحين مختلفين ("1" و "01") يُحسب مرة واحدة
+                if question_id in seen:
+                    continue
+                seen.add(question_id)
+                answer = None if answer is None else str(answer)
+                answers.append((record['id'], question_id, answer, is_correct))
+                
+                counts = question_counts.setdefault(question_id, [0, 0])
+                counts[0] += 1
+                counts[1] += is_correct
+                if answer is not None:
+                    key = (question_id, answer)
+                    option_counts[key] = option_counts.get(key, 0) + 1
+        
+        Database.backend().write_submissions(attempts, answers, question_counts, option_counts)
+        
+        SubmissionWriter.written += len(batch)
+        SubmissionWriter.flushes += 1
+    
+    @staticmethod
+    def _collect(first):
+        """جمع دفعة حتى الحجم الأقصى أو انتهاء فترة التفريغ"""
+        batch = [] if first is SubmissionWriter._SENTINEL else [first]
+        deadline = time.monotonic() + Config.SUBMISSION_FLUSH_INTERVAL
+        while len(batch) < Config.SUBMISSION_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if SubmissionWriter._stopping.is_set():
+                remaining = 0
+            try:
+                item = SubmissionWriter._queue.get(timeout=remaining) if remaining > 0 \
+                    else SubmissionWriter._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not SubmissionWriter._SENTINEL:
+                batch.append(item)
+        return batch
+    
+    @staticmethod
+    def _flush(batch):
+        """كتابة دفعة مع إعادة المحاولة (الدفعة لا تُفقد عند تعطل قاعدة البيانات مؤقتاً)"""
+        delay = 0.5
+        while True:
+            try:
+                SubmissionWriter.write_batch(batch)
+                return
+            except Exception as e:
+                SubmissionWriter.failures += 1
+                print(f"❌ Error writing submissions batch ({len(batch)}): {e}")
+                if SubmissionWriter._stopping.is_set():
+                    # محاولة أخيرة واحدة عند الإيقاف
+                    try:
+                        SubmissionWriter.write_batch(batch)
+                    except Exception as e:
+                        print(f"❌ Lost {len(batch)} submissions on shutdown: {e}")
+                    return
+                SubmissionWriter._stopping.wait(delay)
+                delay = min(delay * 2, 30)
+    
+    @staticmethod
+    def _run():
+        """حلقة خيط الكتابة"""
+        while True:
+            try:
+                first = SubmissionWriter._queue.get(timeout=Config.SUBMISSION_FLUSH_INTERVAL)
+            except queue.Empty:
+                if SubmissionWriter._stopping.is_set():
+                    return
+                continue
+            batch = SubmissionWriter._collect(first)
+            if batch:
+                SubmissionWriter._flush(batch)
+            if SubmissionWriter._stopping.is_set() and SubmissionWriter._queue.empty():
+                return
+    
+    @staticmethod
+    def stop(timeout=None):
+        """إيقاف الخيط بعد تفريغ الطابور"""
+        thread = SubmissionWriter._thread
+        if thread is None:
+            return
+        SubmissionWriter._stopping.set()
+        try:
+            SubmissionWriter._queue.put_nowait(SubmissionWriter._SENTINEL)
+        except queue.Full:
+            pass
+        thread.join(Config.SUBMISSION_SHUTDOWN_TIMEOUT if timeout is None else timeout)
+        if thread.is_alive():
+            print(f"⚠️ Submission writer still busy; {SubmissionWriter._queue.qsize()} submissions pending")
+        SubmissionWriter._thread = None
+    
+    @staticmethod
+    def stats():
+        """إحصائيات الكاتب"""
+        return {
+            'queued': SubmissionWriter._queue.qsize(),
+            'enqueued': SubmissionWriter.enqueued,
+            'dropped': SubmissionWriter.dropped,
+            'written': SubmissionWriter.written,
+            'flushes': SubmissionWriter.flushes,
+            'failures': SubmissionWriter.failures
+        }
+
+
+def build_submission_record(result, details, submitted_at=None):
+    """
+    بناء سجل إرسال للحفظ
+    
+    Args:
+        result (dict): نتيجة ScoringEngine.score
+        details (list): (question_id, answer, is_correct) لكل إجابة
+        submitted_at (datetime): وقت الإرسال (الافتراضي: الآن)
+    
+    Returns:
+        dict: السجل
+    """
+    return {
+        'id': str(uuid.uuid4()),
+        'submitted_at': submitted_at or utc_now(),
+        'score': result['score'],
+        'total': result['total'],
+        'percentage': result['percentage'],
+        'answers': details
+    }
+
+
+# ==================== ترتيب النتائج ====================
+
+class ScoreHistogram:
+    """
+    مدرج تكراري للدرجات 0..size في شجرة Fenwick
+    Score histogram backed by a Fenwick (binary indexed) tree
+    
+    الإضافة وعدّ الدرجات الأقل كلاهما O(log size).
+    """
+    
+    __slots__ = ('_tree', 'count')
+    
+    def __init__(self, size):
+        self._tree = [0] * (size + 2)
+        self.count = 0
+    
+    def add(self, score, n=1):
+        tree = self._tree
+        if not 0 <= score <= len(tree) - 2:
+            raise ValueError(f"score {score} outside 0..{len(tree) - 2}")
+        i = score + 1
+        while i < len(tree):
+            tree[i] += n
+            i += i & -i
+        self.count += n
+    
+    def below(self, score):
+        """عدد المحاولات بدرجة أقل من score"""
+        total = 0
+        i = min(score, len(self._tree) - 1)
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+    
+    def counts(self):
+        """العدد لكل درجة (للقطة)"""
+        cumulative = [self.below(score) for score in range(len(self._tree))]
+        return [cumulative[i + 1] - cumulative[i] for i in range(len(cumulative) - 1)]
+
+
+class Ranking:
+    """
+    ترتيب النتائج في الذاكرة
+    In-memory percentile ranking per quiz
+    
+    مدرج لكل طول اختبار (total) - الدرجات قابلة للمقارنة فقط بين اختبارات بنفس
+    عدد الأسئلة. كل إرسال يُضاف ويُرتَّب في O(log n) بدون أي استعلام.
+    
+    - البذر: مجموع attempts حسب (total, score) مرة واحدة في خيط الخلفية،
+      أو من لقطة RANKING_SNAPSHOT_PATH ثم المحاولات الأحدث منها فقط
+    - المزامنة: كل RANKING_SYNC_INTERVAL تُضاف محاولات العمال الآخرين حتى
+      (الآن - RANKING_SETTLE_SECONDS)، وتُطرح إرسالات هذه العملية في تلك الفترة
+      لأنها أصبحت ضمن نتيجة الاستعلام
+    - اللقطة: تُكتب بعد كل مزامنة غيّرت العدادات (ذرياً عبر os.replace)
+    """
+    
+    _lock = threading.Lock()
+    _start_lock = threading.Lock()
+    _histograms = {}        # total -> ScoreHistogram
+    _pending = []           # (submitted_at, total, score) لإرسالات محلية بعد _synced_until
+    _synced_until = None    # محاولات القاعدة حتى هذا الوقت محسوبة
+    _ready = False
+    _started = False
+    _thread = None
+    _stopping = threading.Event()
+    
+    syncs = 0
+    failures = 0
+    snapshot_loaded = False
+    
+    @staticmethod
+    def _persistent():
+        """الترتيب يُبذر من القاعدة فقط إذا كانت الإرسالات تُحفظ"""
+        return Config.PERSIST_SUBMISSIONS
+    
+    @staticmethod
+    def _fingerprint():
+        """بصمة المخزن حتى لا تُستخدم لقطة من قاعدة بيانات أخرى"""
+        if Config.STORAGE_BACKEND == 'memory':
+            return None
+        source = Config.DATABASE_URL if Config.STORAGE_BACKEND == 'postgres' else os.path.abspath(Config.SQLITE_PATH)
+        return hashlib.sha256(f"{Config.STORAGE_BACKEND}:{source}".encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def start():
+        """تحميل اللقطة وتشغيل خيط المزامنة (مرة واحدة لكل عملية)"""
+        if Ranking._started:
+            return
+        with Ranking._start_lock:
+            if Ranking._started:
+                return
+            if not Ranking._persistent():
+                # بدون حفظ لا يوجد ما يُبذر منه: ترتيب إرسالات هذه العملية فقط
+                Ranking._ready = True
+            else:
+                Ranking.load_snapshot()
+                Ranking._stopping.clear()
+                thread = threading.Thread(target=Ranking._run, name='ranking-sync', daemon=True)
+                thread.start()
+                Ranking._thread = thread
+            Ranking._started = True
+    
+    @staticmethod
+    def record(score, total, submitted_at, stored=True):
+        """
+        إضافة إرسال وحساب ترتيبه
+        
+        Args:
+            score (int): الدرجة (تُحصر في 0..total)
+            total (int): عدد الأسئلة
+            submitted_at (datetime): وقت الإرسال (UTC)
+            stored (bool): False إذا لم يدخل الإرسال طابور الحفظ - يُرتَّب بدون
+                إضافته، حتى يبقى المدرج = القاعدة + الإرسالات المعلقة
+        
+        Returns:
+            dict: {"percentile": float, "rank": int, "players": int}
+                  percentile = نسبة اللاعبين الآخرين بدرجة أقل؛ القيم None قبل اكتمال البذر
+        """
+        Ranking.start()
+        if total <= 0:
+            return {'percentile': None, 'rank': None, 'players': None}
+        score = max(0, min(score, total))
+        persistent = Ranking._persistent()
+        with Ranking._lock:
+            histogram = Ranking._histograms.get(total)
+            if histogram is None:
+                histogram = Ranking._histograms[total] = ScoreHistogram(total)
+            others = histogram.count
+            below = histogram.below(score)
+            above = others - histogram.below(score + 1)
+            if stored or not persistent:
+                histogram.add(score)
+                if persistent:
+                    Ranking._pending.append((submitted_at, total, score))
+            ready = Ranking._ready
+        if not ready:
+            return {'percentile': None, 'rank': None, 'players': None}
+        return {
+            'percentile': round(below / others * 100, 1) if others else None,
+            'rank': above + 1,
+            'players': others + 1
+        }
+    
+    @staticmethod
+    def sync():
+        """
+        إضافة محاولات القاعدة الجديدة حتى (الآن - RANKING_SETTLE_SECONDS)
+        
+        Returns:
+            int: عدد المحاولات المضافة من القاعدة
+        """
+        until = utc_now() - timedelta(seconds=Config.RANKING_SETTLE_SECONDS)
+        after = Ranking._synced_until
+        if after is not None and until <= after:
+            return 0
+        rows = Database.backend().score_histogram(after, until)
+        added = 0
+        with Ranking._lock:
+            for total, score, count in rows:
+                if total <= 0:
+                    continue
+                histogram = Ranking._histograms.get(total)
+                if histogram is None:
+                    histogram = Ranking._histograms[total] = ScoreHistogram(total)
+                histogram.add(max(0, min(score, total)), count)
+                added += count
+            # إرسالات هذه العملية حتى until أصبحت ضمن نتيجة الاستعلام
+            pending = []
+            for entry in Ranking._pending:
+                if entry[0] <= until:
+                    Ranking._histograms[entry[1]].add(entry[2], -1)
+                else:
+                    pending.append(entry)
+            Ranking._pending = pending
+            Ranking._synced_until = until
+            Ranking._ready = True
+        Ranking.syncs += 1
+        return added
+    
+    @staticmethod
+    def _run():
+        """حلقة خيط المزامنة"""
+        while not Ranking._stopping.is_set():
+            try:
+                if Ranking.sync() or Ranking.syncs == 1:
+                    Ranking.save_snapshot()
+            except Exception as e:
+                Ranking.failures += 1
+                print(f"❌ Error syncing score ranking: {e}")
+            Ranking._stopping.wait(Config.RANKING_SYNC_INTERVAL)
+    
+    @staticmethod
+    def load_snapshot():
+        """تحميل لقطة المدرج إن وُجدت وتطابقت بصمة المخزن"""
+        path = Config.RANKING_SNAPSHOT_PATH
+        fingerprint = Ranking._fingerprint()
+        if not path or fingerprint is None or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            if snapshot.get('fingerprint') != fingerprint:
+                return False
+            synced_until = datetime.fromisoformat(snapshot['synced_until'])
+            histograms = {}
+            for total, counts in snapshot['histograms'].items():
+                histogram = histograms[int(total)] = ScoreHistogram(int(total))
+                for score, count in enumerate(counts):
+                    if count:
+                        histogram.add(score, count)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Ignoring unreadable ranking snapshot {path}: {e}")
+            return False
+        with Ranking._lock:
+            Ranking._histograms = histograms
+            Ranking._synced_until = synced_until
+            Ranking._ready = True
+        Ranking.snapshot_loaded = True
+        return True
+    
+    @staticmethod
+    def save_snapshot():
+        """كتابة عدادات القاعدة (بدون الإرسالات المحلية غير المزامنة) ذرياً"""
+        path = Config.RANKING_SNAPSHOT_PATH
+        fingerprint = Ranking._fingerprint()
+        if not path or fingerprint is None:
+            return False
+        with Ranking._lock:
+            histograms = {total: histogram.counts() for total, histogram in Ranking._histograms.items()}
+            for _, total, score in Ranking._pending:
+                histograms[total][score] -= 1
+            synced_until = Ranking._synced_until
+        if synced_until is None:
+            return False
+        snapshot = {
+            'fingerprint': fingerprint,
+            'synced_until': synced_until.isoformat(),
+            'histograms': {str(total): counts for total, counts in histograms.items()}
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write ranking snapshot {path}: {e}")
+            return False
+        return True
+    
+    @staticmethod
+    def reset():
+        """إيقاف المزامنة وحذف اللقطة (بعد تعديل المحاولات يدوياً)"""
+        Ranking._stopping.set()
+        if Ranking._thread is not None:
+            Ranking._thread.join(5)
+        with Ranking._lock:
+            Ranking._histograms = {}
+            Ranking._pending = []
+            Ranking._synced_until = None
+            Ranking._ready = False
+        Ranking._thread = None
+        Ranking._started = False
+        path = Config.RANKING_SNAPSHOT_PATH
+        if path and os.path.exists(path):
+            os.remove(path)
+    
+    @staticmethod
+    def stats():
+        with Ranking._lock:
+            players = sum(histogram.count for histogram in Ranking._histograms.values())
+            quizzes = len(Ranking._histograms)
+            pending = len(Ranking._pending)
+        return {
+            'ready': Ranking._ready,
+            'players': players,
+            'quizzes': quizzes,
+            'pending': pending,
+            'syncs': Ranking.syncs,
+            'failures': Ranking.failures,
+            'snapshot_loaded': Ranking.snapshot_loaded
+        }
+
+
+# ==================== قياس الإقلاع البارد ====================
+
+class ColdStart:
+    """
+    زمن الإقلاع البارد لكل عملية
+    Per-process cold start timing
+    
+    import_ms: من بداية الاستيراد حتى جاهزية الوحدة
+    first_response_ms: من بداية الاستيراد حتى أول استجابة (تقريب لـ time to first byte)
+    """
+    
+    _lock = threading.Lock()
+    import_ms = None
+    first_response_ms = None
+    first_path = None
+    
+    @staticmethod
+    def stats():
+        """أرقام الإقلاع البارد"""
+        return {
+            'import_ms': ColdStart.import_ms,
+            'first_response_ms': ColdStart.first_response_ms,
+            'first_path': ColdStart.first_path
+        }
+    
+    @staticmethod
+    def record(path):
+        """
+        تسجيل أول استجابة في العملية (WSGI أو ASGI)
+        
+        Returns:
+            str or None: قيمة ترويسة Server-Timing لأول استجابة فقط
+        """
+        if ColdStart.first_response_ms is not None:
+            return None
+        with ColdStart._lock:
+            if ColdStart.first_response_ms is not None:
+                return None
+            ColdStart.first_response_ms = round((time.perf_counter() - PROCESS_STARTED) * 1000, 1)
+            ColdStart.first_path = path
+        print(f"✅ Cold start: import {ColdStart.import_ms}ms, "
+              f"first response {ColdStart.first_response_ms}ms ({path})")
+        return f"import;dur={ColdStart.import_ms}, cold-start;dur={ColdStart.first_response_ms}"
+
+
+@app.after_request
+def report_cold_start(response):
+    """تسجيل زمن أول استجابة في العملية وإرساله في ترويسة Server-Timing"""
+    server_timing = ColdStart.record(request.path)
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
+
+# ==================== مقاييس الطلبات ====================
+
+# مقاييس الطلب الحالي (تعمل مع الخيوط و asyncio؛ None خارج الطلبات)
+_request_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """عدادات طلب واحد"""
+    __slots__ = ('started', 'queries', 'db_seconds', 'pool_wait', 'breakdown')
+    
+    def __init__(self, breakdown):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait = 0.0
+        self.breakdown = [] if breakdown else None
+
+
+class Metrics:
+    """
+    مقاييس الأداء لكل مسار بصيغة Prometheus
+    Per-route request metrics (Prometheus text format)
+    
+    لكل (method, route): مدرج زمني للاستجابة، مدرج لعدد الاستعلامات في الطلب،
+    زمن قاعدة البيانات، زمن انتظار pool، وحجم الاستجابة. الكلفة: قفل واحد
+    و bisect لكل طلب، وإضافة عدادات لكل استعلام.
+    """
+    
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50)
+    
+    _lock = threading.Lock()
+    # (method, route) -> [count, seconds, latency_buckets, query_buckets, queries, db_seconds, pool_wait, bytes]
+    _routes = {}
+    _statuses = {}     # (method, route, status) -> count
+    slow_requests = 0
+    
+    @staticmethod
+    def start():
+        """بدء قياس الطلب الحالي"""
+        if not Config.METRICS_ENABLED:
+            return None
+        metrics = RequestMetrics(Config.SLOW_REQUEST_MS > 0)
+        _request_metrics.set(metrics)
+        return metrics
+    
+    @staticmethod
+    def record_query(name, elapsed):
+        """تسجيل استعلام في الطلب الحالي (لا شيء خارج الطلبات، مثل كاتب الإرسالات)"""
+        metrics = _request_metrics.get()
+        if metrics is not None:
+            metrics.queries += 1
+            metrics.db_seconds += elapsed
+            if metrics.breakdown is not None:
+                metrics.breakdown.append((name, elapsed))
+    
+    @staticmethod
+    def record_sqlite(statement):
+        """trace callback لاتصالات sqlite"""
+        Metrics.record_query('sqlite:' + statement.lstrip().split(None, 1)[0].upper(), 0.0)
+    
+    @staticmethod
+    def record_pool_wait(waited):
+        """تسجيل انتظار اتصال من pool في الطلب الحالي"""
+        metrics = _request_metrics.get()
+        if metrics is not None:
+            metrics.pool_wait += waited
+    
+    @staticmethod
+    def finish(method, route, status, size):
+        """
+        إنهاء قياس الطلب الحالي وتحديث المجاميع
+        
+        Args:
+            method (str): طريقة HTTP
+            route (str): قاعدة المسار (وليس المسار الفعلي، لتحديد عدد السلاسل)
+            status (int): رمز الحالة
+            size (int or None): حجم الجسم (None للاستجابات المتدفقة)
+        """
+        metrics = _request_metrics.get()
+        if metrics is None:
+            return
+        _request_metrics.set(None)
+        elapsed = time.perf_counter() - metrics.started
+        key = (method, route)
+        with Metrics._lock:
+            entry = Metrics._routes.get(key)
+            if entry is None:
+                entry = Metrics._routes[key] = [
+                    0, 0.0, [0] * len(Metrics.LATENCY_BUCKETS), [0] * len(Metrics.QUERY_BUCKETS), 0, 0.0, 0.0, 0
+                ]
+            entry[0] += 1
+            entry[1] += elapsed
+            latency_index = bisect.bisect_left(Metrics.LATENCY_BUCKETS, elapsed)
+            if latency_index < len(Metrics.LATENCY_BUCKETS):
+                entry[2][latency_index] += 1
+            query_index = bisect.bisect_left(Metrics.QUERY_BUCKETS, metrics.queries)
+            if query_index < len(Metrics.QUERY_BUCKETS):
+                entry[3][query_index] += 1
+            entry[4] += metrics.queries
+            entry[5] += metrics.db_seconds
+            entry[6] += metrics.pool_wait
+            entry[7] += size or 0
+            status_key = (method, route, status)
+            Metrics._statuses[status_key] = Metrics._statuses.get(status_key, 0) + 1
+        
+        if Config.SLOW_REQUEST_MS and elapsed * 1000 >= Config.SLOW_REQUEST_MS:
+            Metrics.slow_requests += 1
+            Metrics.log_slow_request(method, route, status, elapsed, metrics)
+    
+    @staticmethod
+    def log_slow_request(method, route, status, elapsed, metrics):
+        """سطر سجل للطلب البطيء مع تفصيل الاستعلامات حسب الاسم"""
+        totals = {}
+        for name, seconds in metrics.breakdown:
+            calls, total = totals.get(name, (0, 0.0))
+            totals[name] = (calls + 1, total + seconds)
+        breakdown = ', '.join(
+            f"{name} x{calls} {total * 1000:.1f}ms"
+            for name, (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1])
+        )
+        print(f"⚠️ Slow request: {method} {route} -> {status} in {elapsed * 1000:.1f}ms "
+              f"(db {metrics.db_seconds * 1000:.1f}ms in {metrics.queries} queries, "
+              f"pool wait {metrics.pool_wait * 1000:.1f}ms){': ' + breakdown if breakdown else ''}")
+    
+    @staticmethod
+    def _labels(**labels):
+        """تنسيق التسميات مع الهروب"""
+        return '{' + ','.join(
+            f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for name, value in labels.items()
+        ) + '}'
+    
+    @staticmethod
+    def render():
+        """
+        جميع المقاييس بصيغة Prometheus النصية
+        
+        Returns:
+            str: النص
+        """
+        labels = Metrics._labels
+        with Metrics._lock:
+            routes = [(key, [entry[0], entry[1], list(entry[2]), list(entry[3])] + entry[4:])
+                      for key, entry in sorted(Metrics._routes.items())]
+            statuses = sorted(Metrics._statuses.items())
+        lines = []
+        
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        
+        metric('quiz_http_requests_total', 'counter', 'Requests by route and status', [
+            f"quiz_http_requests_total{labels(method=method, route=route, status=status)} {count}"
+            for (method, route, status), count in statuses
+        ])
+        
+        for name, help_text, buckets, bucket_index, sum_index in (
+            ('quiz_http_request_duration_seconds', 'Request latency', Metrics.LATENCY_BUCKETS, 2, 1),
+            ('quiz_http_request_db_queries', 'Database queries per request', Metrics.QUERY_BUCKETS, 3, 4)
+        ):
+            samples = []
+            for (method, route), entry in routes:
+                cumulative = 0
+                for bound, count in zip(buckets, entry[bucket_index]):
+                    cumulative += count
+                    samples.append(f"{name}_bucket{labels(method=method, route=route, le=bound)} {cumulative}")
+                samples.append(f"{name}_bucket{labels(method=method, route=route, le='+Inf')} {entry[0]}")
+                samples.append(f"{name}_sum{labels(method=method, route=route)} {entry[sum_index]}")
+                samples.append(f"{name}_count{labels(method=method, route=route)} {entry[0]}")
+            metric(name, 'histogram', help_text, samples)
+        
+        for name, help_text, index in (
+            ('quiz_http_request_db_seconds_total', 'Time spent in database queries', 5),
+            ('quiz_http_request_pool_wait_seconds_total', 'Time spent waiting for a pooled connection', 6),
+            ('quiz_http_response_bytes_total', 'Response body bytes (streamed responses excluded)', 7)
+        ):
+            metric(name, 'counter', help_text, [
+                f"{name}{labels(method=method, route=route)} {entry[index]}"
+                for (method, route), entry in routes
+            ])
+        metric('quiz_http_slow_requests_total', 'counter', 'Requests slower than SLOW_REQUEST_MS',
+               [f"quiz_http_slow_requests_total {Metrics.slow_requests}"])
+        
+        statements = Database.statement_stats()
+        for name, help_text, field, scale in (
+            ('quiz_db_statement_calls_total', 'Executions per named statement', 'calls', 1),
+            ('quiz_db_statement_errors_total', 'Failed executions per named statement', 'errors', 1),
+            ('quiz_db_statement_rows_total', 'Rows returned per named statement', 'rows', 1),
+            ('quiz_db_statement_seconds_total', 'Execution time per named statement', 'total_ms', 0.001)
+        ):
+            metric(name, 'counter', help_text, [
+                f"{name}{labels(statement=statement)} {stats[field] * scale:g}"
+                for statement, stats in statements.items()
+            ])
+        
+        pool = Database.pool_stats()
+        if pool is not None:
+            for field, kind in (('size', 'gauge'), ('in_use', 'gauge'), ('idle', 'gauge'),
+                                ('max_size', 'gauge'), ('checkouts', 'counter'),
+                                ('checkout_failures', 'counter'), ('timeouts', 'counter'),
+                                ('recycled', 'counter'), ('wait_time_total', 'counter'),
+                                ('wait_time_max', 'gauge')):
+                name = f"quiz_db_pool_{field.replace('wait_time', 'wait_seconds')}"
+                metric(name, kind, f"Connection pool {field.replace('_', ' ')}", [f"{name} {pool[field]}"])
+        
+        routing = ReplicaRouter.stats()
+        metric('quiz_db_reads_total', 'counter', 'Routed reads by target', [
+            f"quiz_db_reads_total{labels(target='primary')} {routing['primary_reads']}",
+            f"quiz_db_reads_total{labels(target='replica')} {routing['replica_reads']}"
+        ])
+        if routing['replicas']:
+            for field, name, kind in (('healthy', 'quiz_db_replica_healthy', 'gauge'),
+                                      ('lag_seconds', 'quiz_db_replica_lag_seconds', 'gauge'),
+                                      ('failures', 'quiz_db_replica_failures_total', 'counter'),
+                                      ('reads', 'quiz_db_replica_reads_total', 'counter')):
+                metric(name, kind, f"Read replica {field.replace('_', ' ')}", [
+                    f"{name}{labels(replica=replica['name'])} {int(replica[field]) if field == 'healthy' else replica[field]}"
+                    for replica in routing['replicas'] if replica[field] is not None
+                ])
+        
+        cache = QuestionCache.stats()
+        for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('hit_ratio', 'gauge'),
+                            ('size', 'gauge'), ('version', 'gauge'), ('age_seconds', 'gauge')):
+            if cache[field] is not None:
+                name = f"quiz_question_cache_{field}" + ('_total' if kind == 'counter' else '')
+                metric(name, kind, f"Question cache {field.replace('_', ' ')}", [f"{name} {cache[field]}"])
+        
+        local = PayloadCache._entries.stats()
+        for field, kind in (('hits', 'counter'), ('misses', 'counter'), ('evictions', 'counter'), ('size', 'gauge')):
+            name = f"quiz_payload_cache_{field}" + ('_total' if kind == 'counter' else '')
+            metric(name, kind, f"Local payload LRU {field}", [f"{name} {local[field]}"])
+        shared = SharedCache.stats()
+        if shared['enabled']:
+            metric('quiz_shared_cache_available', 'gauge', 'Shared cache tier reachable',
+                   [f"quiz_shared_cache_available {int(shared['available'])}"])
+            for field in ('hits', 'misses', 'builds', 'lock_waits', 'errors', 'published', 'received'):
+                name = f"quiz_shared_cache_{field}_total"
+                metric(name, 'counter', f"Shared cache {field.replace('_', ' ')}", [f"{name} {shared[field]}"])
+        
+        limiter = RateLimiter.stats()
+        metric('quiz_rate_limit_clients', 'gauge', 'Tracked rate limit buckets',
+               [f"quiz_rate_limit_clients {limiter['clients']}"])
+        for field in ('allowed', 'limited', 'evictions'):
+            name = f"quiz_rate_limit_{field}_total"
+            metric(name, 'counter', f"Rate limiter {field}", [f"{name} {limiter[field]}"])
+        metric('quiz_submissions_replayed_total', 'counter', 'Duplicate submissions answered from the dedup window',
+               [f"quiz_submissions_replayed_total {SubmissionDeduper.replayed}"])
+        
+        if SnapshotPublisher.enabled():
+            for field in ('publishes', 'failures'):
+                name = f"quiz_snapshot_{field}_total"
+                metric(name, 'counter', f"Static snapshot {field}", [f"{name} {getattr(SnapshotPublisher, field)}"])
+        
+        if Config.RANKING_ENABLED:
+            ranking = Ranking.stats()
+            for field, kind in (('ready', 'gauge'), ('players', 'gauge'), ('pending', 'gauge'),
+                                ('syncs', 'counter'), ('failures', 'counter')):
+                name = f"quiz_ranking_{field}" + ('_total' if kind == 'counter' else '')
+                metric(name, kind, f"Score ranking {field}", [f"{name} {int(ranking[field])}"])
+        
+        if Profiler.enabled() or Profiler.samples:
+            metric('quiz_profiler_active_requests', 'gauge', 'Requests currently being profiled',
+                   [f"quiz_profiler_active_requests {len(Profiler._active)}"])
+            for field, value in (('samples', Profiler.samples), ('slow_captures', Profiler.slow_captures),
+                                 ('overhead_seconds', round(Profiler.overhead_seconds, 6))):
+                name = f"quiz_profiler_{field}_total"
+                metric(name, 'counter', f"Profiler {field.replace('_', ' ')}", [f"{name} {value}"])
+        
+        writer = SubmissionWriter.stats()
+        for field in ('queued', 'enqueued', 'dropped', 'written', 'flushes', 'failures'):
+            kind = 'gauge' if field == 'queued' else 'counter'
+            name = f"quiz_submissions_{field}" + ('' if kind == 'gauge' else '_total')
+            metric(name, kind, f"Submission writer {field}", [f"{name} {writer[field]}"])
+        
+        cold = ColdStart.stats()
+        for field in ('import_ms', 'first_response_ms'):
+            if cold[field] is not None:
+                name = f"quiz_cold_start_{field.replace('_ms', '_seconds')}"
+                metric(name, 'gauge', f"Cold start {field.replace('_ms', '').replace('_', ' ')} time",
+                       [f"{name} {cold[field] / 1000:g}"])
+        
+        return '\n'.join(lines) + '\n'
+
+
+@app.before_request
+def start_request_metrics():
+    """بدء قياس الطلب"""
+    Metrics.start()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """تسجيل مقاييس الطلب (للاستجابات المتدفقة يُقاس الزمن حتى الترويسات)"""
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    size = None if response.is_streamed else response.calculate_content_length()
+    Metrics.finish(request.method, route, response.status_code, size)
+    return response
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """
+    مقاييس الأداء بصيغة Prometheus
+    Prometheus Metrics Endpoint
+    
+    يتطلب جلسة المسؤول أو ترويسة Authorization: Bearer <METRICS_TOKEN>.
+    """
+    authorization = request.headers.get('Authorization', '')
+    token_ok = bool(Config.METRICS_TOKEN) and hmac.compare_digest(
+        authorization.encode('utf-8'), f"Bearer {Config.METRICS_TOKEN}".encode('utf-8')
+    )
+    if not token_ok and not session.get('admin_authenticated'):
+        return jsonify({'error': 'الوصول مرفوض'}), 403
+    return Response(Metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ==================== المحلل الإحصائي ====================
+
+class ProfiledRequest:
+    """عينات مكدس طلب واحد قيد التنفيذ"""
+    __slots__ = ('route', 'sampled', 'started', 'stacks', 'samples')
+    
+    def __init__(self, route, sampled):
+        self.route = route
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.stacks = {}     # tuple(code objects) -> عدد العينات
+        self.samples = 0
+
+
+class Profiler:
+    """
+    محلل إحصائي بالعينات للطلبات
+    Opt-in sampling profiler with per-route collapsed stacks
+    
+    خيط واحد يقرأ sys._current_frames() كل PROFILE_INTERVAL_MS ويسجل مكدس
+    كل طلب مسجَّل (دوال بايثون من Flask.wsgi_app نزولاً؛ استدعاءات C مثل
+    psycopg2 تظهر ضمن الدالة التي استدعتها). لا خيط ولا كلفة عند التعطيل.
+    
+    - sample_rate: نسبة الطلبات التي تُضاف عيناتها إلى مجاميع كل مسار
+    - slow_ms: عند تفعيله تُجمع عينات كل الطلبات، ويُحفظ تحليل كامل لكل طلب
+      تجاوز الحد (آخر PROFILE_SLOW_KEEP طلب)
+    
+    الحالة لكل عملية: مع عدة عمال يُفعَّل عبر متغيرات البيئة أو لكل عامل.
+    مسارات ASGI الأصلية (asgi.py) تعمل على حلقة أحداث مشتركة فلا تُحلل؛
+    المسارات الممررة لتطبيق Flask تُحلل عادة.
+    """
+    
+    TRUNCATED = ()       # مفتاح المكدسات الزائدة عن PROFILE_MAX_STACKS
+    
+    _lock = threading.Lock()
+    _start_lock = threading.Lock()
+    _thread = None
+    _active = {}         # thread ident -> ProfiledRequest
+    _routes = {}         # "METHOD rule" -> [requests, samples, {stack: count}]
+    _slow = OrderedDict()    # capture id -> dict
+    _labels = {}         # code object -> اسم الإطار
+    _stack_count = 0
+    _next_capture = 1
+    
+    sample_rate = Config.PROFILE_SAMPLE_RATE
+    slow_ms = Config.PROFILE_SLOW_MS
+    interval = Config.PROFILE_INTERVAL_MS / 1000
+    samples = 0
+    ticks = 0
+    overhead_seconds = 0.0
+    slow_captures = 0
+    
+    @staticmethod
+    def enabled():
+        """هل المحلل مفعّل (عينات أو التقاط الطلبات البطيئة)"""
+        return Profiler.sample_rate > 0 or Profiler.slow_ms > 0
+    
+    @staticmethod
+    def configure(sample_rate=None, slow_ms=None, interval_ms=None):
+        """
+        تغيير إعدادات المحلل أثناء التشغيل
+        
+        Args:
+            sample_rate (float): نسبة الطلبات المحللة بين 0 و 1
+            slow_ms (float): حد الطلب البطيء بالملي ثانية (0 = معطل)
+            interval_ms (float): الفاصل بين العينات (1 - 1000)
+        
+        Raises:
+            ValueError: قيمة خارج المدى
+        """
+        if sample_rate is not None and not 0 <= float(sample_rate) <= 1:
+            raise ValueError('sample_rate يجب أن يكون بين 0 و 1')
+        if slow_ms is not None and float(slow_ms) < 0:
+            raise ValueError('slow_ms لا يمكن أن يكون سالباً')
+        if interval_ms is not None and not 1 <= float(interval_ms) <= 1000:
+            raise ValueError('interval_ms يجب أن يكون بين 1 و 1000')
+        if sample_rate is not None:
+            Profiler.sample_rate = float(sample_rate)
+        if slow_ms is not None:
+            Profiler.slow_ms = float(slow_ms)
+        if interval_ms is not None:
+            Profiler.interval = float(interval_ms) / 1000
+        if not Profiler.enabled():
+            with Profiler._lock:
+                Profiler._active.clear()
+    
+    @staticmethod
+    def begin(route):
+        """
+        تسجيل الطلب الحالي للتحليل (إن اختير)
+        
+        Args:
+            route (str): "METHOD rule"
+        """
+        rate = Profiler.sample_rate
+        if rate <= 0 and Profiler.slow_ms <= 0:
+            return
+        sampled = rate >= 1 or (rate > 0 and random.random() < rate)
+        if not sampled and Profiler.slow_ms <= 0:
+            return
+        with Profiler._lock:
+            Profiler._active[threading.get_ident()] = ProfiledRequest(route, sampled)
+        if Profiler._thread is None:
+            Profiler._start()
+    
+    @staticmethod
+    def finish():
+        """إنهاء تحليل الطلب الحالي وضم عيناته إلى مجاميع المسار أو الالتقاطات البطيئة"""
+        if not Profiler._active:
+            return
+        with Profiler._lock:
+            profile = Profiler._active.pop(threading.get_ident(), None)
+            if profile is None:
+                return
+            elapsed_ms = (time.perf_counter() - profile.started) * 1000
+            if profile.sampled:
+                entry = Profiler._routes.get(profile.route)
+                if entry is None:
+                    entry = Profiler._routes[profile.route] = [0, 0, {}]
+                entry[0] += 1
+                entry[1] += profile.samples
+                Profiler._merge(entry[2], profile.stacks)
+            if Profiler.slow_ms > 0 and elapsed_ms >= Profiler.slow_ms:
+                capture_id = Profiler._next_capture
+                Profiler._next_capture += 1
+                Profiler.slow_captures += 1
+                Profiler._slow[capture_id] = {
+                    'id': capture_id,
+                    'route': profile.route,
+                    'duration_ms': round(elapsed_ms, 1),
+                    'samples': profile.samples,
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'stacks': profile.stacks
+                }
+                while len(Profiler._slow) > Config.PROFILE_SLOW_KEEP:
+                    Profiler._slow.popitem(last=False)
+    
+    @staticmethod
+    def _merge(target, stacks):
+        """ضم عينات إلى مجموع مسار مع حد لعدد المكدسات المختلفة (يُستدعى مع القفل)"""
+        for stack, count in stacks.items():
+            if stack not in target:
+                if Profiler._stack_count >= Config.PROFILE_MAX_STACKS:
+                    stack = Profiler.TRUNCATED
+                if stack not in target:
+                    Profiler._stack_count += 1
+                    target[stack] = 0
+            target[stack] += count
+    
+    @staticmethod
+    def _start():
+        """تشغيل خيط العينات مرة واحدة"""
+        with Profiler._start_lock:
+            if Profiler._thread is None:
+                Profiler._thread = threading.Thread(target=Profiler._run, name='profiler', daemon=True)
+                Profiler._thread.start()
+    
+    @staticmethod
+    def _run():
+        """حلقة العينات؛ تنتهي عند تعطيل المحلل"""
+        while True:
+            time.sleep(Profiler.interval)
+            if not Profiler.enabled():
+                with Profiler._start_lock:
+                    if not Profiler.enabled():
+                        Profiler._thread = None
+                        return
+            started = time.perf_counter()
+            Profiler._tick()
+            Profiler.overhead_seconds += time.perf_counter() - started
+    
+    @staticmethod
+    def _tick():
+        """عينة واحدة من مكدس كل طلب مسجَّل"""
+        if not Profiler._active:
+            return
+        frames = sys._current_frames()
+        root = Flask.wsgi_app.__code__
+        try:
+            with Profiler._lock:
+                Profiler.ticks += 1
+                for ident, profile in Profiler._active.items():
+                    frame = frames.get(ident)
+                    codes = []
+                    while frame is not None:
+                        code = frame.f_code
+                        codes.append(code)
+                        if code is root:
+                            break
+                        frame = frame.f_back
+                    if not codes:
+                        continue
+                    stack = tuple(reversed(codes))
+                    profile.stacks[stack] = profile.stacks.get(stack, 0) + 1
+                    profile.samples += 1
+                    Profiler.samples += 1
+        finally:
+            # لا نحتفظ بإطارات الخيوط الأخرى بعد العينة
+            del frames
+    
+    @staticmethod
+    def _label(code):
+        """اسم إطار مستقر: الدالة (الملف:سطر البداية)"""
+        label = Profiler._labels.get(code)
+        if label is None:
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ',')
+            Profiler._labels[code] = label
+        return label
+    
+    @staticmethod
+    def _stacks(route=None, capture_id=None):
+        """
+        (إطارات بالاسم من الجذر، عدد) لمسار أو لكل المسارات أو لالتقاط بطيء
+        
+        Returns:
+            list or None: None إذا لم يوجد الالتقاط
+        """
+        with Profiler._lock:
+            if capture_id is not None:
+                capture = Profiler._slow.get(capture_id)
+                if capture is None:
+                    return None
+                groups = [(capture['route'], dict(capture['stacks']))]
+            else:
+                groups = [(name, dict(entry[2])) for name, entry in sorted(Profiler._routes.items())
+                          if route is None or name == route]
+        label = Profiler._label
+        return [
+            ([name] + ([label(code) for code in stack] if stack else ['[truncated]']), count)
+            for name, stacks in groups
+            for stack, count in stacks.items()
+        ]
+    
+    @staticmethod
+    def collapsed(route=None, capture_id=None):
+        """
+        العينات بصيغة collapsed stacks (سطر لكل مكدس: frame;frame;... count)
+        مدخل مباشر لـ flamegraph.pl و speedscope و inferno
+        
+        Returns:
+            str or None: النص، أو None إذا لم يوجد الالتقاط
+        """
+        stacks = Profiler._stacks(route, capture_id)
+        if stacks is None:
+            return None
+        lines = sorted((';'.join(frames), count) for frames, count in stacks)
+        return ''.join(f"{frames} {count}\n" for frames, count in lines)
+    
+    @staticmethod
+    def tree(route=None, capture_id=None):
+        """
+        العينات كشجرة {name, value, children} (صيغة d3-flame-graph)
+        
+        Returns:
+            dict or None: الجذر، أو None إذا لم يوجد الالتقاط
+        """
+        stacks = Profiler._stacks(route, capture_id)
+        if stacks is None:
+            return None
+        root = {'name': 'all', 'value': 0, 'children': {}}
+        for frames, count in stacks:
+            node = root
+            node['value'] += count
+            for frame in frames:
+                child = node['children'].get(frame)
+                if child is None:
+                    child = node['children'][frame] = {'name': frame, 'value': 0, 'children': {}}
+                child['value'] += count
+                node = child
+        
+        def finalize(node):
+            node['children'] = sorted((finalize(child) for child in node['children'].values()),
+                                      key=lambda child: -child['value'])
+            return node
+        return finalize(root)
+    
+    @staticmethod
+    def reset():
+        """مسح العينات المجمعة والالتقاطات"""
+        with Profiler._lock:
+            Profiler._routes.clear()
+            Profiler._slow.clear()
+            Profiler._stack_count = 0
+            Profiler.samples = 0
+            Profiler.ticks = 0
+            Profiler.overhead_seconds = 0.0
+    
+    @staticmethod
+    def stats():
+        """إعدادات المحلل وملخص المسارات والالتقاطات البطيئة"""
+        with Profiler._lock:
+            routes = [
+                {'route': name, 'requests': entry[0], 'samples': entry[1], 'stacks': len(entry[2])}
+                for name, entry in sorted(Profiler._routes.items(), key=lambda item: -item[1][1])
+            ]
+            slow = [{key: value for key, value in capture.items() if key != 'stacks'}
+                    for capture in reversed(Profiler._slow.values())]
+            active = len(Profiler._active)
+        return {
+            'enabled': Profiler.enabled(),
+            'running': Profiler._thread is not None,
+            'sample_rate': Profiler.sample_rate,
+            'slow_ms': Profiler.slow_ms,
+            'interval_ms': Profiler.interval * 1000,
+            'active': active,
+            'samples': Profiler.samples,
+            'ticks': Profiler.ticks,
+            'overhead_ms': round(Profiler.overhead_seconds * 1000, 1),
+            'distinct_stacks': Profiler._stack_count,
+            'routes': routes,
+            'slow': slow
+        }
+
+
+@app.before_request
+def start_request_profile():
+    """تسجيل الطلب لدى المحلل (لا شيء عند التعطيل)"""
+    if Profiler.sample_rate > 0 or Profiler.slow_ms > 0:
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        Profiler.begin(f"{request.method} {rule}")
+
+
+@app.teardown_request
+def finish_request_profile(exc=None):
+    """إنهاء تحليل الطلب (بعد بث الاستجابة كاملة)"""
+    Profiler.finish()
+
+
+def profile_download(route=None, capture_id=None):
+    """
+    تنزيل العينات بالصيغة المطلوبة (?format=collapsed أو json)
     
     Returns:
-        function: دالة مزينة
+        Response: ملف مرفق، أو 404 إذا لم يوجد الالتقاط
+    """
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'json'):
+        return jsonify({'success': False, 'error': "الصيغة يجب أن تكون 'collapsed' أو 'json'"}), 400
+    if output_format == 'json':
+        body = Profiler.tree(route, capture_id)
+    else:
+        body = Profiler.collapsed(route, capture_id)
+    if body is None:
+        return jsonify({'success': False, 'error': f'الالتقاط رقم {capture_id} غير موجود'}), 404
+    name = f"slow-{capture_id}" if capture_id is not None else re.sub(r'[^A-Za-z0-9]+', '-', route or 'all').strip('-')
+    if output_format == 'json':
+        response = Response(json.dumps(body, ensure_ascii=False), content_type='application/json; charset=utf-8')
+        filename = f"profile-{name}.json"
+    else:
+        response = Response(body, content_type='text/plain; charset=utf-8')
+        filename = f"profile-{name}.folded"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST', 'DELETE'])
+@require_admin
+def profiler_route():
+    """
+    التحكم في المحلل الإحصائي
+    Sampling Profiler Control
+    
+    GET: الإعدادات وملخص المسارات والالتقاطات البطيئة
+    POST JSON: {"sample_rate": 0.05, "slow_ms": 500, "interval_ms": 5, "reset": false}
+        (الحقول الغائبة تبقى كما هي؛ sample_rate و slow_ms بصفر يوقفان المحلل)
+    DELETE: مسح العينات المجمعة
+    
+    Returns:
+        JSON: {"success": bool, "profiler": dict}
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'بيانات غير صحيحة'}), 400
+        try:
+            Profiler.configure(data.get('sample_rate'), data.get('slow_ms'), data.get('interval_ms'))
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if data.get('reset'):
+            Profiler.reset()
+        print(f"✅ Profiler: sample_rate={Profiler.sample_rate}, slow_ms={Profiler.slow_ms}, "
+              f"interval_ms={Profiler.interval * 1000:g}")
+    elif request.method == 'DELETE':
+        Profiler.reset()
+    return jsonify({'success': True, 'profiler': Profiler.stats()})
+
+
+@app.route('/api/admin/profiler/stacks')
+@require_admin
+def profiler_stacks():
+    """
+    تنزيل عينات المسارات (collapsed stacks أو شجرة JSON)
+    
+    Query:
+        route (str): "METHOD rule" مثل "POST /api/submit" (الافتراضي: كل المسارات)
+        format (str): collapsed (flamegraph.pl / speedscope) أو json (d3-flame-graph)
+    """
+    return profile_download(route=request.args.get('route') or None)
+
+
+@app.route('/api/admin/profiler/slow/<int:capture_id>')
+@require_admin
+def profiler_slow_capture(capture_id):
+    """
+    تنزيل التحليل الكامل لطلب بطيء
+    
+    Query:
+        format (str): collapsed أو json
+    """
+    return profile_download(capture_id=capture_id)
+
+
+# ==================== تحديد المعدل ومنع التكرار ====================
+
+def client_address(forwarded_for, remote_addr):
+    """
+    عنوان العميل لمفاتيح تحديد المعدل
+    
+    المداخل اليسرى في X-Forwarded-For يكتبها العميل نفسه؛ كل proxy موثوق يضيف
+    مدخلاً واحداً في اليمين، فالعنوان الذي رآه أبعد proxy موثوق هو المدخل
+    TRUSTED_PROXY_COUNT من اليمين.
+    
+    Args:
+        forwarded_for (str): ترويسة X-Forwarded-For (تُستخدم فقط مع TRUSTED_PROXY_COUNT)
+        remote_addr (str): عنوان الاتصال
+    
+    Returns:
+        str: العنوان
+    """
+    hops = Config.TRUSTED_PROXY_COUNT
+    if hops > 0 and forwarded_for:
+        entries = [entry.strip() for entry in forwarded_for.split(',')]
+        # مداخل أقل من عدد الـ proxies: الترويسة لم تمر بها كلها فلا يُوثق بها
+        if len(entries) >= hops and entries[-hops]:
+            return entries[-hops]
+    return remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """
+    تحديد المعدل بدلو رموز (token bucket) لكل (مسار، عميل)
+    Per-route, per-client token bucket rate limiter
+    
+    الدلاء في OrderedDict محدود بـ RATE_LIMIT_MAX_CLIENTS (الأقدم استخداماً يُحذف)،
+    فالذاكرة محدودة حتى مع عناوين كثيرة. الكلفة: قفل واحد وبعض العمليات الحسابية.
+    """
+    
+    _lock = threading.Lock()
+    _buckets = OrderedDict()   # (endpoint, client) -> [tokens, updated_at]
+    _limits = None
+    allowed = 0
+    limited = 0
+    evictions = 0
+    
+    @staticmethod
+    def parse(value):
+        """
+        قراءة Config.RATE_LIMITS
+        
+        Args:
+            value (str): مثل "submit_quiz=30/60:10,get_quiz=120/60"
+        
+        Returns:
+            dict: {endpoint: (tokens_per_second, burst)}
+        """
+        limits = {}
+        for item in value.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                endpoint, spec = item.split('=', 1)
+                rate, _, burst = spec.partition(':')
+                requests, _, seconds = rate.partition('/')
+                requests = float(requests)
+                seconds = float(seconds or 1)
+                burst = float(burst) if burst else requests
+                if requests <= 0 or seconds <= 0 or burst < 1:
+                    raise ValueError
+            except ValueError:
+                print(f"⚠️ Ignoring invalid RATE_LIMITS entry '{item}' (expected endpoint=requests/seconds[:burst])")
+                continue
+            limits[endpoint.strip()] = (requests / seconds, burst)
+        return limits
+    
+    @staticmethod
+    def limits():
+        if RateLimiter._limits is None:
+            RateLimiter._limits = RateLimiter.parse(Config.RATE_LIMITS)
+        return RateLimiter._limits
+    
+    @staticmethod
+    def check(endpoint, client):
+        """
+        استهلاك رمز من دلو العميل
+        
+        Args:
+            endpoint (str): اسم المسار (اسم دالة Flask)
+            client (str): عنوان العميل
+        
+        Returns:
+            float or None: ثوانٍ حتى السماح مجدداً (Retry-After)، أو None إذا سُمح بالطلب
+        """
+        limit = RateLimiter.limits().get(endpoint)
+        if limit is None:
+            return None
+        rate, burst = limit
+        key = (endpoint, client)
+        now = time.monotonic()
+        buckets = RateLimiter._buckets
+        with RateLimiter._lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = [burst, now]
+                if len(buckets) > Config.RATE_LIMIT_MAX_CLIENTS:
+                    buckets.popitem(last=False)
+                    RateLimiter.evictions += 1
+            else:
+                buckets.move_to_end(key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                RateLimiter.allowed += 1
+                return None
+            RateLimiter.limited += 1
+            return (1 - bucket[0]) / rate
+    
+    @staticmethod
+    def stats():
+        return {
+            'clients': len(RateLimiter._buckets),
+            'allowed': RateLimiter.allowed,
+            'limited': RateLimiter.limited,
+            'evictions': RateLimiter.evictions
+        }
+
+
+class SubmissionDeduper:
     """
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if not session.get('admin_authenticated'):
-            return redirect(url_for('admin_login'))
-        return f(*args, **kwargs)
-    return decorated_function
+    نتائج الإرسالات الأخيرة لإعادتها عند التكرار (إعادة إرسال، نقر مزدوج، بوتات)
+    Recent submission results keyed by idempotency key or content hash
+    """
+    
+    _results = LRUCache(Config.SUBMIT_DEDUP_MAX_ENTRIES)
+    replayed = 0
+    
+    @staticmethod
+    def key(client, idempotency_key, data):
+        """
+        مفتاح الإرسال: Idempotency-Key من العميل، وإلا بصمة المحتوى (لنفس العميل فقط)
+        
+        Returns:
+            str or None: None إذا كان منع التكرار معطلاً
+        """
+        if not Config.SUBMIT_DEDUP_WINDOW or client is None:
+            return None
+        if idempotency_key:
+            material = f"key:{client}:{idempotency_key[:200]}"
+        else:
+            material = f"body:{client}:" + json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def get(key):
+        """النتيجة المحفوظة إذا كانت ضمن النافذة"""
+        entry = SubmissionDeduper._results.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        SubmissionDeduper.replayed += 1
+        return entry[1]
+    
+    @staticmethod
+    def put(key, result):
+        SubmissionDeduper._results.put(key, (time.monotonic() + Config.SUBMIT_DEDUP_WINDOW, result))
+
+
+@app.before_request
+def enforce_rate_limit():
+    """رفض الطلبات الزائدة بـ 429 مع Retry-After قبل أي عمل"""
+    if not RateLimiter.limits() or request.endpoint is None:
+        return None
+    retry_after = RateLimiter.check(
+        request.endpoint,
+        client_address(request.headers.get('X-Forwarded-For'), request.remote_addr)
+    )
+    if retry_after is None:
+        return None
+    response = jsonify({'error': 'طلبات كثيرة جداً. يرجى المحاولة بعد قليل'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
 
 
 # ==================== المسارات الأساسية ====================
@@ -280,13 +5442,13 @@ def index():
     """
     صفحة الاختبار الرئيسية
     Main Quiz Page
+    
+    الصفحة تُعرض وتُضغط مرة واحدة لكل إصدار من الأسئلة، وتدعم ETag/304.
     """
     try:
-        questions = load_questions()
-        return render_template(
-            'index_ar.html', 
-            questions=questions
-        )
+        version, _ = QuestionCache.get()
+        payload = PayloadCache.get('index', version, render_index_page, mimetype='text/html')
+        return send_payload(payload)
     except Exception as e:
         print(f"❌ Error in index route: {e}")
         return jsonify({'error': 'خطأ في تحميل الصفحة'}), 500
@@ -303,58 +5465,29 @@ def submit_quiz():
             "answers": {
                 "question_id": "selected_answer",
                 ...
-            }
+            },
+            "quiz_token": "..."   (اختياري - من /api/quiz)
         }
     
+    مع quiz_token يُصحح الاختبار على الأسئلة المقدمة فقط، وبدونه على جميع الأسئلة.
+    
     Returns:
         JSON: {
             "score": int,
             "total": int,
-            "percentage": float
+            "percentage": float,
+            "percentile": float,   (نسبة اللاعبين بدرجة أقل؛ null إذا لم يكتمل البذر)
+            "rank": int,
+            "players": int
         }
     """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'بيانات غير صحيحة. يرجى التأكد من إرسال الإجابات بشكل صحيح'}), 400
-        
-        answers = data.get('answers', {})
-        if not isinstance(answers, dict):
-            return jsonify({'error': 'الإجابات يجب أن تكون قاموس صحيح'}), 400
-        
-        questions = load_questions()
-        
-        if not questions:
-            return jsonify({'error': 'لا توجد أسئلة محفوظة. يرجى إضافة أسئلة من لوحة التحكم'}), 404
-        
-        score = 0
-        total = len(questions)
-        
-        # حساب النتيجة بمقارنة الإجابات الصحيحة
-        for q_id, user_answer in answers.items():
-            question = find_question_by_id(int(q_id))
-            if question:
-                correct_answer = question.get('correct_answer')
-                # تحويل الإجابات للمقارنة الصحيحة
-                try:
-                    # محاولة تحويل كلا الطرفين إلى رقم للمقارنة
-                    correct_int = int(correct_answer) if isinstance(correct_answer, (int, str)) else correct_answer
-                    user_int = int(user_answer) if isinstance(user_answer, str) else user_answer
-                    
-                    if user_int == correct_int:
-                        score += 1
-                except (ValueError, TypeError):
-                    # إذا فشل التحويل، قارن كـ نصوص
-                    if str(correct_answer) == str(user_answer):
-                        score += 1
-        
-        percentage = (score / total * 100) if total > 0 else 0
-        
-        return jsonify({
-            'score': score,
-            'total': total,
-            'percentage': round(percentage, 2)
-        })
+        body, status = process_submission(
+            request.get_json(),
+            client=client_address(request.headers.get('X-Forwarded-For'), request.remote_addr),
+            idempotency_key=request.headers.get('Idempotency-Key')
+        )
+        return jsonify(body), status
     
     except (ValueError, TypeError) as e:
         return jsonify({'error': f'خطأ في معالجة البيانات: {str(e)}'}), 400
@@ -363,6 +5496,71 @@ def submit_quiz():
         return jsonify({'error': 'حدث خطأ غير متوقع. يرجى المحاولة لاحقاً'}), 500
 
 
+def process_submission(data, enqueue_timeout=None, client=None, idempotency_key=None):
+    """
+    تصحيح إرسال وإضافته لطابور الحفظ (مشترك بين Flask و asgi.py)
+    
+    الإرسال المكرر من نفس العميل خلال SUBMIT_DEDUP_WINDOW (نفس Idempotency-Key
+    أو نفس المحتوى) يُعيد النتيجة السابقة بدون تصحيح أو حفظ جديد.
+    
+    Args:
+        data (dict): جسم الطلب
+        enqueue_timeout (float): مهلة انتظار الطابور (الافتراضي SUBMISSION_ENQUEUE_TIMEOUT)
+        client (str): عنوان العميل (None = بدون منع التكرار)
+        idempotency_key (str): ترويسة Idempotency-Key إن وُجدت
+    
+    Returns:
+        tuple: (body, status)
+    
+    Raises:
+        ValueError, TypeError: بيانات غير صالحة
+    """
+    if not data:
+        return {'error': 'بيانات غير صحيحة. يرجى التأكد من إرسال الإجابات بشكل صحيح'}, 400
+    
+    answers = data.get('answers', {})
+    if not isinstance(answers, dict):
+        return {'error': 'الإجابات يجب أن تكون قاموس صحيح'}, 400
+    
+    dedup_key = SubmissionDeduper.key(client, idempotency_key, data)
+    if dedup_key is not None:
+        previous = SubmissionDeduper.get(dedup_key)
+        if previous is not None:
+            return previous, 200
+    
+    index, total = ScoringEngine.get_index()
+    
+    if not total:
+        return {'error': 'لا توجد أسئلة محفوظة. يرجى إضافة أسئلة من لوحة التحكم'}, 404
+    
+    allowed = None
+    quiz_token = data.get('quiz_token')
+    if quiz_token:
+        allowed = QuizAssembler.read_token(quiz_token)
+        # الأسئلة المحذوفة بعد إصدار الرمز لا تُحسب
+        total = sum(1 for q_id in allowed if str(q_id) in index)
+    
+    # حساب النتيجة في مرور واحد بدون استعلامات إضافية
+    details = [] if Config.PERSIST_SUBMISSIONS else None
+    result = ScoringEngine.score(answers, index, total, details, allowed)
+    
+    # الحفظ في الخلفية: الطلب لا ينتظر قاعدة البيانات
+    submitted_at = utc_now()
+    stored = True
+    if Config.PERSIST_SUBMISSIONS:
+        stored = SubmissionWriter.enqueue(
+            build_submission_record(result, details, submitted_at), timeout=enqueue_timeout
+        )
+    
+    # المئين والمركز من المدرج في الذاكرة (بدون استعلام)
+    if Config.RANKING_ENABLED:
+        result.update(Ranking.record(result['score'], result['total'], submitted_at, stored))
+    
+    if dedup_key is not None:
+        SubmissionDeduper.put(dedup_key, result)
+    return result, 200
+
+
 # ==================== مسارات لوحة التحكم ====================
 
 @app.route('/admin', methods=['GET', 'POST'])
@@ -381,110 +5579,354 @@ def admin_login():
     صفحة دخول المسؤول
     Admin Login Page
     
-    POST Parameters:
-        password (str): كلمة مرور المسؤول
+    POST Parameters:
+        password (str): كلمة مرور المسؤول
+    """
+    if request.method == 'POST':
+        password = request.form.get('password', '').strip()
+        
+        if not password:
+            return render_template(
+                'admin_login_ar.html', 
+                error='الرجاء إدخال كلمة المرور'
+            )
+        
+        if password == Config.ADMIN_PASSWORD:
+            session['admin_authenticated'] = True
+            session.permanent = False  # جلسة المتصفح
+            return redirect(url_for('admin_dashboard'))
+        else:
+            return render_template(
+                'admin_login_ar.html', 
+                error='كلمة المرور غير صحيحة'
+            )
+    
+    return render_template('admin_login_ar.html')
+
+
+@app.route('/admin/logout')
+def admin_logout():
+    """
+    تسجيل خروج المسؤول
+    Admin Logout
+    """
+    session.pop('admin_authenticated', None)
+    return redirect(url_for('index'))
+
+
+# ==================== API endpoints لإدارة الأسئلة ====================
+
+@app.route('/api/admin/add-question', methods=['POST'])
+@require_admin
+def add_question():
+    """
+    نقطة API لإضافة سؤال جديد
+    Add New Question Endpoint
+    
+    JSON Request Format:
+        {
+            "type": "mcq" or "tf",
+            "question": "نص السؤال",
+            "options": ["خيار1", "خيار2", ...],
+            "correct_answer": "الإجابة الصحيحة",
+            "category": "الفئة"
+        }
+    
+    Returns:
+        JSON: {
+            "success": bool,
+            "question": dict or error message
+        }
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'بيانات غير صحيحة. لم يتم استقبال JSON'}), 400
+        
+        # التحقق من صحة البيانات
+        is_valid, error_msg = validate_question_data(data)
+        if not is_valid:
+            return jsonify({'success': False, 'error': error_msg}), 400
+        
+        # إدراج السؤال الجديد في قاعدة البيانات
+        new_question = Database.backend().insert_question(question_fields(data))
+        QuestionCache.invalidate()
+        
+        if new_question:
+            return jsonify({'success': True, 'question': new_question.to_dict()}), 201
+        else:
+            return jsonify({'success': False, 'error': 'فشل إنشاء السؤال'}), 500
+    
+    except json.JSONDecodeError as e:
+        error_msg = f'خطأ في معالجة JSON: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 400
+    except Database.ERRORS as e:
+        error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+    except Exception as e:
+        error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+
+@app.route('/api/admin/update-question/<int:q_id>', methods=['POST', 'PUT'])
+@require_admin
+def update_question(q_id):
+    """
+    نقطة API لتحديث سؤال موجود
+    Update Existing Question Endpoint
+    
+    Parameters:
+        q_id (int): معرف السؤال
+    
+    JSON Request: (نفس صيغة إضافة سؤال، الحقول الغائبة تبقى كما هي)
+        version (int): اختياري - الإصدار المقروء؛ أو ترويسة If-Match
+    
+    Returns:
+        JSON: {
+            "success": bool,
+            "question": dict or error message
+        }
+        409 مع current_version إذا تغيّر السؤال منذ قراءته
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'بيانات غير صحيحة'}), 400
+        is_valid, error_msg = validate_question_update(data)
+        if not is_valid:
+            return jsonify({'success': False, 'error': error_msg}), 400
+        try:
+            version = expected_version(data, request.headers.get('If-Match'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'إصدار غير صالح'}), 400
+        
+        # عبارة شرطية واحدة: بدون قراءة مسبقة للسؤال
+        try:
+            updated_question = Database.backend().update_question(
+                q_id, question_fields(data, partial=True), version
+            )
+        except VersionConflictError as e:
+            body, status = conflict_response(e)
+            return jsonify(body), status
+        if not updated_question:
+            return jsonify({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}), 404
+        QuestionCache.invalidate()
+        
+        return jsonify({'success': True, 'question': updated_question.to_dict()})
+    
+    except json.JSONDecodeError as e:
+        error_msg = f'خطأ في معالجة JSON: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 400
+    except Database.ERRORS as e:
+        error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+    except Exception as e:
+        error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+
+@app.route('/api/admin/delete-question/<int:q_id>', methods=['DELETE'])
+@require_admin
+def delete_question(q_id):
+    """
+    نقطة API لحذف سؤال
+    Delete Question Endpoint
+    
+    Parameters:
+        q_id (int): معرف السؤال
+        version (query) أو If-Match: اختياري - الحذف فقط إذا لم يتغير السؤال
+    
+    Returns:
+        JSON: {"success": bool, "error": error message (if any)}
+    """
+    try:
+        try:
+            version = expected_version(
+                {'version': request.args.get('version')}, request.headers.get('If-Match')
+            )
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'إصدار غير صالح'}), 400
+        
+        # حذف السؤال من قاعدة البيانات
+        try:
+            deleted = Database.backend().delete_question(q_id, version)
+        except VersionConflictError as e:
+            body, status = conflict_response(e)
+            return jsonify(body), status
+        if not deleted:
+            return jsonify({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}), 404
+        QuestionCache.invalidate()
+        
+        return jsonify({'success': True})
+    
+    except Database.ERRORS as e:
+        error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+    except Exception as e:
+        error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+
+@app.route('/api/admin/questions/batch-update', methods=['POST'])
+@require_admin
+def batch_update_questions():
+    """
+    نقطة API لتحديث عدة أسئلة في معاملة واحدة
+    Batch Update Endpoint
+    
+    JSON Request:
+        {"items": [{"id": 1, "version": 3, "category": "..."}, ...]}
+        (الحقول الغائبة تبقى كما هي، و version اختياري لكل عنصر)
+    
+    Returns:
+        JSON: {"success": bool, "questions": [...]}
+        409 مع conflicts إذا تغيّر أي سؤال أو لم يعد موجوداً - لا يُحدَّث شيء
+    """
+    try:
+        try:
+            items = parse_batch_items(request.get_json(silent=True), with_fields=True)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        try:
+            questions = Database.backend().update_questions(items)
+        except VersionConflictError as e:
+            body, status = conflict_response(e)
+            return jsonify(body), status
+        QuestionCache.invalidate()
+        
+        return jsonify({'success': True, 'questions': [question.to_dict() for question in questions]})
+    
+    except Database.ERRORS as e:
+        error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+    except Exception as e:
+        error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+
+
+@app.route('/api/admin/questions/batch-delete', methods=['POST'])
+@require_admin
+def batch_delete_questions():
+    """
+    نقطة API لحذف عدة أسئلة في معاملة واحدة
+    Batch Delete Endpoint
+    
+    JSON Request:
+        {"ids": [1, 2, 3]} أو {"items": [{"id": 1, "version": 3}, ...]}
+    
+    Returns:
+        JSON: {"success": bool, "deleted": [ids]} - المعرفات غير الموجودة تُتجاهل
+        409 مع conflicts إذا تغيّر أي سؤال - لا يُحذف شيء
     """
-    if request.method == 'POST':
-        password = request.form.get('password', '').strip()
+    try:
+        try:
+            items = parse_batch_items(request.get_json(silent=True), with_fields=False)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        if not password:
-            return render_template(
-                'admin_login_ar.html', 
-                error='الرجاء إدخال كلمة المرور'
-            )
+        try:
+            deleted = Database.backend().delete_questions(items)
+        except VersionConflictError as e:
+            body, status = conflict_response(e)
+            return jsonify(body), status
+        if deleted:
+            QuestionCache.invalidate()
         
-        if password == Config.ADMIN_PASSWORD:
-            session['admin_authenticated'] = True
-            session.permanent = False  # جلسة المتصفح
-            return redirect(url_for('admin_dashboard'))
-        else:
-            return render_template(
-                'admin_login_ar.html', 
-                error='كلمة المرور غير صحيحة'
-            )
+        return jsonify({'success': True, 'deleted': deleted})
     
-    return render_template('admin_login_ar.html')
+    except Database.ERRORS as e:
+        error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
+    except Exception as e:
+        error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+        print(f"❌ {error_msg}")
+        return jsonify({'success': False, 'error': error_msg}), 500
 
 
-@app.route('/admin/logout')
-def admin_logout():
+def escape_like(value):
+    """هروب محارف LIKE الخاصة في نص البحث"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def list_questions_page(after=0, limit=None, category=None, q_type=None, search=None):
     """
-    تسجيل خروج المسؤول
-    Admin Logout
+    صفحة من الأسئلة بترقيم keyset على المعرف
+    
+    Args:
+        after (int): آخر معرف في الصفحة السابقة
+        limit (int): حجم الصفحة (حده الأقصى Config.MAX_QUESTIONS)
+        category (str): تصفية حسب الفئة
+        q_type (str): تصفية حسب النوع
+        search (str): بحث داخل نص السؤال (فهرس trigram في postgres)
+    
+    Returns:
+        tuple: (questions, next_cursor or None)
     """
-    session.pop('admin_authenticated', None)
-    return redirect(url_for('index'))
+    limit = max(1, min(limit or Config.MAX_QUESTIONS, Config.MAX_QUESTIONS))
+    # صف إضافي لمعرفة وجود صفحة تالية بدون COUNT
+    results = Database.backend().list_questions(after, limit + 1, category, q_type, search)
+    questions = results[:limit]
+    next_cursor = questions[-1].id if len(results) > limit else None
+    return questions, next_cursor
 
 
-# ==================== API endpoints لإدارة الأسئلة ====================
-
-@app.route('/api/admin/add-question', methods=['POST'])
+@app.route('/api/admin/questions')
 @require_admin
-def add_question():
+def list_questions_route():
     """
-    نقطة API لإضافة سؤال جديد
-    Add New Question Endpoint
+    نقطة API لقائمة الأسئلة المرقّمة في لوحة التحكم
+    Paginated Admin Question Listing
     
-    JSON Request Format:
-        {
-            "type": "mcq" or "tf",
-            "question": "نص السؤال",
-            "options": ["خيار1", "خيار2", ...],
-            "correct_answer": "الإجابة الصحيحة",
-            "category": "الفئة"
-        }
+    Query Parameters:
+        after (int): المؤشر (next_cursor من الصفحة السابقة)
+        limit (int): حجم الصفحة
+        category (str): الفئة
+        type (str): 'mcq' أو 'tf'
+        q (str): نص البحث
     
     Returns:
         JSON: {
             "success": bool,
-            "question": dict or error message
+            "questions": [...],
+            "next_cursor": int or null,
+            "total": int,             (الصفحة الأولى فقط)
+            "categories": [str, ...]  (الصفحة الأولى فقط)
         }
     """
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'بيانات غير صحيحة. لم يتم استقبال JSON'}), 400
-        
-        # التحقق من صحة البيانات
-        is_valid, error_msg = validate_question_data(data)
-        if not is_valid:
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # إدراج السؤال الجديد في قاعدة البيانات
-        insert_query = """
-        INSERT INTO questions (type, question, options, correct_answer, category)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id, type, question, options, correct_answer, category
-        """
-        
-        params = (
-            data.get('type', 'mcq'),
-            data.get('question'),
-            json.dumps(data.get('options'), ensure_ascii=False),
-            data.get('correct_answer'),
-            data.get('category', 'رومانسي')
+        after = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', Config.MAX_QUESTIONS, type=int)
+        search = request.args.get('q', '').strip()
+        questions, next_cursor = list_questions_page(
+            after=after,
+            limit=limit,
+            category=request.args.get('category') or None,
+            q_type=request.args.get('type') or None,
+            search=search or None
         )
+        result = {'success': True, 'questions': [q.to_dict() for q in questions], 'next_cursor': next_cursor}
         
-        result = Database.execute_query_one(insert_query, params)
+        if not after:
+            # الإجماليات من اللقطة المخزنة بدون استعلام COUNT
+            _, snapshot = QuestionCache.get()
+            result['total'] = len(snapshot)
+            result['categories'] = sorted({q.category for q in snapshot if q.category})
         
-        if result:
-            new_question = {
-                'id': result['id'],
-                'type': result['type'],
-                'question': result['question'],
-                'options': result['options'] if isinstance(result['options'], list) else json.loads(result['options']),
-                'correct_answer': result['correct_answer'],
-                'category': result['category']
-            }
-            return jsonify({'success': True, 'question': new_question}), 201
-        else:
-            return jsonify({'success': False, 'error': 'فشل إنشاء السؤال'}), 500
+        return jsonify(result)
     
-    except json.JSONDecodeError as e:
-        error_msg = f'خطأ في معالجة JSON: {str(e)}'
-        print(f"❌ {error_msg}")
-        return jsonify({'success': False, 'error': error_msg}), 400
-    except psycopg2.Error as e:
+    except Database.ERRORS as e:
         error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
         print(f"❌ {error_msg}")
         return jsonify({'success': False, 'error': error_msg}), 500
@@ -494,76 +5936,278 @@ def add_question():
         return jsonify({'success': False, 'error': error_msg}), 500
 
 
-@app.route('/api/admin/update-question/<int:q_id>', methods=['POST', 'PUT'])
+# ==================== الاستيراد والتصدير الجماعي ====================
+
+IMPORT_MODES = ('append', 'upsert')
+
+EXPORT_QUERY = """
+SELECT id, type, question, options, correct_answer, category
+FROM questions
+ORDER BY id ASC
+"""
+
+
+class ImportValidationError(ValueError):
+    """صفوف غير صالحة في ملف الاستيراد"""
+    
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} صف غير صالح")
+        self.errors = errors
+
+
+def iter_json_records(stream, chunk_size=65536):
+    """
+    قراءة سجلات JSON من تيار بايتات بشكل تدريجي
+    Stream records from a JSON array or NDJSON byte stream
+    
+    Args:
+        stream: كائن قابل للقراءة (ملف أو request.stream)
+        chunk_size (int): حجم القطعة المقروءة
+    
+    Yields:
+        tuple: (position, record) - position يبدأ من 1
+    
+    Raises:
+        ValueError: عند JSON غير صالح
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buf = ''
+    pos = 0
+    eof = False
+    
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        pos = 0
+    
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in chars:
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            fill()
+    
+    skip(' \t\r\n')
+    is_array = pos < len(buf) and buf[pos] == '['
+    if is_array:
+        pos += 1
+    
+    position = 0
+    skip(' \t\r\n')
+    if is_array and pos < len(buf) and buf[pos] == ']':
+        return
+    while True:
+        skip(' \t\r\n')
+        if pos >= len(buf):
+            if is_array:
+                raise ValueError("مصفوفة JSON غير مكتملة")
+            return
+        while True:
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        # في NDJSON قد تنتهي القطعة في منتصف رقم، لذلك نتأكد من وجود فاصل بعده
+        if not eof and end >= len(buf):
+            fill()
+            continue
+        pos = end
+        position += 1
+        yield position, record
+        
+        if is_array:
+            skip(' \t\r\n')
+            if pos < len(buf) and buf[pos] == ']':
+                return
+            if pos >= len(buf) or buf[pos] != ',':
+                raise ValueError(f"متوقع ',' أو ']' بعد السجل {position}")
+            pos += 1
+
+
+def prepare_import_row(record, with_id=False):
+    """
+    التحقق من سجل استيراد وتحويله إلى صف جاهز للإدراج
+    
+    Args:
+        record (dict): السجل
+        with_id (bool): هل المعرف مطلوب (وضع upsert)
+    
+    Returns:
+        tuple: (row or None, error_message or None)
+    """
+    if not isinstance(record, dict):
+        return None, "السجل يجب أن يكون كائن JSON"
+    
+    data = dict(record)
+    # correct_answer عمود نصي؛ الملفات القديمة تحفظه كرقم (0 يُعتبر فارغاً عند التحقق)
+    if isinstance(data.get('correct_answer'), int) and not isinstance(data.get('correct_answer'), bool):
+        data['correct_answer'] = str(data['correct_answer'])
+    
+    is_valid, error_msg = validate_question_data(data)
+    if not is_valid:
+        return None, error_msg
+    
+    row = (
+        data['type'],
+        data['question'],
+        json.dumps(data['options'], ensure_ascii=False),
+        str(data['correct_answer']),
+        data.get('category') or 'رومانسي'
+    )
+    if with_id:
+        if not isinstance(data.get('id'), int) or isinstance(data.get('id'), bool):
+            return None, "الحقل 'id' مطلوب في وضع upsert"
+        row = (data['id'],) + row
+    return row, None
+
+
+def import_questions(records, mode='append', replace=False, batch_size=None):
+    """
+    استيراد الأسئلة في معاملة واحدة (كل شيء أو لا شيء)
+    
+    Args:
+        records (iterable): (position, record) كما يُنتجها iter_json_records
+        mode (str): 'append' (معرفات جديدة عبر COPY) أو 'upsert' (حسب id)
+        replace (bool): حذف جميع الأسئلة الحالية أولاً
+        batch_size (int): حجم الدفعة
+    
+    Returns:
+        int: عدد الأسئلة المستوردة
+    
+    Raises:
+        ImportValidationError: إذا كان هناك صفوف غير صالحة (لا يُكتب شيء)
+        ValueError: عند JSON غير صالح أو وضع غير معروف
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"وضع الاستيراد يجب أن يكون أحد: {', '.join(IMPORT_MODES)}")
+    
+    batches = iter_import_batches(records, mode, batch_size or Config.IMPORT_BATCH_SIZE)
+    imported = Database.backend().import_rows(batches, mode, replace=replace)
+    QuestionCache.invalidate()
+    return imported
+
+
+def iter_import_batches(records, mode, batch_size):
+    """
+    التحقق من السجلات وتجميعها في دفعات
+    
+    يُستهلك داخل معاملة المحرك، لذا ImportValidationError في النهاية يلغي كل ما كُتب.
+    
+    Yields:
+        list: دفعة صفوف جاهزة للإدراج
+    """
+    errors = []
+    batch = []
+    for position, record in records:
+        row, error_msg = prepare_import_row(record, with_id=(mode == 'upsert'))
+        if error_msg:
+            errors.append({'row': position, 'error': error_msg})
+            if len(errors) >= Config.IMPORT_MAX_ERRORS:
+                break
+            continue
+        if errors:
+            # نستمر في التحقق فقط للإبلاغ عن كل الأخطاء
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    
+    if errors:
+        raise ImportValidationError(errors)
+    if batch:
+        yield batch
+
+
+def seed_storage(backend):
+    """
+    ملء محرك تخزين فارغ من Config.STORAGE_SEED_FILE (بنفس معرفات الملف)
+    
+    Args:
+        backend (StorageBackend): المحرك
+    """
+    path = Config.STORAGE_SEED_FILE
+    if not path or not os.path.exists(path) or backend.list_questions(0, 1):
+        return
+    try:
+        with open(path, 'rb') as f:
+            batches = iter_import_batches(iter_json_records(f), 'upsert', Config.IMPORT_BATCH_SIZE)
+            seeded = backend.import_rows(batches, 'upsert')
+        print(f"✅ Seeded {seeded} questions from {path}")
+    except Exception as e:
+        print(f"⚠️ Storage seed warning: {e}")
+
+
+def iter_export_questions(fmt='ndjson'):
+    """
+    تصدير جميع الأسئلة كتيار بايتات (cursor على الخادم في postgres)
+    
+    Args:
+        fmt (str): 'ndjson' أو 'json'
+    
+    Yields:
+        bytes: أجزاء المخرجات
+    """
+    if fmt == 'json':
+        yield b'['
+    first = True
+    for question in Database.backend().iter_questions():
+        line = question.to_json()
+        if fmt == 'json':
+            yield (b'\n' if first else b',\n') + line
+        else:
+            yield line + b'\n'
+        first = False
+    if fmt == 'json':
+        yield b'\n]\n'
+
+
+@app.route('/api/admin/import-questions', methods=['POST'])
 @require_admin
-def update_question(q_id):
+def import_questions_route():
     """
-    نقطة API لتحديث سؤال موجود
-    Update Existing Question Endpoint
+    نقطة API لاستيراد الأسئلة دفعة واحدة
+    Bulk Import Endpoint
     
-    Parameters:
-        q_id (int): معرف السؤال
+    Body: مصفوفة JSON أو NDJSON (سؤال في كل سطر) بنفس صيغة إضافة سؤال
     
-    JSON Request: (نفس صيغة إضافة سؤال)
+    Query Parameters:
+        mode (str): 'append' (افتراضي) أو 'upsert'
+        replace (str): '1' لحذف الأسئلة الحالية أولاً
     
     Returns:
-        JSON: {
-            "success": bool,
-            "question": dict or error message
-        }
+        JSON: {"success": bool, "imported": int} أو {"success": false, "errors": [...]}
     """
+    mode = request.args.get('mode', 'append')
+    if mode not in IMPORT_MODES:
+        return jsonify({'success': False, 'error': f"وضع الاستيراد يجب أن يكون أحد: {', '.join(IMPORT_MODES)}"}), 400
+    
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'بيانات غير صحيحة'}), 400
-        
-        # التحقق من وجود السؤال
-        question = find_question_by_id(q_id)
-        if not question:
-            return jsonify({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}), 404
-        
-        # تحديث السؤال في قاعدة البيانات
-        update_query = """
-        UPDATE questions
-        SET type = %s,
-            question = %s,
-            options = %s,
-            correct_answer = %s,
-            category = %s,
-            updated_at = CURRENT_TIMESTAMP
-        WHERE id = %s
-        RETURNING id, type, question, options, correct_answer, category
-        """
-        
-        params = (
-            data.get('type', question.get('type', 'mcq')),
-            data.get('question', question.get('question')),
-            json.dumps(data.get('options', question.get('options')), ensure_ascii=False),
-            data.get('correct_answer', question.get('correct_answer')),
-            data.get('category', question.get('category', 'رومانسي')),
-            q_id
+        imported = import_questions(
+            iter_json_records(request.stream),
+            mode=mode,
+            replace=request.args.get('replace') == '1'
         )
-        
-        result = Database.execute_query_one(update_query, params)
-        
-        if result:
-            updated_question = {
-                'id': result['id'],
-                'type': result['type'],
-                'question': result['question'],
-                'options': result['options'] if isinstance(result['options'], list) else json.loads(result['options']),
-                'correct_answer': result['correct_answer'],
-                'category': result['category']
-            }
-            return jsonify({'success': True, 'question': updated_question})
-        else:
-            return jsonify({'success': False, 'error': 'فشل تحديث السؤال'}), 500
+        return jsonify({'success': True, 'imported': imported})
     
-    except json.JSONDecodeError as e:
+    except ImportValidationError as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+    except ValueError as e:
         error_msg = f'خطأ في معالجة JSON: {str(e)}'
         print(f"❌ {error_msg}")
         return jsonify({'success': False, 'error': error_msg}), 400
-    except psycopg2.Error as e:
+    except Database.ERRORS as e:
         error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
         print(f"❌ {error_msg}")
         return jsonify({'success': False, 'error': error_msg}), 500
@@ -573,34 +6217,95 @@ def update_question(q_id):
         return jsonify({'success': False, 'error': error_msg}), 500
 
 
-@app.route('/api/admin/delete-question/<int:q_id>', methods=['DELETE'])
+@app.route('/api/admin/export-questions')
 @require_admin
-def delete_question(q_id):
+def export_questions_route():
     """
-    نقطة API لحذف سؤال
-    Delete Question Endpoint
+    نقطة API لتصدير جميع الأسئلة كتيار
+    Streaming Export Endpoint
     
-    Parameters:
-        q_id (int): معرف السؤال
+    Query Parameters:
+        format (str): 'ndjson' (افتراضي) أو 'json'
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'json'):
+        return jsonify({'success': False, 'error': "الصيغة يجب أن تكون 'ndjson' أو 'json'"}), 400
+    
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    response = Response(stream_with_context(iter_export_questions(fmt)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=questions.{fmt}'
+    return response
+
+
+@app.route('/api/admin/publish-snapshot', methods=['POST'])
+@require_admin
+def publish_snapshot_route():
+    """
+    نشر لقطة ثابتة للأسئلة الآن (ينتظر اكتمال الكتابة)
+    Publish static question snapshot
     
     Returns:
-        JSON: {"success": bool, "error": error message (if any)}
+        JSON: {"success": bool, "version": str}
     """
+    if not SnapshotPublisher.enabled():
+        return jsonify({'success': False, 'error': 'النشر الثابت غير مفعّل (SNAPSHOT_DIR)'}), 400
     try:
-        # حذف السؤال من قاعدة البيانات
-        delete_query = "DELETE FROM questions WHERE id = %s"
-        
-        # أولاً، تحقق من وجود السؤال
-        question = find_question_by_id(q_id)
-        if not question:
-            return jsonify({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}), 404
-        
-        # ثم احذفه
-        Database.execute_query(delete_query, (q_id,))
-        
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'version': SnapshotPublisher.publish()})
+    except (OSError, *Database.ERRORS) as e:
+        print(f"❌ Error publishing question snapshot: {e}")
+        return jsonify({'success': False, 'error': f'فشل النشر: {str(e)}'}), 500
+
+
+# ==================== إحصائيات الأسئلة ====================
+
+def rebuild_question_stats():
+    """
+    إعادة حساب العدادات بالكامل من attempt_answers (في معاملة واحدة)
+    
+    Returns:
+        int: عدد الأسئلة التي لها إحصائيات
+    """
+    return Database.backend().rebuild_stats()
+
+
+def load_question_stats():
+    """
+    قراءة الإحصائيات لكل سؤال من العدادات - O(عدد الأسئلة)
+    
+    Returns:
+        list: إحصائيات كل سؤال بترتيب الأسئلة
+    """
+    counts, distributions = Database.backend().load_stats()
+    
+    stats = []
+    for question in load_questions():
+        attempts, correct = counts.get(question.id, (0, 0))
+        stats.append({
+            'id': question.id,
+            'attempts': attempts,
+            'correct': correct,
+            'accuracy': round(correct / attempts * 100, 2) if attempts else None,
+            'distribution': distributions.get(question.id, {})
+        })
+    return stats
+
+
+@app.route('/api/admin/stats')
+@require_admin
+def get_question_stats():
+    """
+    نقطة API لإحصائيات الأسئلة (الدقة وتوزيع الخيارات المختارة)
+    Per-question Statistics Endpoint
     
-    except psycopg2.Error as e:
+    Returns:
+        JSON: {
+            "success": bool,
+            "questions": [{"id", "attempts", "correct", "accuracy", "distribution"}]
+        }
+    """
+    try:
+        return jsonify({'success': True, 'questions': load_question_stats()})
+    except Database.ERRORS as e:
         error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
         print(f"❌ {error_msg}")
         return jsonify({'success': False, 'error': error_msg}), 500
@@ -616,12 +6321,20 @@ def get_questions():
     نقطة API للحصول على جميع الأسئلة
     Get All Questions Endpoint
     
+    الجسم يُبنى ويُضغط مرة واحدة لكل إصدار من الأسئلة، ويدعم ETag/304.
+    مع SNAPSHOT_URL_PREFIX يُحوَّل الطلب (307) إلى اللقطة الثابتة لنفس المحتوى إن كانت منشورة.
+    
     Returns:
         JSON: قائمة جميع الأسئلة
     """
     try:
-        questions = load_questions()
-        return jsonify(questions)
+        payload = get_questions_payload()
+        snapshot_url = SnapshotPublisher.snapshot_url(payload)
+        if snapshot_url:
+            response = redirect(snapshot_url, 307)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return send_payload(payload, Config.QUESTIONS_HTTP_MAX_AGE)
     except Exception as e:
         print(f"❌ Error getting questions: {e}")
         return jsonify({'error': 'خطأ في تحميل الأسئلة'}), 500
@@ -658,6 +6371,109 @@ def init_database():
         print(f"⚠️ Database initialization warning: {e}")
 
 
+# ==================== أوامر سطر الأوامر ====================
+
+@app.cli.command('score-submissions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def score_submissions_command(path):
+    """
+    تصحيح ملف إرسالات (JSON أو NDJSON) وطباعة النتائج بصيغة NDJSON
+    
+    Usage: flask --app app score-submissions submissions.ndjson
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    
+    if content.startswith('['):
+        submissions = json.loads(content)
+    else:
+        submissions = [json.loads(line) for line in content.splitlines() if line.strip()]
+    
+    for result in ScoringEngine.score_many(submissions):
+        click.echo(json.dumps(result, ensure_ascii=False))
+
+
+@app.cli.command('import-questions')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--mode', type=click.Choice(IMPORT_MODES), default='append', help='append: معرفات جديدة، upsert: حسب id')
+@click.option('--replace', is_flag=True, help='حذف جميع الأسئلة الحالية أولاً')
+def import_questions_command(path, mode, replace):
+    """
+    استيراد ملف أسئلة (JSON أو NDJSON) في معاملة واحدة
+    
+    Usage: flask --app app import-questions questions_ar.json --mode upsert
+    """
+    try:
+        with open(path, 'rb') as f:
+            imported = import_questions(iter_json_records(f), mode=mode, replace=replace)
+    except ImportValidationError as e:
+        for error in e.errors:
+            click.echo(f"❌ row {error['row']}: {error['error']}", err=True)
+        raise click.ClickException(str(e))
+    except ValueError as e:
+        raise click.ClickException(f'خطأ في معالجة JSON: {str(e)}')
+    click.echo(f"✅ Imported {imported} questions")
+
+
+@app.cli.command('export-questions')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'json']), default='ndjson')
+def export_questions_command(path, fmt):
+    """
+    تصدير جميع الأسئلة إلى ملف (أو stdout)
+    
+    Usage: flask --app app export-questions questions.ndjson
+    """
+    with click.open_file(path, 'wb') as f:
+        for chunk in iter_export_questions(fmt):
+            f.write(chunk)
+
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """
+    إعادة حساب إحصائيات الأسئلة من جميع المحاولات المحفوظة
+    
+    تحذف أيضاً لقطة الترتيب فتعيد العمليات الجديدة بذره من المحاولات.
+    
+    Usage: flask --app app rebuild-stats
+    """
+    count = rebuild_question_stats()
+    Ranking.reset()
+    click.echo(f"✅ Rebuilt statistics for {count} questions")
+
+
+@app.cli.command('publish-snapshot')
+def publish_snapshot_command():
+    """
+    نشر لقطات JSON ثابتة للأسئلة في SNAPSHOT_DIR
+    
+    Usage: SNAPSHOT_DIR=public/snapshots flask --app app publish-snapshot
+    """
+    if not SnapshotPublisher.enabled():
+        raise click.ClickException("SNAPSHOT_DIR is not set")
+    version = SnapshotPublisher.publish()
+    click.echo(f"✅ Published question snapshot {version} to {Config.SNAPSHOT_DIR}")
+
+
+@app.cli.command('build-assets')
+@click.option('--output', default=None, help='Build directory (default ASSETS_BUILD_DIR)')
+def build_assets_command(output):
+    """
+    تصغير الأصول الثابتة وتسميتها ببصمة المحتوى وضغطها مسبقاً (gzip/brotli)
+    
+    Usage: flask --app app build-assets
+    """
+    manifest = StaticAssets.write(output)
+    for name, fingerprinted in sorted(manifest.items()):
+        click.echo(f"  {name} -> {fingerprinted}")
+    click.echo(f"✅ Built {len(manifest)} assets into {output or Config.ASSETS_BUILD_DIR}")
+
+
+# زمن الاستيراد - يبقى آخر سطر قبل نقطة الدخول
+ColdStart.import_ms = round((time.perf_counter() - PROCESS_STARTED) * 1000, 1)
+
+
 # ==================== نقطة الدخول ====================
 
 if __name__ == '__main__':
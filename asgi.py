@@ -0,0 +1,667 @@
+"""
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+نقطة دخول ASGI غير متزامنة لتطبيق اختبار الحب
+Async ASGI entry point for the Love Quiz
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Usage:
+    uvicorn asgi:app --workers 4
+
+المسارات الساخنة تُخدم في حلقة الأحداث بدون حجز خيط لكل طلب:
+    GET  /                         الصفحة الرئيسية (حمولة مضغوطة مسبقاً)
+    GET  /api/questions            جميع الأسئلة
+    POST /api/submit               التصحيح (الحفظ عبر SubmissionWriter)
+    GET  /api/admin/questions      قائمة لوحة التحكم
+    POST /api/admin/add-question   إضافة
+    POST|PUT /api/admin/update-question/<id>
+    DELETE /api/admin/delete-question/<id>
+
+مع postgres تمر الاستعلامات عبر asyncpg (pool غير متزامن وعبارات محضّرة)،
+ومع sqlite/memory عبر thread pool. بقية المسارات (صفحات الإدارة، الاستيراد،
+التصدير، الإحصائيات، العمليات الجماعية، /api/quiz) تُمرر لتطبيق Flask نفسه في خيط منفصل.
+تطبيق Flask في app.py يبقى نقطة دخول WSGI كما هو.
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+# ==================== المكتبات والاستيراد ====================
+import asyncio
+import io
+import json
+import re
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_accept_header, parse_etags
+
+# asyncpg اختياري - مطلوب فقط مع STORAGE_BACKEND=postgres
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from app import (
+    app as flask_app, Config, Database, PostgresBackend, Question, QuestionCache, VersionConflictError,
+    PayloadCache, SubmissionWriter, SnapshotPublisher, ColdStart, Metrics, RateLimiter, client_address, negotiate_payload, get_questions_payload,
+    render_index_page, process_submission, validate_question_data, question_fields, load_shared_questions,
+    validate_question_update, expected_version, conflict_response
+)
+
+
+# أخطاء asyncpg؛ أخطاء المسار المتزامن في Database.ERRORS (تكتمل عند تحميل المحرك)
+ASYNCPG_ERRORS = (asyncpg.PostgresError,) if asyncpg else ()
+
+
+# أقصى عدد أجزاء استجابة Flask المنتظرة قبل أن يتوقف خيطها (ضغط عكسي على التصدير)
+WSGI_BUFFER_CHUNKS = 16
+
+
+# ==================== محركات التخزين غير المتزامنة ====================
+
+class AsyncPostgresBackend:
+    """
+    محرك PostgreSQL غير متزامن عبر asyncpg
+    Non-blocking Postgres backend (asyncpg pool)
+
+    نفس عبارات PostgresBackend؛ asyncpg يحضّر العبارات ويخزنها لكل اتصال
+    (statement_cache_size=0 عند تعطيل DB_PREPARED_STATEMENTS لـ pgbouncer).
+    """
+
+    def __init__(self):
+        if asyncpg is None:
+            raise RuntimeError("❌ asyncpg is required for the ASGI entry point with STORAGE_BACKEND=postgres")
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+
+    async def pool(self):
+        """pool غير متزامن (يُنشأ عند أول استخدام)"""
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    Config.validate()
+                    self._pool = await asyncpg.create_pool(
+                        Config.DATABASE_URL,
+                        min_size=Config.DB_POOL_MIN_SIZE,
+                        max_size=Config.DB_POOL_MAX_SIZE,
+                        timeout=Config.DB_POOL_TIMEOUT,
+                        max_inactive_connection_lifetime=Config.DB_POOL_MAX_AGE,
+                        statement_cache_size=100 if Config.DB_PREPARED_STATEMENTS else 0
+                    )
+                    print("✅ Async database pool created successfully")
+        return self._pool
+
+    async def _run(self, name, query, params, fetch):
+        """تنفيذ عبارة مع نفس عدادات التوقيت في Database.statement_stats()"""
+        pool = await self.pool()
+        sql = Database._server_params(query)
+        rows = 0
+        failed = False
+        started = time.perf_counter()
+        try:
+            async with pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+                Metrics.record_pool_wait(time.perf_counter() - started)
+                if fetch == 'all':
+                    result = await conn.fetch(sql, *params)
+                    rows = len(result)
+                else:
+                    result = await conn.fetchrow(sql, *params)
+                    rows = int(result is not None)
+            return result
+        except asyncpg.PostgresError as e:
+            failed = True
+            print(f"❌ Database error ({name}): {e}")
+            raise
+        finally:
+            Database._record_statement(name, time.perf_counter() - started, rows, failed)
+
+    async def version_token(self):
+        row = await self._run('q_version', PostgresBackend.VERSION_SQL, (), 'one')
+        return row[0] if row else None
+
+    async def fetch_questions(self):
+        rows = await self._run('q_fetch_all', PostgresBackend.FETCH_ALL_SQL, (), 'all')
+        return [Question(*row) for row in rows]
+
+    async def get_question(self, q_id):
+        row = await self._run('q_get', PostgresBackend.GET_SQL, (q_id,), 'one')
+        return Question(*row) if row else None
+
+    async def insert_question(self, fields):
+        params = PostgresBackend.insert_params(fields)
+        row = await self._run('q_insert', PostgresBackend.INSERT_SQL, params, 'one')
+        return Question(*row) if row else None
+
+    async def update_question(self, q_id, fields, expected_version=None):
+        params = PostgresBackend.update_params(q_id, fields, expected_version)
+        row = await self._run('q_update', PostgresBackend.UPDATE_SQL, params, 'one')
+        row = PostgresBackend.write_result(q_id, row)
+        return Question(*row) if row else None
+
+    async def delete_question(self, q_id, expected_version=None):
+        params = (q_id, q_id, expected_version, expected_version)
+        row = await self._run('q_delete', PostgresBackend.DELETE_SQL, params, 'one')
+        return PostgresBackend.write_result(q_id, row) is not None
+
+    async def list_questions(self, after, limit, category=None, q_type=None, search=None):
+        query, params = PostgresBackend.list_query(after, limit, category, q_type, search)
+        name = 'q_page_' + ''.join('1' if value else '0' for value in (category, q_type, search))
+        rows = await self._run(name, query, params, 'all')
+        return [Question(*row) for row in rows]
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class ThreadedBackend:
+    """
+    محركات sqlite/memory المتزامنة عبر thread pool
+    Runs the synchronous storage backend off the event loop
+    """
+
+    def __getattr__(self, name):
+        method = getattr(Database.backend(), name)
+
+        async def call(*args):
+            return await asyncio.to_thread(method, *args)
+        return call
+
+    async def close(self):
+        pass
+
+
+# ==================== الذاكرة المؤقتة غير المتزامنة ====================
+
+class AsyncQuestionLoader:
+    """
+    تحديث QuestionCache من حلقة الأحداث
+    Keeps the shared QuestionCache fresh without blocking the loop
+
+    يُستدعى refresh() قبل كل طلب؛ عادةً لا يفعل شيئاً (فحص زمني فقط).
+    ScoringEngine و PayloadCache و Flask نفسه يقرؤون نفس اللقطة.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = asyncio.Lock()
+
+    async def refresh(self):
+        """إعادة التحميل أو فحص البصمة عند الحاجة"""
+        if QuestionCache.refresh_action(time.monotonic()) is None:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            action = QuestionCache.refresh_action(now)
+            try:
+                if action is None:
+                    return
+                if QuestionCache._snapshot is None and not QuestionCache._warmed:
+                    with QuestionCache._lock:
+                        if QuestionCache._warm(now):
+                            return
+                version = QuestionCache._version
+                token = await self.backend.version_token()
+                if action == 'probe' and not QuestionCache.mark_checked(now, token):
+                    return
+                if Config.CACHE_REDIS_URL:
+                    # الطبقة المشتركة متزامنة: single-flight في خيط، والتحميل من قاعدة البيانات في الحلقة
+                    loop = asyncio.get_running_loop()
+                    questions = await asyncio.to_thread(
+                        load_shared_questions, token,
+                        lambda: asyncio.run_coroutine_threadsafe(self.backend.fetch_questions(), loop).result()
+                    )
+                else:
+                    questions = await self.backend.fetch_questions()
+                with QuestionCache._lock:
+                    QuestionCache.misses += 1
+                    QuestionCache.install(token, questions, now, version)
+            except Exception as e:
+                # نخدم اللقطة القديمة إن وجدت بدلاً من الفشل
+                print(f"❌ Error refreshing question cache: {e}")
+                if QuestionCache._snapshot is None:
+                    raise
+
+
+# ==================== الطلب والاستجابة ====================
+
+class Request:
+    """طلب HTTP مبسط من scope الخاص بـ ASGI"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.body = body
+        self.headers = {}
+        for key, value in scope['headers']:
+            key = key.decode('latin-1')
+            value = value.decode('latin-1')
+            self.headers[key] = f"{self.headers[key]}, {value}" if key in self.headers else value
+        self.args = {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        self.client = client_address(self.headers.get('x-forwarded-for'), (scope.get('client') or ('', 0))[0])
+
+    def get_json(self):
+        """جسم الطلب كـ JSON (None إذا كان فارغاً أو غير صالح)"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+    def cookie(self, name):
+        cookies = SimpleCookie(self.headers.get('cookie', ''))
+        return cookies[name].value if name in cookies else None
+
+
+def json_response(data, status=200):
+    """استجابة JSON"""
+    return status, json.dumps(data, ensure_ascii=False).encode('utf-8'), [
+        ('Content-Type', 'application/json; charset=utf-8')
+    ]
+
+
+def payload_response(request, payload, max_age=0):
+    """حمولة مضغوطة مسبقاً مع ETag/304 (نفس send_payload في Flask)"""
+    status, body, headers = negotiate_payload(
+        payload,
+        parse_accept_header(request.headers.get('accept-encoding')),
+        parse_etags(request.headers.get('if-none-match')),
+        max_age
+    )
+    content_type = payload.mimetype + ('; charset=utf-8' if payload.mimetype.startswith('text/') else '')
+    return status, body, headers + [('Content-Type', content_type)]
+
+
+def is_admin(request):
+    """قراءة جلسة Flask الموقعة (نفس ملف تعريف الارتباط بين WSGI و ASGI)"""
+    cookie = request.cookie(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return False
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return False
+    return bool(session.get('admin_authenticated'))
+
+
+def database_error(e):
+    error_msg = f'خطأ في قاعدة البيانات: {str(e)}'
+    print(f"❌ {error_msg}")
+    return json_response({'success': False, 'error': error_msg}, 500)
+
+
+def server_error(e):
+    error_msg = f'خطأ سيرفر غير متوقع: {str(e)}'
+    print(f"❌ {error_msg}")
+    return json_response({'success': False, 'error': error_msg}, 500)
+
+
+# ==================== المسارات غير المتزامنة ====================
+
+class QuizASGI:
+    """
+    تطبيق ASGI: مسارات غير متزامنة مع تمرير الباقي لتطبيق Flask
+    ASGI application with a WSGI fallback
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.backend = None
+        self.loader = None
+        self.routes = {
+            ('GET', '/'): self.index,
+            ('GET', '/api/questions'): self.questions,
+            ('POST', '/api/submit'): self.submit,
+            ('GET', '/api/admin/questions'): self.list_questions,
+            ('POST', '/api/admin/add-question'): self.add_question
+        }
+        # أسماء مسارات Flask المقابلة (مفاتيح RATE_LIMITS)
+        self.endpoints = {
+            'index': 'index',
+            'questions': 'get_questions',
+            'submit': 'submit_quiz',
+            'list_questions': 'list_questions_route',
+            'add_question': 'add_question',
+            'update_question': 'update_question',
+            'delete_question': 'delete_question'
+        }
+        # (pattern, methods, handler, قاعدة المسار في المقاييس كما في Flask)
+        self.id_routes = [
+            (re.compile(r'^/api/admin/update-question/(\d+)$'), ('POST', 'PUT'), self.update_question,
+             '/api/admin/update-question/<int:q_id>'),
+            (re.compile(r'^/api/admin/delete-question/(\d+)$'), ('DELETE',), self.delete_question,
+             '/api/admin/delete-question/<int:q_id>')
+        ]
+
+    def setup(self):
+        """اختيار المحرك غير المتزامن (مرة واحدة لكل حلقة أحداث)"""
+        if self.backend is None:
+            if Config.STORAGE_BACKEND == 'postgres':
+                self.backend = AsyncPostgresBackend()
+            else:
+                self.backend = ThreadedBackend()
+            self.loader = AsyncQuestionLoader(self.backend)
+            QuestionCache.external_refresh = True
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        self.setup()
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+        request = Request(scope, body)
+
+        handler, q_id, rule = self.routes.get((request.method, request.path)), None, request.path
+        if handler is None:
+            for pattern, methods, route, route_rule in self.id_routes:
+                match = pattern.match(request.path)
+                if match and request.method in methods:
+                    handler, q_id, rule = route, int(match.group(1)), route_rule
+                    break
+        if handler is None:
+            # مسارات Flask تقرأ نفس اللقطة (/api/quiz مثلاً): تحديثها أولاً حتى لا
+            # تخدم أسئلة ما قبل الكتابة
+            try:
+                await self.loader.refresh()
+            except Exception:
+                # الخطأ مطبوع في refresh، و Flask يتعامل مع غياب اللقطة بنفسه
+                pass
+            # Flask يقيس هذه الطلبات بنفسه
+            return await self.call_wsgi(scope, body, send, receive)
+
+        Metrics.start()
+        try:
+            retry_after = RateLimiter.check(self.endpoints[handler.__name__], request.client)
+            if retry_after is not None:
+                status, body, headers = json_response({'error': 'طلبات كثيرة جداً. يرجى المحاولة بعد قليل'}, 429)
+                headers.append(('Retry-After', str(max(1, int(retry_after + 0.999)))))
+            else:
+                await self.loader.refresh()
+                status, body, headers = await (handler(request, q_id) if q_id is not None else handler(request))
+        except Exception as e:
+            print(f"❌ Error in {request.path}: {e}")
+            status, body, headers = json_response({'error': 'حدث خطأ في الخادم'}, 500)
+        server_timing = ColdStart.record(request.path)
+        if server_timing:
+            headers = headers + [('Server-Timing', server_timing)]
+        Metrics.finish(request.method, rule, status, len(body))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        """بدء وإيقاف: تحميل الأسئلة مسبقاً وإغلاق pool وتفريغ طابور الإرسالات"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.setup()
+                try:
+                    await self.loader.refresh()
+                except Exception as e:
+                    print(f"⚠️ Startup question load warning: {e}")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.backend is not None:
+                    await self.backend.close()
+                await asyncio.to_thread(SubmissionWriter.stop)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ---------- المسارات العامة ----------
+
+    async def index(self, request):
+        version, _ = QuestionCache.get()
+
+        def render():
+            # url_for في القالب يحتاج سياق طلب Flask
+            with flask_app.request_context(build_environ(request.scope, b'')):
+                return render_index_page()
+        payload = PayloadCache.peek('index', version)
+        if payload is None:
+            # الضغط (brotli-11) يستغرق عشرات الميلي ثانية: خارج حلقة الأحداث
+            payload = await asyncio.to_thread(PayloadCache.get, 'index', version, render, 'text/html')
+        return payload_response(request, payload)
+
+    async def questions(self, request):
+        version, _ = QuestionCache.get()
+        payload = PayloadCache.peek('questions', version)
+        if payload is None:
+            payload = await asyncio.to_thread(get_questions_payload)
+        snapshot_url = SnapshotPublisher.snapshot_url(payload)
+        if snapshot_url:
+            return 307, b'', [('Location', snapshot_url), ('Cache-Control', 'no-cache')]
+        return payload_response(request, payload, Config.QUESTIONS_HTTP_MAX_AGE)
+
+    async def submit(self, request):
+        try:
+            # بدون انتظار الطابور: لا نحجب حلقة الأحداث إذا كان ممتلئاً
+            body, status = process_submission(
+                request.get_json(), enqueue_timeout=0,
+                client=request.client, idempotency_key=request.headers.get('idempotency-key')
+            )
+            return json_response(body, status)
+        except (ValueError, TypeError) as e:
+            return json_response({'error': f'خطأ في معالجة البيانات: {str(e)}'}, 400)
+
+    # ---------- لوحة التحكم ----------
+
+    async def list_questions(self, request):
+        if not is_admin(request):
+            return 302, b'', [('Location', '/admin/login')]
+        try:
+            after = int(request.args.get('after', 0))
+            limit = int(request.args.get('limit', Config.MAX_QUESTIONS))
+        except ValueError:
+            after, limit = 0, Config.MAX_QUESTIONS
+        limit = max(1, min(limit, Config.MAX_QUESTIONS))
+        search = request.args.get('q', '').strip()
+        try:
+            # صف إضافي لمعرفة وجود صفحة تالية بدون COUNT
+            results = await self.backend.list_questions(
+                after, limit + 1,
+                request.args.get('category') or None,
+                request.args.get('type') or None,
+                search or None
+            )
+        except (*Database.ERRORS, *ASYNCPG_ERRORS) as e:
+            return database_error(e)
+        questions = results[:limit]
+        result = {
+            'success': True,
+            'questions': [q.to_dict() for q in questions],
+            'next_cursor': questions[-1].id if len(results) > limit else None
+        }
+        if not after:
+            _, snapshot = QuestionCache.get()
+            result['total'] = len(snapshot)
+            result['categories'] = sorted({q.category for q in snapshot if q.category})
+        return json_response(result)
+
+    async def add_question(self, request):
+        if not is_admin(request):
+            return 302, b'', [('Location', '/admin/login')]
+        data = request.get_json()
+        if not data:
+            return json_response({'success': False, 'error': 'بيانات غير صحيحة. لم يتم استقبال JSON'}, 400)
+        is_valid, error_msg = validate_question_data(data)
+        if not is_valid:
+            return json_response({'success': False, 'error': error_msg}, 400)
+        try:
+            new_question = await self.backend.insert_question(question_fields(data))
+            QuestionCache.invalidate()
+        except (*Database.ERRORS, *ASYNCPG_ERRORS) as e:
+            return database_error(e)
+        except Exception as e:
+            return server_error(e)
+        if new_question:
+            return json_response({'success': True, 'question': new_question.to_dict()}, 201)
+        return json_response({'success': False, 'error': 'فشل إنشاء السؤال'}, 500)
+
+    async def update_question(self, request, q_id):
+        if not is_admin(request):
+            return 302, b'', [('Location', '/admin/login')]
+        data = request.get_json()
+        if not data:
+            return json_response({'success': False, 'error': 'بيانات غير صحيحة'}, 400)
+        is_valid, error_msg = validate_question_update(data)
+        if not is_valid:
+            return json_response({'success': False, 'error': error_msg}, 400)
+        try:
+            version = expected_version(data, request.headers.get('if-match'))
+        except (TypeError, ValueError):
+            return json_response({'success': False, 'error': 'إصدار غير صالح'}, 400)
+        try:
+            updated_question = await self.backend.update_question(
+                q_id, question_fields(data, partial=True), version
+            )
+        except VersionConflictError as e:
+            return json_response(*conflict_response(e))
+        except (*Database.ERRORS, *ASYNCPG_ERRORS) as e:
+            return database_error(e)
+        except Exception as e:
+            return server_error(e)
+        if not updated_question:
+            return json_response({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}, 404)
+        QuestionCache.invalidate()
+        return json_response({'success': True, 'question': updated_question.to_dict()})
+
+    async def delete_question(self, request, q_id):
+        if not is_admin(request):
+            return 302, b'', [('Location', '/admin/login')]
+        try:
+            version = expected_version({'version': request.args.get('version')}, request.headers.get('if-match'))
+        except (TypeError, ValueError):
+            return json_response({'success': False, 'error': 'إصدار غير صالح'}, 400)
+        try:
+            if not await self.backend.delete_question(q_id, version):
+                return json_response({'success': False, 'error': f'السؤال برقم {q_id} غير موجود'}, 404)
+            QuestionCache.invalidate()
+        except VersionConflictError as e:
+            return json_response(*conflict_response(e))
+        except (*Database.ERRORS, *ASYNCPG_ERRORS) as e:
+            return database_error(e)
+        except Exception as e:
+            return server_error(e)
+        return json_response({'success': True})
+
+    # ---------- تمرير الباقي إلى Flask ----------
+
+    async def call_wsgi(self, scope, body, send, receive):
+        """
+        تشغيل تطبيق Flask في خيط منفصل مع بث الاستجابة
+
+        الخيط نفسه يكرر جسم الاستجابة (stream_with_context يحتاج نفس السياق)
+        ويرسل الأجزاء إلى حلقة الأحداث، ولا يسبقها بأكثر من WSGI_BUFFER_CHUNKS جزءاً.
+        عند انقطاع العميل أو فشل الإرسال يتوقف الخيط عند الجزء التالي ويغلق
+        المكرر (مؤشرات التصدير مثلاً) بدلاً من الانتظار للأبد.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        slots = threading.Semaphore(WSGI_BUFFER_CHUNKS)
+        aborted = threading.Event()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+            return lambda data: None
+
+        def push(chunk):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except RuntimeError:
+                # الحلقة أُغلقت (إيقاف الخادم)
+                aborted.set()
+
+        def run():
+            try:
+                iterable = self.wsgi_app(build_environ(scope, body), start_response)
+                try:
+                    for chunk in iterable:
+                        if not chunk:
+                            continue
+                        while not slots.acquire(timeout=0.5):
+                            if aborted.is_set():
+                                return
+                        if aborted.is_set():
+                            return
+                        push(chunk)
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            finally:
+                push(None)
+
+        async def watch_disconnect():
+            # الجسم قُرئ كاملاً؛ الرسالة التالية من الخادم هي انقطاع العميل
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            aborted.set()
+
+        worker = threading.Thread(target=run, name='wsgi-fallback', daemon=True)
+        worker.start()
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            chunk = await chunks.get()
+            await send({
+                'type': 'http.response.start',
+                'status': started.get('status', 500),
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in started.get('headers', [])]
+            })
+            while chunk is not None and not aborted.is_set():
+                slots.release()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await chunks.get()
+            if not aborted.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # انقطاع، إلغاء المهمة أو خطأ في send: إيقاف الخيط
+            aborted.set()
+            watcher.cancel()
+
+
+def build_environ(scope, body):
+    """بناء WSGI environ من ASGI scope (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body))
+    }
+    for key, value in scope['headers']:
+        key = key.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            name = f'HTTP_{key}'
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+app = QuizASGI(flask_app.wsgi_app)
@@ -0,0 +1,647 @@
+"""
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+مجموعة قياس الأداء لتطبيق اختبار الحب
+Load-test and micro-benchmark suite
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+Usage:
+    # محرك مدمج (memory أو sqlite) مع 5000 سؤال مولّد و 16 عميل متزامن
+    python benchmarks/bench.py run --backend memory --questions 5000 --concurrency 16
+
+    # Postgres محلي (يحذف الأسئلة الحالية ويزرع أسئلة مولدة!)
+    DATABASE_URL=postgresql://localhost/quiz_bench python benchmarks/bench.py run --backend postgres --seed
+
+    # خادم قائم (gunicorn / uvicorn asgi:app) - اختبار الحمل فقط
+    python benchmarks/bench.py run --url http://127.0.0.1:5000 --admin-password 0000
+
+    # مقارنة نتيجتين (رمز خروج 1 عند تراجع أكبر من الحد)
+    python benchmarks/bench.py compare benchmarks/results/old.json benchmarks/results/new.json
+
+النتائج تُحفظ في benchmarks/results/<timestamp>-<commit>.json.
+الأسئلة تُولّد بشكل حتمي من questions_ar.json (نفس --seed-value = نفس البيانات).
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+"""
+
+# ==================== المكتبات والاستيراد ====================
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+
+# السيناريوهات بالترتيب الافتراضي
+SCENARIOS = ('index', 'questions', 'questions_etag', 'submit', 'admin_list', 'admin_crud')
+
+
+# ==================== توليد البيانات ====================
+
+def generate_questions(count, seed=42):
+    """
+    توليد أسئلة حتمية بالاعتماد على questions_ar.json
+
+    Args:
+        count (int): عدد الأسئلة
+        seed (int): بذرة العشوائية
+
+    Returns:
+        list: أسئلة بمعرفات 1..count
+    """
+    with open(os.path.join(ROOT, 'questions_ar.json'), encoding='utf-8') as f:
+        templates = json.load(f)
+    rng = random.Random(seed)
+    categories = sorted({t['category'] for t in templates if t.get('category')})
+    questions = []
+    for q_id in range(1, count + 1):
+        template = templates[(q_id - 1) % len(templates)]
+        options = list(template['options'])
+        if template['type'] == 'mcq':
+            rng.shuffle(options)
+        questions.append({
+            'id': q_id,
+            'type': template['type'],
+            'question': f"{template['question']} ({q_id})",
+            'options': options,
+            'correct_answer': rng.randrange(len(options)),
+            'category': rng.choice(categories)
+        })
+    return questions
+
+
+def build_answers(questions, rng, answered=0.9, accuracy=0.7):
+    """
+    إجابات واقعية: معظم الأسئلة مُجابة، ونسبة منها صحيحة، بصيغة quiz.js (فهرس نصي)
+
+    Args:
+        questions (list): الأسئلة كما في /api/questions
+        rng (random.Random): مولد عشوائي
+        answered (float): نسبة الأسئلة المُجابة
+        accuracy (float): نسبة الإجابات الصحيحة
+
+    Returns:
+        dict: {question_id: answer}
+    """
+    answers = {}
+    for q in questions:
+        if rng.random() >= answered:
+            continue
+        correct = q.get('correct_answer')
+        if correct is not None and rng.random() < accuracy:
+            answers[str(q['id'])] = str(correct)
+        else:
+            answers[str(q['id'])] = str(rng.randrange(len(q['options'])))
+    return answers
+
+
+def percentile(sorted_values, fraction):
+    """نسبة مئوية بالاستيفاء الخطي"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples_ms):
+    """ملخص زمني بالمللي ثانية"""
+    values = sorted(samples_ms)
+    return {
+        'mean': round(sum(values) / len(values), 3) if values else 0.0,
+        'p50': round(percentile(values, 0.50), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'p99': round(percentile(values, 0.99), 3),
+        'max': round(values[-1], 3) if values else 0.0
+    }
+
+
+# ==================== إعداد البيئة ====================
+
+def prepare_environment(args, workdir):
+    """
+    ضبط متغيرات البيئة قبل استيراد app (Config يُقرأ عند الاستيراد)
+
+    Returns:
+        list: الأسئلة المولّدة
+    """
+    questions = generate_questions(args.questions, args.seed_value)
+    seed_path = os.path.join(workdir, 'questions.json')
+    with open(seed_path, 'w', encoding='utf-8') as f:
+        json.dump(questions, f, ensure_ascii=False)
+
+    os.environ['STORAGE_BACKEND'] = args.backend
+    os.environ['STORAGE_SEED_FILE'] = seed_path
+    os.environ['SQLITE_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['ADMIN_PASSWORD'] = args.admin_password
+    os.environ['PERSIST_SUBMISSIONS'] = '1' if args.persist else '0'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    # سجل الطلبات البطيئة يشوّه النتائج، وكل العملاء من 127.0.0.1 فتحديد المعدل يرفضهم
+    os.environ['SLOW_REQUEST_MS'] = '0'
+    os.environ['RATE_LIMITS'] = ''
+    return questions
+
+
+def import_app(args, questions):
+    """استيراد التطبيق وتهيئة المخزن"""
+    sys.path.insert(0, ROOT)
+    import app as quiz_app
+
+    backend = quiz_app.Database.backend()
+    if args.backend == 'postgres' and args.seed:
+        imported = quiz_app.import_questions(questions, mode='upsert', replace=True)
+        print(f"✅ Seeded {imported['imported']} questions into Postgres")
+    elif args.backend == 'postgres':
+        print("⚠️ Using existing Postgres data (pass --seed to replace it with generated questions)")
+    print(f"✅ Backend: {backend.name}, questions: {len(quiz_app.load_questions())}")
+    return quiz_app
+
+
+def start_server(wsgi_app):
+    """تشغيل خادم werkzeug متعدد الخيوط على منفذ عشوائي داخل العملية"""
+    from werkzeug.serving import make_server
+    # سطر سجل لكل طلب يشوّه النتائج
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='bench-server', daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# ==================== اختبار الحمل ====================
+
+class Client:
+    """عميل HTTP بسيط مع keep-alive وملف تعريف ارتباط واحد"""
+
+    def __init__(self, base_url, cookie=None):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookie = cookie
+        self.conn = None
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Returns:
+            tuple: (status, headers, body)
+        """
+        headers = dict(headers or {})
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, response, data
+            except (http.client.HTTPException, ConnectionError):
+                # الخادم أغلق اتصال keep-alive؛ إعادة المحاولة مرة واحدة
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def admin_login(base_url, password):
+    """تسجيل الدخول وإرجاع ملف تعريف ارتباط الجلسة"""
+    client = Client(base_url)
+    status, response, _ = client.request(
+        'POST', '/admin/login', urlencode({'password': password}).encode('utf-8'),
+        {'Content-Type': 'application/x-www-form-urlencoded'}
+    )
+    client.close()
+    cookie = response.getheader('Set-Cookie')
+    if status not in (200, 302) or not cookie:
+        raise RuntimeError(f"❌ Admin login failed ({status})")
+    return cookie.split(';', 1)[0]
+
+
+class Scenario:
+    """
+    سيناريو حمل: كل استدعاء لـ step() ينفذ طلباً واحداً أو أكثر ويعيد
+    [(name, status, elapsed_seconds, bytes)]
+    """
+
+    ENCODINGS = {'Accept-Encoding': 'br, gzip'}
+
+    def __init__(self, name, questions, admin_cookie, seed):
+        self.name = name
+        self.questions = questions
+        self.admin_cookie = admin_cookie
+        self.seed = seed
+        self.etag = None
+
+    def client(self, base_url):
+        admin = self.name.startswith('admin')
+        return Client(base_url, self.admin_cookie if admin else None)
+
+    @staticmethod
+    def timed(client, name, method, path, body=None, headers=None):
+        started = time.perf_counter()
+        status, response, data = client.request(method, path, body, headers)
+        return (name, status, time.perf_counter() - started, len(data)), response, data
+
+    def step(self, client, rng, iteration):
+        if self.name == 'index':
+            return [self.timed(client, 'index', 'GET', '/', headers=self.ENCODINGS)[0]]
+        if self.name == 'questions':
+            return [self.timed(client, 'questions', 'GET', '/api/questions', headers=self.ENCODINGS)[0]]
+        if self.name == 'questions_etag':
+            headers = dict(self.ENCODINGS)
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            sample, response, _ = self.timed(client, 'questions_etag', 'GET', '/api/questions', headers=headers)
+            self.etag = response.getheader('ETag') or self.etag
+            return [sample]
+        if self.name == 'submit':
+            body = {'answers': build_answers(self.questions, rng)}
+            return [self.timed(client, 'submit', 'POST', '/api/submit', body)[0]]
+        if self.name == 'admin_list':
+            # الصفحة الأولى أو صفحة عشوائية أو بحث
+            choice = iteration % 3
+            if choice == 0:
+                path = '/api/admin/questions?limit=50'
+            elif choice == 1:
+                path = f"/api/admin/questions?limit=50&after={rng.randrange(max(1, len(self.questions)))}"
+            else:
+                path = f"/api/admin/questions?{urlencode({'limit': 50, 'q': rng.choice(['الحب', 'الثقة', 'صح'])})}"
+            return [self.timed(client, 'admin_list', 'GET', path)[0]]
+        if self.name == 'admin_crud':
+            template = rng.choice(self.questions)
+            fields = {
+                'type': template['type'],
+                'question': f"سؤال قياس {iteration}",
+                'options': template['options'],
+                'correct_answer': '1',
+                'category': template.get('category') or 'قياس'
+            }
+            add, _, data = self.timed(client, 'admin_add', 'POST', '/api/admin/add-question', fields)
+            samples = [add]
+            try:
+                created = json.loads(data)['question']
+                q_id, version = created['id'], created.get('version')
+            except (ValueError, KeyError, TypeError):
+                return samples
+            # كتابات مشروطة بالإصدار كما ترسلها لوحة التحكم
+            update = {'question': f"سؤال قياس معدل {iteration}"}
+            if version is not None:
+                update['version'] = version
+            update_sample, _, data = self.timed(client, 'admin_update', 'PUT', f'/api/admin/update-question/{q_id}', update)
+            samples.append(update_sample)
+            try:
+                query = f"?version={json.loads(data)['question']['version']}"
+            except (ValueError, KeyError, TypeError):
+                query = ''
+            samples.append(self.timed(client, 'admin_delete', 'DELETE', f'/api/admin/delete-question/{q_id}{query}')[0])
+            return samples
+        raise ValueError(f"Unknown scenario '{self.name}'")
+
+
+def run_scenario(scenario, base_url, requests, concurrency, warmup):
+    """
+    تشغيل سيناريو بعدد عمال متزامن
+
+    Args:
+        scenario (Scenario): السيناريو
+        base_url (str): عنوان الخادم
+        requests (int): عدد الخطوات الإجمالي
+        concurrency (int): عدد العمال
+        warmup (int): خطوات إحماء لكل عامل (لا تُحسب)
+
+    Returns:
+        dict: {name: {...}} لكل نوع طلب في السيناريو
+    """
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    samples = []
+    samples_lock = threading.Lock()
+    failures = []
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def worker(worker_id):
+        rng = random.Random(scenario.seed * 1000 + worker_id)
+        client = scenario.client(base_url)
+        local = []
+        try:
+            for i in range(warmup):
+                scenario.step(client, rng, -1 - i)
+            start_barrier.wait()
+            while True:
+                with counter_lock:
+                    iteration = next(counter, None)
+                if iteration is None:
+                    break
+                local.extend(scenario.step(client, rng, iteration))
+        except threading.BrokenBarrierError:
+            return
+        except Exception as e:
+            failures.append(str(e))
+            start_barrier.abort()
+        finally:
+            client.close()
+            with samples_lock:
+                samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        start_barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if failures:
+        print(f"❌ {scenario.name}: {failures[0]}")
+
+    results = {}
+    for name in dict.fromkeys(sample[0] for sample in samples):
+        rows = [sample for sample in samples if sample[0] == name]
+        errors = sum(1 for sample in rows if sample[1] >= 400)
+        results[name] = {
+            'requests': len(rows),
+            'errors': errors,
+            'concurrency': concurrency,
+            'throughput_rps': round(len(rows) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': summarize([sample[2] * 1000 for sample in rows]),
+            'bytes_per_request': round(sum(sample[3] for sample in rows) / len(rows), 1)
+        }
+    return results
+
+
+def fetch_questions(base_url):
+    """الأسئلة كما يراها العميل (لبناء إجابات واقعية ضد خادم خارجي)"""
+    client = Client(base_url)
+    status, _, data = client.request('GET', '/api/questions')
+    client.close()
+    if status != 200:
+        raise RuntimeError(f"❌ GET /api/questions returned {status}")
+    return json.loads(data)
+
+
+# ==================== القياسات الدقيقة ====================
+
+def measure(func, repeat, number=1):
+    """
+    تشغيل func عدة مرات وإرجاع ملخص زمني لكل استدعاء
+
+    Args:
+        func (callable): الدالة (تُستدعى number مرة في كل تكرار)
+        repeat (int): عدد التكرارات
+        number (int): استدعاءات لكل تكرار
+    """
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number * 1000)
+    summary = summarize(samples)
+    summary['best'] = round(min(samples), 4)
+    summary['runs'] = repeat
+    summary['calls_per_run'] = number
+    return summary
+
+
+def run_micro(quiz_app, questions, repeat, seed):
+    """
+    قياسات دقيقة داخل العملية: تحميل الأسئلة، التصحيح، والتسلسل
+
+    Returns:
+        dict: {name: summary}
+    """
+    A = quiz_app
+    rng = random.Random(seed)
+    results = {}
+
+    def cold_load():
+        A.QuestionCache.invalidate()
+        A.load_questions()
+
+    results['load_questions_cold'] = measure(cold_load, repeat)
+    results['load_questions_warm'] = measure(A.load_questions, repeat, 1000)
+    results['fetch_questions_from_db'] = measure(A.fetch_questions_from_db, repeat)
+
+    snapshot = A.load_questions()
+    ids = [q.id for q in snapshot]
+    results['find_question_by_id'] = measure(lambda: A.find_question_by_id(rng.choice(ids)), repeat, 100)
+
+    submissions = [build_answers(questions, rng) for _ in range(20)]
+    index, total = A.ScoringEngine.get_index()
+    results['scoring_build_index'] = measure(lambda: A.ScoringEngine.build_index(snapshot), repeat)
+    results['scoring_submission'] = measure(
+        lambda: [A.ScoringEngine.score(answers, index, total) for answers in submissions], repeat
+    )
+    results['scoring_submission']['calls_per_run'] = len(submissions)
+
+    def fresh_questions():
+        return [A.Question(q.id, q.type, q.question, q.options, q.correct_answer, q.category) for q in snapshot]
+
+    results['serialize_questions_cold'] = measure(lambda: A.questions_to_json(fresh_questions()), repeat)
+    results['serialize_questions_warm'] = measure(lambda: A.questions_to_json(snapshot), repeat)
+    body = A.questions_to_json(snapshot)
+    # brotli بأعلى جودة بطيء عمداً (مرة واحدة لكل إصدار)؛ تكرارات أقل
+    results['compress_questions_payload'] = measure(
+        lambda: A.CompressedPayload(body, 'application/json'), min(repeat, 3)
+    )
+    results['serialize_questions_warm']['bytes'] = len(body)
+    return results
+
+
+# ==================== التقارير ====================
+
+def git_commit():
+    """معرف commit الحالي (أو None خارج git)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    """طباعة جدول مختصر"""
+    if results.get('load'):
+        print(f"\n{'endpoint':<18}{'req':>7}{'err':>5}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+        for name, row in results['load'].items():
+            latency = row['latency_ms']
+            print(f"{name:<18}{row['requests']:>7}{row['errors']:>5}{row['throughput_rps']:>10.1f}"
+                  f"{latency['p50']:>9.2f}{latency['p95']:>9.2f}{latency['p99']:>9.2f}")
+    if results.get('micro'):
+        print(f"\n{'micro-benchmark':<30}{'best':>10}{'p50':>10}{'p95':>10}  (ms/call)")
+        for name, row in results['micro'].items():
+            print(f"{name:<30}{row['best']:>10.4f}{row['p50']:>10.4f}{row['p95']:>10.4f}")
+
+
+def run(args):
+    """تنفيذ أمر run"""
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"❌ Unknown scenario(s): {', '.join(unknown)}")
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or f"in-process:{args.backend}",
+            'questions': args.questions,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'persist_submissions': args.persist,
+            'seed': args.seed_value
+        },
+        'load': {},
+        'micro': {}
+    }
+
+    server = None
+    with tempfile.TemporaryDirectory(prefix='quiz-bench-') as workdir:
+        if args.url:
+            base_url = args.url.rstrip('/')
+            questions = fetch_questions(base_url)
+            results['meta']['questions'] = len(questions)
+            quiz_app = None
+        else:
+            questions = prepare_environment(args, workdir)
+            quiz_app = import_app(args, questions)
+            server, base_url = start_server(quiz_app.app)
+
+        try:
+            if not args.micro_only:
+                admin_cookie = None
+                if any(name.startswith('admin') for name in scenarios):
+                    admin_cookie = admin_login(base_url, args.admin_password)
+                for name in scenarios:
+                    scenario = Scenario(name, questions, admin_cookie, args.seed_value)
+                    print(f"⏱️ {name} ...")
+                    results['load'].update(
+                        run_scenario(scenario, base_url, args.requests, args.concurrency, args.warmup)
+                    )
+            if quiz_app is not None and not args.load_only:
+                print("⏱️ micro-benchmarks ...")
+                results['micro'] = run_micro(quiz_app, questions, args.repeat, args.seed_value)
+        finally:
+            if server is not None:
+                server.shutdown()
+            if quiz_app is not None:
+                quiz_app.SubmissionWriter.stop()
+
+    print_results(results)
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['commit'] or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results written to {output}")
+
+
+def compare(args):
+    """
+    مقارنة ملفي نتائج: p50/p95/p99 وعدد الطلبات في الثانية للحمل، و p50 للقياسات الدقيقة
+
+    رمز الخروج 1 إذا تراجع أي مقياس بأكثر من --threshold بالمئة.
+    """
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    rows = []
+    for name, new in candidate.get('load', {}).items():
+        old = baseline.get('load', {}).get(name)
+        if not old:
+            continue
+        for metric in ('p50', 'p95', 'p99'):
+            rows.append((f"{name} {metric}", old['latency_ms'][metric], new['latency_ms'][metric], False))
+        rows.append((f"{name} rps", old['throughput_rps'], new['throughput_rps'], True))
+    for name, new in candidate.get('micro', {}).items():
+        old = baseline.get('micro', {}).get(name)
+        if old:
+            rows.append((f"{name} p50", old['p50'], new['p50'], False))
+
+    print(f"{baseline['meta'].get('commit')} -> {candidate['meta'].get('commit')}")
+    print(f"{'metric':<40}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    regressions = 0
+    for label, old, new, higher_is_better in rows:
+        change = (new - old) / old * 100 if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  ❌'
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = '  ✅'
+        print(f"{label:<40}{old:>12.3f}{new:>12.3f}{change:>+9.1f}%{flag}")
+
+    if regressions:
+        print(f"\n❌ {regressions} metric(s) regressed by more than {args.threshold}%")
+        return 1
+    print(f"\n✅ No regressions above {args.threshold}%")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Love Quiz benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run load tests and micro-benchmarks')
+    run_parser.add_argument('--backend', choices=('memory', 'sqlite', 'postgres'), default='memory')
+    run_parser.add_argument('--url', help='benchmark an already running server instead (load tests only)')
+    run_parser.add_argument('--questions', type=int, default=1000, help='generated questions to seed')
+    run_parser.add_argument('--seed', action='store_true', help='replace Postgres questions with generated ones')
+    run_parser.add_argument('--seed-value', type=int, default=42, help='random seed for data and payloads')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=5, help='untimed requests per worker')
+    run_parser.add_argument('--scenarios', help=f"comma separated subset of: {', '.join(SCENARIOS)}")
+    run_parser.add_argument('--repeat', type=int, default=20, help='micro-benchmark repetitions')
+    run_parser.add_argument('--persist', action='store_true', help='keep PERSIST_SUBMISSIONS on during the run')
+    run_parser.add_argument('--admin-password', default=os.environ.get('ADMIN_PASSWORD', 'benchmark'))
+    run_parser.add_argument('--load-only', action='store_true')
+    run_parser.add_argument('--micro-only', action='store_true')
+    run_parser.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>-<commit>.json)')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0, help='regression threshold in percent')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,473 @@
+/**
+ * ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+ * تطبيق اختبار الحب - لوحة التحكم
+ * Romantic Love Quiz - Admin Panel
+ * ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+ */
+
+let questions = [];
+let questionStats = {};
+let editingId = null;
+let nextCursor = null;
+let totalQuestions = 0;
+let searchTimer = null;
+let selectedIds = new Set();
+
+// تحميل الأسئلة (صفحة بصفحة مع البحث والتصفية)
+async function loadQuestions(reset = true) {
+    try {
+        const params = new URLSearchParams();
+        const search = document.getElementById('searchInput').value.trim();
+        const category = document.getElementById('categoryFilter').value;
+        const type = document.getElementById('typeFilter').value;
+        if (search) params.set('q', search);
+        if (category) params.set('category', category);
+        if (type) params.set('type', type);
+        if (!reset && nextCursor) params.set('after', nextCursor);
+
+        const response = await fetch(`/api/admin/questions?${params}`);
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+
+        questions = reset ? data.questions : questions.concat(data.questions);
+        nextCursor = data.next_cursor;
+        if (reset) {
+            selectedIds.clear();
+            totalQuestions = data.total;
+            updateCategoryFilter(data.categories);
+            await loadQuestionStats();
+        }
+        document.getElementById('loadMoreBtn').style.display = nextCursor ? 'inline-block' : 'none';
+        renderQuestions();
+        updateBulkBar();
+        updateStats(data.categories);
+    } catch (error) {
+        console.error('خطأ في تحميل الأسئلة:', error);
+        Swal.fire({
+            icon: 'error',
+            title: 'خطأ',
+            text: 'فشل تحميل الأسئلة',
+            confirmButtonColor: '#ec4899'
+        });
+    }
+}
+
+// تحميل إحصائيات الأسئلة (الدقة وتوزيع الإجابات)
+async function loadQuestionStats() {
+    try {
+        const response = await fetch('/api/admin/stats');
+        const data = await response.json();
+        questionStats = {};
+        if (data.success) {
+            data.questions.forEach(s => { questionStats[s.id] = s; });
+        }
+    } catch (error) {
+        console.warn('تعذر تحميل الإحصائيات:', error);
+    }
+}
+
+// عرض الأسئلة
+function renderQuestions() {
+    const container = document.getElementById('questionsContainer');
+
+    if (questions.length === 0) {
+        container.innerHTML = `
+            <div class="text-center py-12">
+                <p class="text-gray-500 text-lg mb-4">لا توجد أسئلة حتى الآن</p>
+                <button onclick="openAddModal()" class="btn-primary text-white font-bold py-2 px-6 rounded-lg">
+                    ➕ أضف السؤال الأول
+                </button>
+            </div>
+        `;
+        return;
+    }
+
+    container.innerHTML = questions.map((q, index) => `
+        <div class="question-item rounded-lg p-6 fade-in">
+            <div class="flex flex-col sm:flex-row items-start justify-between gap-4">
+                <div class="flex-1">
+                    <div class="flex items-center gap-3 mb-3">
+                        <input type="checkbox" class="w-5 h-5 accent-pink-600" ${selectedIds.has(q.id) ? 'checked' : ''}
+                            onchange="toggleSelected(${q.id}, this.checked)">
+                        <span class="bg-pink-600 text-white rounded-full w-8 h-8 flex items-center justify-center font-bold text-sm">${index + 1}</span>
+                        <span class="bg-gray-200 text-gray-700 px-3 py-1 rounded-full text-xs font-semibold">${q.category}</span>
+                        ${questionStats[q.id] && questionStats[q.id].attempts ? `
+                            <span class="bg-green-100 text-green-700 px-3 py-1 rounded-full text-xs font-semibold">
+                                الدقة: ${questionStats[q.id].accuracy}% (${questionStats[q.id].attempts} محاولة)
+                            </span>
+                        ` : ''}
+                    </div>
+                    <p class="text-gray-800 font-semibold mb-4 text-lg">${q.question}</p>
+                    <ul class="space-y-2">
+                        ${q.options.map((opt, i) => `
+                            <li class="text-gray-700 ${i === q.correct_answer ? 'font-bold text-green-600' : ''}">
+                                ${i === q.correct_answer ? '✓' : '○'} ${opt}
+                                ${questionStats[q.id] && questionStats[q.id].distribution[i] ? `<span class="text-xs text-gray-500">(${questionStats[q.id].distribution[i]})</span>` : ''}
+                            </li>
+                        `).join('')}
+                    </ul>
+                </div>
+                <div class="flex gap-2 sm:flex-col w-full sm:w-auto">
+                    <button onclick="editQuestion(${q.id})" class="btn-edit text-white font-bold py-2 px-4 rounded-lg flex-1 sm:flex-none">
+                        ✏️ تعديل
+                    </button>
+                    <button onclick="deleteQuestion(${q.id})" class="btn-danger text-white font-bold py-2 px-4 rounded-lg flex-1 sm:flex-none">
+                        🗑️ حذف
+                    </button>
+                </div>
+            </div>
+        </div>
+    `).join('');
+}
+
+// تحديد سؤال للعمليات الجماعية
+function toggleSelected(id, checked) {
+    if (checked) {
+        selectedIds.add(id);
+    } else {
+        selectedIds.delete(id);
+    }
+    updateBulkBar();
+}
+
+// تحديد/إلغاء تحديد جميع الأسئلة المعروضة
+function toggleSelectAll(checked) {
+    selectedIds = new Set(checked ? questions.map(q => q.id) : []);
+    renderQuestions();
+    updateBulkBar();
+}
+
+// شريط العمليات الجماعية
+function updateBulkBar() {
+    document.getElementById('bulkBar').style.display = selectedIds.size ? 'flex' : 'none';
+    document.getElementById('selectedCount').textContent = selectedIds.size;
+    document.getElementById('selectAll').checked = questions.length > 0 && selectedIds.size === questions.length;
+}
+
+// العناصر المحددة مع إصداراتها (للتحقق من عدم تعديلها من جلسة أخرى)
+function selectedItems(fields = {}) {
+    return questions
+        .filter(q => selectedIds.has(q.id))
+        .map(q => ({ id: q.id, version: q.version, ...fields }));
+}
+
+// رسالة التعارض: السؤال تغيّر منذ تحميله
+function showConflict() {
+    Swal.fire({
+        icon: 'warning',
+        title: 'تعارض في التعديل',
+        text: 'تم تعديل سؤال أو حذفه من جلسة أخرى. سيتم تحديث القائمة، راجع التغييرات وحاول مجدداً.',
+        confirmButtonColor: '#ec4899'
+    });
+    loadQuestions();
+}
+
+// إرسال عملية جماعية في طلب واحد
+async function sendBatch(url, body, successText) {
+    try {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        if (response.status === 409) {
+            showConflict();
+            return;
+        }
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+        loadQuestions();
+        Swal.fire({
+            icon: 'success',
+            title: 'نجح!',
+            text: successText,
+            confirmButtonColor: '#ec4899'
+        });
+    } catch (error) {
+        console.error('خطأ:', error);
+        Swal.fire({
+            icon: 'error',
+            title: 'خطأ',
+            text: 'فشلت العملية الجماعية. يرجى المحاولة مرة أخرى.',
+            confirmButtonColor: '#ec4899'
+        });
+    }
+}
+
+// حذف الأسئلة المحددة
+async function bulkDelete() {
+    const confirmed = await Swal.fire({
+        title: `حذف ${selectedIds.size} سؤال؟`,
+        text: 'لا يمكن التراجع عن هذا الإجراء!',
+        icon: 'warning',
+        showCancelButton: true,
+        confirmButtonColor: '#f43f5e',
+        cancelButtonColor: '#ec4899',
+        confirmButtonText: '✓ نعم، احذفها',
+        cancelButtonText: 'إلغاء'
+    });
+    if (!confirmed.isConfirmed) return;
+    await sendBatch('/api/admin/questions/batch-delete', { items: selectedItems() }, 'تم حذف الأسئلة المحددة');
+}
+
+// نقل الأسئلة المحددة إلى فئة أخرى
+async function bulkSetCategory() {
+    const category = document.getElementById('bulkCategory').value.trim();
+    if (!category) {
+        Swal.fire({
+            icon: 'warning',
+            title: 'أدخل الفئة',
+            text: 'يرجى كتابة اسم الفئة الجديدة أولاً!',
+            confirmButtonColor: '#ec4899'
+        });
+        return;
+    }
+    await sendBatch('/api/admin/questions/batch-update', { items: selectedItems({ category }) }, 'تم تحديث فئة الأسئلة المحددة');
+}
+
+// تحديث قائمة الفئات في التصفية مع الحفاظ على الاختيار الحالي
+function updateCategoryFilter(categories) {
+    const select = document.getElementById('categoryFilter');
+    const current = select.value;
+    select.innerHTML = '<option value="">كل الفئات</option>';
+    (categories || []).forEach(c => {
+        const option = document.createElement('option');
+        option.value = c;
+        option.textContent = c;
+        select.appendChild(option);
+    });
+    select.value = current;
+}
+
+// تحديث الإحصائيات
+function updateStats(categories) {
+    document.getElementById('totalQuestions').textContent = totalQuestions;
+    if (categories) {
+        document.getElementById('totalCategories').textContent = categories.length;
+    }
+    document.getElementById('lastUpdated').textContent = new Date().toLocaleTimeString('ar-SA');
+}
+
+// فتح نموذج الإضافة
+function openAddModal() {
+    editingId = null;
+    document.getElementById('modalTitle').textContent = 'إضافة سؤال جديد';
+    document.getElementById('questionForm').reset();
+    document.getElementById('submitBtn').textContent = '💾 حفظ السؤال';
+    document.getElementById('questionModal').classList.add('active');
+    document.getElementById('questionText').focus();
+    resetQuestionType();
+}
+
+// تحديث نوع السؤال
+function updateQuestionType() {
+    const type = document.getElementById('questionType').value;
+    const option2Container = document.getElementById('option2Container');
+    const option3Container = document.getElementById('option3Container');
+    const ansOption2 = document.getElementById('ansOption2');
+    const ansOption3 = document.getElementById('ansOption3');
+    const option2 = document.getElementById('option2');
+    const option3 = document.getElementById('option3');
+
+    if (type === 'tf') {
+        // إخفاء الخيارات 3 و 4
+        option2Container.style.display = 'none';
+        option3Container.style.display = 'none';
+        ansOption2.style.display = 'none';
+        ansOption3.style.display = 'none';
+
+        // تعيين الخيارات تلقائياً
+        document.getElementById('option0').value = 'صح';
+        document.getElementById('option1').value = 'خطأ';
+        option2.removeAttribute('required');
+        option3.removeAttribute('required');
+    } else if (type === 'mcq') {
+        // إظهار جميع الخيارات
+        option2Container.style.display = 'block';
+        option3Container.style.display = 'block';
+        ansOption2.style.display = 'block';
+        ansOption3.style.display = 'block';
+        option2.setAttribute('required', 'required');
+        option3.setAttribute('required', 'required');
+
+        // مسح القيم التلقائية
+        document.getElementById('option0').value = '';
+        document.getElementById('option1').value = '';
+    }
+}
+
+// إعادة تعيين نوع السؤال
+function resetQuestionType() {
+    document.getElementById('questionType').value = '';
+    document.getElementById('option2Container').style.display = 'block';
+    document.getElementById('option3Container').style.display = 'block';
+    document.getElementById('ansOption2').style.display = 'block';
+    document.getElementById('ansOption3').style.display = 'block';
+    document.getElementById('option2').setAttribute('required', 'required');
+    document.getElementById('option3').setAttribute('required', 'required');
+}
+
+// تحرير سؤال
+function editQuestion(id) {
+    const question = questions.find(q => q.id === id);
+    if (!question) return;
+
+    editingId = id;
+    document.getElementById('modalTitle').textContent = 'تعديل السؤال';
+    document.getElementById('questionType').value = question.type || 'mcq';
+    updateQuestionType();
+    document.getElementById('questionText').value = question.question;
+    document.getElementById('option0').value = question.options[0];
+    document.getElementById('option1').value = question.options[1];
+    if (question.options[2]) document.getElementById('option2').value = question.options[2];
+    if (question.options[3]) document.getElementById('option3').value = question.options[3];
+    document.getElementById('correctAnswer').value = question.correct_answer;
+    document.getElementById('category').value = question.category;
+    document.getElementById('submitBtn').textContent = '💾 تحديث السؤال';
+    document.getElementById('questionModal').classList.add('active');
+}
+
+// إغلاق النموذج
+function closeModal() {
+    document.getElementById('questionModal').classList.remove('active');
+    editingId = null;
+}
+
+// معالجة إرسال النموذج
+async function handleFormSubmit(event) {
+    event.preventDefault();
+
+    const type = document.getElementById('questionType').value;
+    if (!type) {
+        Swal.fire({
+            icon: 'warning',
+            title: 'اختر نوع السؤال',
+            text: 'يرجى اختيار نوع السؤال أولاً!',
+            confirmButtonColor: '#ec4899'
+        });
+        return;
+    }
+
+    const options = type === 'tf'
+        ? [document.getElementById('option0').value, document.getElementById('option1').value]
+        : [
+            document.getElementById('option0').value,
+            document.getElementById('option1').value,
+            document.getElementById('option2').value,
+            document.getElementById('option3').value
+        ];
+
+    const data = {
+        type: type,
+        question: document.getElementById('questionText').value,
+        options: options,
+        correct_answer: parseInt(document.getElementById('correctAnswer').value),
+        category: document.getElementById('category').value
+    };
+
+    try {
+        let response;
+        if (editingId) {
+            // الإصدار المحمّل: الخادم يرفض التحديث (409) إذا عُدّل السؤال بعده
+            const current = questions.find(q => q.id === editingId);
+            if (current) data.version = current.version;
+            response = await fetch(`/api/admin/update-question/${editingId}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(data)
+            });
+        } else {
+            response = await fetch('/api/admin/add-question', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(data)
+            });
+        }
+
+        if (response.status === 409) {
+            closeModal();
+            showConflict();
+        } else if (response.ok) {
+            const successText = editingId ? 'تم تحديث السؤال بنجاح' : 'تم إضافة السؤال بنجاح';
+            closeModal();
+            loadQuestions();
+            Swal.fire({
+                icon: 'success',
+                title: 'نجح!',
+                text: successText,
+                confirmButtonColor: '#ec4899'
+            });
+        } else {
+            throw new Error('فشل الحفظ');
+        }
+    } catch (error) {
+        console.error('خطأ:', error);
+        Swal.fire({
+            icon: 'error',
+            title: 'خطأ',
+            text: 'فشل حفظ السؤال. يرجى المحاولة مرة أخرى.',
+            confirmButtonColor: '#ec4899'
+        });
+    }
+}
+
+// حذف سؤال
+async function deleteQuestion(id) {
+    const confirmed = await Swal.fire({
+        title: 'هل أنت متأكد؟',
+        text: 'لا يمكن التراجع عن هذا الإجراء!',
+        icon: 'warning',
+        showCancelButton: true,
+        confirmButtonColor: '#f43f5e',
+        cancelButtonColor: '#ec4899',
+        confirmButtonText: '✓ نعم، احذفه',
+        cancelButtonText: 'إلغاء'
+    });
+
+    if (!confirmed.isConfirmed) return;
+
+    try {
+        const question = questions.find(q => q.id === id);
+        const query = question ? `?version=${question.version}` : '';
+        const response = await fetch(`/api/admin/delete-question/${id}${query}`, { method: 'DELETE' });
+        if (response.status === 409) {
+            showConflict();
+        } else if (response.ok) {
+            loadQuestions();
+            Swal.fire({
+                icon: 'success',
+                title: 'تم الحذف!',
+                text: 'تم حذف السؤال بنجاح',
+                confirmButtonColor: '#ec4899'
+            });
+        } else {
+            throw new Error('فشل الحذف');
+        }
+    } catch (error) {
+        console.error('خطأ:', error);
+        Swal.fire({
+            icon: 'error',
+            title: 'خطأ',
+            text: 'فشل حذف السؤال. يرجى المحاولة مرة أخرى.',
+            confirmButtonColor: '#ec4899'
+        });
+    }
+}
+
+// إغلاق النموذج عند النقر على الخلفية
+document.getElementById('questionModal').addEventListener('click', function (event) {
+    if (event.target === this) {
+        closeModal();
+    }
+});
+
+// البحث والتصفية
+document.getElementById('searchInput').addEventListener('input', function () {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => loadQuestions(), 300);
+});
+document.getElementById('categoryFilter').addEventListener('change', () => loadQuestions());
+document.getElementById('typeFilter').addEventListener('change', () => loadQuestions());
+
+// تحميل الأسئلة عند فتح الصفحة
+window.addEventListener('DOMContentLoaded', () => loadQuestions());
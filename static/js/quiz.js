@@ -12,7 +12,8 @@
 const QuizConfig = {
     API_ENDPOINTS: {
         SUBMIT: '/api/submit',
-        QUESTIONS: '/api/questions'
+        QUESTIONS: '/api/questions',
+        QUIZ: '/api/quiz'
     },
     ELEMENTS: {
         QUIZ_CONTAINER: '#quizContainer',
@@ -41,6 +42,8 @@ let quizState = {
     currentQuestionIndex: 0,
     questions: [],
     answers: {},
+    quizToken: null,
+    submissionKey: null,
     score: 0,
     isSubmitting: false
 };
@@ -145,6 +148,12 @@ function showConfetti() {
  * @returns {Promise<Array>} قائمة الأسئلة
  */
 async function fetchQuestions() {
+    if (window.snapshotBase) {
+        const questions = await fetchSnapshotQuestions(window.snapshotBase);
+        if (questions) {
+            return questions;
+        }
+    }
     try {
         const response = await fetch(QuizConfig.API_ENDPOINTS.QUESTIONS);
 
@@ -166,6 +175,57 @@ async function fetchQuestions() {
     }
 }
 
+/**
+ * تحميل الأسئلة من اللقطة الثابتة المنشورة (بدون المرور بالسيرفر)
+ * Load questions from the published static snapshot
+ * 
+ * @param {string} base - رابط مجلد اللقطات
+ * @returns {Promise<Array|null>} الأسئلة، أو null للرجوع إلى API
+ */
+async function fetchSnapshotQuestions(base) {
+    try {
+        // المؤشر يتغير مع كل نشر؛ ملفات الإصدار نفسها لا تتغير
+        const pointer = await fetch(`${base}/current.json`, { cache: 'no-cache' });
+        if (!pointer.ok) {
+            return null;
+        }
+        const { questions: path } = await pointer.json();
+        const response = await fetch(`${base}/${path}`);
+        if (!response.ok) {
+            return null;
+        }
+        const questions = await response.json();
+        return Array.isArray(questions) && questions.length > 0 ? questions : null;
+    } catch (error) {
+        console.warn('تعذر تحميل اللقطة الثابتة، جاري التحميل من API...', error);
+        return null;
+    }
+}
+
+/**
+ * تحميل اختبار قصير عشوائي مع رمز موقّع
+ * Load a randomized quiz with its signed token
+ * 
+ * @param {number} size - عدد الأسئلة
+ * @returns {Promise<Array>} قائمة الأسئلة
+ */
+async function fetchQuiz(size) {
+    try {
+        const response = await fetch(`${QuizConfig.API_ENDPOINTS.QUIZ}?size=${encodeURIComponent(size)}`);
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const data = await response.json();
+        quizState.quizToken = data.quiz_token || null;
+        return Array.isArray(data.questions) ? data.questions : [];
+    } catch (error) {
+        showError(`فشل تحميل الأسئلة: ${error.message}`);
+        return [];
+    }
+}
+
 /**
  * عرض سؤال معين
  * Display a specific question
@@ -386,14 +446,23 @@ async function submitQuiz() {
 
     quizState.isSubmitting = true;
 
+    // مفتاح ثابت لهذه المحاولة: إعادة الإرسال بعد خطأ شبكة لا تُحسب مرتين
+    if (!quizState.submissionKey) {
+        quizState.submissionKey = (window.crypto && crypto.randomUUID)
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
     try {
         const response = await fetch(QuizConfig.API_ENDPOINTS.SUBMIT, {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Idempotency-Key': quizState.submissionKey
             },
             body: JSON.stringify({
-                answers: quizState.answers
+                answers: quizState.answers,
+                quiz_token: quizState.quizToken
             })
         });
 
@@ -457,6 +526,12 @@ function displayResults(result) {
         emoji = '😢';
     }
 
+    // الترتيب بين اللاعبين (null قبل اكتمال بذر الترتيب على الخادم)
+    let rankingLine = '';
+    if (result.percentile !== null && result.percentile !== undefined) {
+        rankingLine = `<p class="text-gray-700 mt-3">نتيجتك أعلى من ${result.percentile}% من اللاعبين (المركز ${result.rank} من ${result.players})</p>`;
+    }
+
     // عرض النتائج
     resultsContainer.innerHTML = `
         <div class="text-center py-8">
@@ -471,6 +546,7 @@ function displayResults(result) {
                     ${result.score} / ${result.total}
                 </div>
                 <p class="text-2xl font-semibold text-pink-500">${percentage.toFixed(1)}%</p>
+                ${rankingLine}
             </div>
             
             <p class="text-lg text-gray-600 mb-8 italic">"${getRandomLoveMessage()}"</p>
@@ -511,6 +587,8 @@ function restartQuiz() {
         currentQuestionIndex: 0,
         questions: quizState.questions,  // الحفاظ على قائمة الأسئلة
         answers: {},
+        quizToken: quizState.quizToken,  // نفس الأسئلة = نفس الرمز
+        submissionKey: null,             // محاولة جديدة = مفتاح جديد
         score: 0,
         isSubmitting: false
     };
@@ -599,8 +677,11 @@ async function initializeQuiz() {
         console.log('بدء التهيئة...', window.preloadedQuestions);
         let questions = [];
 
-        // محاولة استخدام الأسئلة المُحمّلة مسبقاً
-        if (window.preloadedQuestions && Array.isArray(window.preloadedQuestions)) {
+        // اختبار قصير عشوائي إذا كان مفعّلاً من السيرفر
+        if (window.quizSize > 0) {
+            questions = await fetchQuiz(window.quizSize);
+        } else if (window.preloadedQuestions && Array.isArray(window.preloadedQuestions)) {
+            // محاولة استخدام الأسئلة المُحمّلة مسبقاً
             // التحقق من صحة البيانات
             if (validateQuestionsData(window.preloadedQuestions)) {
                 questions = window.preloadedQuestions;
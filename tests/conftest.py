@@ -0,0 +1,46 @@
+"""
+إعداد بيئة الاختبارات
+Test environment setup
+
+Config يقرأ متغيرات البيئة عند استيراد app، لذلك تُضبط هنا قبل أي استيراد:
+محرك memory بدون قاعدة بيانات، وبدون تحديد معدل أو منع تكرار أو طبقة مشتركة.
+
+Postgres اختياري: TEST_DATABASE_URL (قاعدة مخصصة للاختبارات - جدول الأسئلة يُفرّغ!)
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TMP_DIR = tempfile.mkdtemp(prefix='quiz-tests-')
+
+os.environ.update({
+    'STORAGE_BACKEND': 'memory',
+    'SECRET_KEY': 'test-secret-key',
+    'SQLITE_PATH': os.path.join(TMP_DIR, 'quiz.db'),
+    'RANKING_SNAPSHOT_PATH': os.path.join(TMP_DIR, 'ranking.json'),
+    'RATE_LIMITS': '',
+    'SUBMIT_DEDUP_WINDOW': '0',
+    'CACHE_REDIS_URL': '',
+    'SNAPSHOT_DIR': ''
+})
+if os.environ.get('TEST_DATABASE_URL'):
+    os.environ['DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+else:
+    os.environ.pop('DATABASE_URL', None)
+
+import pytest  # noqa: E402
+
+import app as quiz_app  # noqa: E402
+
+
+@pytest.fixture
+def config(monkeypatch):
+    """تعديل قيم Config لاختبار واحد (تُستعاد بعده)"""
+    def set_values(**values):
+        for name, value in values.items():
+            monkeypatch.setattr(quiz_app.Config, name, value)
+    return set_values
@@ -0,0 +1,195 @@
+"""اختبارات asgi.py: المسارات غير المتزامنة وتمرير الباقي لـ Flask ومحرك asyncpg"""
+
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from app import Database, PostgresBackend, QuestionCache, app as flask_app
+
+asgi = pytest.importorskip('asgi')
+
+
+def call(application, method, path, body=b'', query=b'', headers=()):
+    """طلب ASGI واحد؛ يُرجع (status, headers, body)"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query, 'root_path': '',
+        'headers': ([(b'content-type', b'application/json')] if body else []) + list(headers),
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80), 'scheme': 'http', 'http_version': '1.1'
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # العميل متصل حتى نهاية الاستجابة
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    headers = {key.decode('latin-1'): value.decode('latin-1') for key, value in sent[0]['headers']}
+    return sent[0]['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+@pytest.fixture
+def application(monkeypatch):
+    # setup() يفعّل external_refresh؛ monkeypatch يعيده بعد الاختبار
+    monkeypatch.setattr(QuestionCache, 'external_refresh', False)
+    return asgi.QuizASGI(flask_app.wsgi_app)
+
+
+@pytest.fixture
+def edited_question():
+    """تعديل نص أول سؤال مباشرة في المحرك ثم إعادته"""
+    backend = Database.backend()
+    original = backend.fetch_questions()[0]
+    yield original.id
+    backend.update_question(original.id, (None, original.question, None, None, None))
+    QuestionCache.invalidate(publish=False)
+
+
+def test_native_questions_route(application):
+    status, headers, body = call(application, 'GET', '/api/questions')
+    assert status == 200
+    assert headers['content-type'].startswith('application/json')
+    assert len(json.loads(body)) == len(Database.backend().fetch_questions())
+
+
+def admin_cookie():
+    """ملف تعريف ارتباط جلسة Flask لمسؤول مسجل الدخول"""
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    value = serializer.dumps({'admin_authenticated': True})
+    return [(b'cookie', f"{flask_app.config['SESSION_COOKIE_NAME']}={value}".encode('latin-1'))]
+
+
+def test_native_submit(application):
+    answers = {str(q.id): q.correct_answer for q in Database.backend().fetch_questions()[:2]}
+    status, _, body = call(application, 'POST', '/api/submit', json.dumps({'answers': answers}).encode('utf-8'))
+    assert status == 200
+    result = json.loads(body)
+    assert result['score'] == 2
+    assert result['total'] == len(Database.backend().fetch_questions())
+    assert call(application, 'POST', '/api/submit', b'[1')[0] == 400
+
+
+def test_native_admin_crud(application):
+    new = json.dumps({'type': 'mcq', 'question': 'سؤال من ASGI', 'options': ['أ', 'ب'], 'correct_answer': 1})
+    assert call(application, 'POST', '/api/admin/add-question', new.encode('utf-8'))[0] == 302
+
+    status, _, body = call(application, 'POST', '/api/admin/add-question', new.encode('utf-8'), headers=admin_cookie())
+    assert status == 201
+    question = json.loads(body)['question']
+    assert question['correct_answer'] == '1'
+    _, _, body = call(application, 'GET', '/api/questions')
+    assert 'سؤال من ASGI' in body.decode('utf-8')
+
+    edit = json.dumps({'question': 'سؤال معدل من ASGI', 'version': question['version']}).encode('utf-8')
+    path = f"/api/admin/update-question/{question['id']}"
+    status, _, body = call(application, 'PUT', path, edit, headers=admin_cookie())
+    assert status == 200
+    assert json.loads(body)['question']['version'] == question['version'] + 1
+    # نفس الإصدار القديم مرة أخرى: تعارض
+    status, _, body = call(application, 'PUT', path, edit, headers=admin_cookie())
+    assert status == 409
+
+    path = f"/api/admin/delete-question/{question['id']}"
+    assert call(application, 'DELETE', path, headers=admin_cookie())[0] == 200
+    assert call(application, 'DELETE', path, headers=admin_cookie())[0] == 404
+
+
+def test_flask_fallback_sees_writes(application, edited_question):
+    assert call(application, 'GET', '/api/questions')[0] == 200
+    Database.backend().update_question(edited_question, (None, 'سؤال بعد الكتابة', None, None, None))
+    QuestionCache.invalidate(publish=False)
+    # /api/quiz ليس من مسارات asgi.py فيمر عبر Flask في خيط
+    status, _, body = call(application, 'GET', '/api/quiz', query=b'size=100')
+    assert status == 200
+    assert 'سؤال بعد الكتابة' in body.decode('utf-8')
+
+
+def test_stale_snapshot_reloaded_under_external_refresh(application, edited_question):
+    call(application, 'GET', '/api/questions')
+    assert QuestionCache.external_refresh
+    Database.backend().update_question(edited_question, (None, 'سؤال من خيط Flask', None, None, None))
+    QuestionCache.invalidate(publish=False)
+    _, snapshot = QuestionCache.get()
+    assert any(q.question == 'سؤال من خيط Flask' for q in snapshot)
+
+
+def test_fallback_stream_stops_when_client_disconnects(monkeypatch):
+    monkeypatch.setattr(QuestionCache, 'external_refresh', False)
+    produced = []
+    closed = threading.Event()
+
+    def wsgi_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+
+        def body():
+            try:
+                for i in range(10000):
+                    produced.append(i)
+                    yield b'x' * 100
+            finally:
+                closed.set()
+        return body()
+
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': '/export', 'query_string': b'', 'root_path': '', 'headers': [],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80), 'scheme': 'http', 'http_version': '1.1'
+    }
+
+    async def run():
+        disconnected = asyncio.Event()
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        bodies = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                bodies.append(message)
+                # العميل ينقطع بعد أول جزء
+                disconnected.set()
+
+        await asgi.QuizASGI(wsgi_app)(scope, receive, send)
+        return bodies
+
+    bodies = asyncio.run(run())
+    # الخيط أغلق المكرر ولم يبقَ معلقاً على طابور لا يُفرّغ
+    assert closed.wait(5)
+    assert len(produced) < 10000
+    assert len(bodies) < 100
+
+
+def test_insert_params_store_answer_as_text():
+    params = PostgresBackend.insert_params(('mcq', 'سؤال', ['أ', 'ب'], 1, 'مشاعر'))
+    assert params == ('mcq', 'سؤال', '["أ", "ب"]', '1', 'مشاعر')
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URL') or asgi.asyncpg is None,
+                    reason='TEST_DATABASE_URL and asyncpg are required')
+def test_async_postgres_accepts_numeric_answer():
+    # لوحة التحكم ترسل رقم الخيار الصحيح كرقم JSON
+    PostgresBackend().ensure_schema()
+
+    async def run():
+        backend = asgi.AsyncPostgresBackend()
+        try:
+            question = await backend.insert_question(('mcq', 'سؤال', ['أ', 'ب'], 1, 'مشاعر'))
+            assert question.correct_answer == '1'
+            updated = await backend.update_question(question.id, (None, None, None, 0, None), question.version)
+            assert (updated.correct_answer, updated.version) == ('0', question.version + 1)
+            assert await backend.delete_question(question.id, updated.version) is True
+        finally:
+            await backend.close()
+
+    asyncio.run(run())
@@ -0,0 +1,106 @@
+"""اختبارات StaticAssets: البصمات، ناتج build-assets، وروابط /assets/ و url_for('static')"""
+
+import gzip
+
+import pytest
+from flask import url_for
+
+import app as quiz_app
+from app import StaticAssets
+
+SOURCES = {
+    'css/site.css': 'body {\n    color: red;\n}\n'.encode('utf-8'),
+    'js/site.js': 'function hello() {\n    return "مرحبا";\n}\n'.encode('utf-8')
+}
+
+
+@pytest.fixture
+def assets(monkeypatch, config, tmp_path):
+    """StaticAssets فارغ يُبنى من جديد، مع مجلد بناء مؤقت"""
+    config(ASSETS_FINGERPRINT=True, ASSETS_BUILD_DIR=str(tmp_path / 'dist'))
+    monkeypatch.setattr(StaticAssets, '_manifest', None)
+    monkeypatch.setattr(StaticAssets, '_files', {})
+    return StaticAssets
+
+
+@pytest.fixture
+def sources(assets, monkeypatch, config, tmp_path):
+    """مصادر مؤقتة، ومجلد البناء داخلها كما في static/dist"""
+    source_dir = tmp_path / 'static'
+    config(ASSETS_BUILD_DIR=str(source_dir / 'dist'))
+    for name, body in SOURCES.items():
+        path = source_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+    (source_dir / 'img.png').write_bytes(b'\x89PNG')
+    monkeypatch.setattr(StaticAssets, 'SOURCE_DIR', str(source_dir))
+    return source_dir
+
+
+def test_fingerprint_follows_content():
+    name = StaticAssets.fingerprint('js/quiz.js', b'a')
+    assert name.startswith('js/quiz.') and name.endswith('.js')
+    assert name == StaticAssets.fingerprint('js/quiz.js', b'a')
+    assert name != StaticAssets.fingerprint('js/quiz.js', b'b')
+
+
+def test_build_fingerprints_and_compresses(sources):
+    assert StaticAssets.sources() == SOURCES
+    manifest, files = StaticAssets.build(StaticAssets.sources())
+    assert set(manifest) == set(SOURCES)
+    payload = files[manifest['js/site.js']]
+    assert payload.mimetype == 'application/javascript'
+    assert gzip.decompress(payload.gzip) == payload.body
+    assert 'مرحبا'.encode('utf-8') in payload.body
+
+
+def test_built_assets_loaded_until_sources_change(sources):
+    manifest = StaticAssets.write()
+    assert StaticAssets.load_built(StaticAssets.sources())[0] == manifest
+    # مجلد البناء داخل المصادر لا يُعامل كمصدر
+    assert StaticAssets.sources() == SOURCES
+
+    (sources / 'css' / 'site.css').write_bytes(b'body { color: blue; }')
+    assert StaticAssets.load_built(StaticAssets.sources()) is None
+    (sources / 'css' / 'site.css').unlink()
+    assert StaticAssets.load_built(StaticAssets.sources()) is None
+
+
+def test_asset_url_served_immutable(assets):
+    client = quiz_app.app.test_client()
+    with quiz_app.app.test_request_context():
+        url = StaticAssets.url('js/quiz.js')
+        assert StaticAssets.url('img/missing.png') == '/static/img/missing.png'
+    assert url.startswith('/assets/js/quiz.') and url != '/assets/js/quiz.js'
+    assert url in client.get('/').get_data(as_text=True)
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == f'public, max-age={quiz_app.Config.ASSETS_MAX_AGE}, immutable'
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # بصمة قديمة لا تخدم المحتوى الحالي تحت رابط immutable
+    assert client.get('/assets/js/quiz.0000000000.js').status_code == 404
+
+
+def test_url_for_static_uses_fingerprint(assets, config):
+    client = quiz_app.app.test_client()
+    with quiz_app.app.test_request_context():
+        url = url_for('static', filename='js/quiz.js')
+        plain = url_for('static', filename='img/missing.png')
+    assert url == '/static/' + StaticAssets.manifest()['js/quiz.js']
+    assert plain == '/static/img/missing.png'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.data == StaticAssets.get(StaticAssets.manifest()['js/quiz.js']).body
+    # الملف الأصلي ما زال يُخدم كما هو
+    response = client.get('/static/js/quiz.js')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+    response.close()
+
+    config(ASSETS_FINGERPRINT=False)
+    with quiz_app.app.test_request_context():
+        assert url_for('static', filename='js/quiz.js') == '/static/js/quiz.js'
+        assert StaticAssets.url('js/quiz.js') == '/static/js/quiz.js'
@@ -0,0 +1,146 @@
+"""
+اختبارات CRUD والتزامن المتفائل (version) على محركات التخزين الثلاثة
+
+Postgres يعمل فقط مع TEST_DATABASE_URL (انظر conftest.py).
+"""
+
+import os
+
+import pytest
+
+from app import MemoryBackend, PostgresBackend, SQLiteBackend, VersionConflictError
+
+FIELDS = ('mcq', 'ما هو أساس الحب؟', ['الثقة', 'المال'], '0', 'مشاعر')
+KEEP = (None, None, None, None, None)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'postgres'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        backend = MemoryBackend()
+    elif request.param == 'sqlite':
+        backend = SQLiteBackend(str(tmp_path / 'quiz.db'))
+    else:
+        if not os.environ.get('TEST_DATABASE_URL'):
+            pytest.skip('TEST_DATABASE_URL is not set')
+        backend = PostgresBackend()
+    backend.ensure_schema()
+    backend.import_rows([], 'append', replace=True)
+    return backend
+
+
+def edited(question_text):
+    return (None, question_text, None, None, None)
+
+
+def test_insert_and_get(backend):
+    question = backend.insert_question(FIELDS)
+    assert question.version == 1
+    assert backend.get_question(question.id) == question
+    assert backend.fetch_questions() == [question]
+    assert backend.get_question(question.id + 1000) is None
+
+
+def test_numeric_answer_stored_as_text(backend):
+    # لوحة التحكم ترسل رقم الخيار الصحيح كرقم JSON
+    question = backend.insert_question(FIELDS[:3] + (1,) + FIELDS[4:])
+    assert question.correct_answer == '1'
+    assert backend.update_question(question.id, (None, None, None, 0, None)).correct_answer == '0'
+    assert backend.get_question(question.id).correct_answer == '0'
+
+
+def test_update_bumps_version_and_keeps_missing_fields(backend):
+    question = backend.insert_question(FIELDS)
+    updated = backend.update_question(question.id, edited('سؤال معدل'), expected_version=1)
+    assert updated.version == 2
+    assert updated.question == 'سؤال معدل'
+    assert updated.options == question.options
+    assert updated.category == question.category
+    # بدون expected_version: كتابة غير مشروطة
+    assert backend.update_question(question.id, KEEP).version == 3
+
+
+def test_update_with_stale_version_conflicts(backend):
+    question = backend.insert_question(FIELDS)
+    backend.update_question(question.id, edited('أول تعديل'), expected_version=1)
+    with pytest.raises(VersionConflictError) as error:
+        backend.update_question(question.id, edited('تعديل متأخر'), expected_version=1)
+    assert error.value.conflicts == {question.id: 2}
+    current = backend.get_question(question.id)
+    assert (current.question, current.version) == ('أول تعديل', 2)
+
+
+def test_update_missing_returns_none(backend):
+    assert backend.update_question(12345, edited('لا يوجد'), expected_version=1) is None
+
+
+def test_delete_with_versions(backend):
+    question = backend.insert_question(FIELDS)
+    backend.update_question(question.id, edited('تعديل'))
+    with pytest.raises(VersionConflictError) as error:
+        backend.delete_question(question.id, expected_version=1)
+    assert error.value.conflicts == {question.id: 2}
+    assert backend.get_question(question.id) is not None
+    assert backend.delete_question(question.id, expected_version=2) is True
+    assert backend.get_question(question.id) is None
+    assert backend.delete_question(question.id) is False
+
+
+def test_batch_update_is_all_or_nothing(backend):
+    first = backend.insert_question(FIELDS)
+    second = backend.insert_question(FIELDS)
+    backend.update_question(second.id, edited('تعديل'))
+    with pytest.raises(VersionConflictError) as error:
+        backend.update_questions([
+            (first.id, edited('دفعة'), 1),
+            (second.id, edited('دفعة'), 1)
+        ])
+    assert error.value.conflicts == {second.id: 2}
+    assert backend.get_question(first.id).version == 1
+
+    updated = backend.update_questions([
+        (second.id, edited('دفعة'), 2),
+        (first.id, edited('دفعة'), 1)
+    ])
+    assert [(q.id, q.version, q.question) for q in updated] == [
+        (second.id, 3, 'دفعة'), (first.id, 2, 'دفعة')
+    ]
+
+
+def test_batch_update_missing_question_conflicts(backend):
+    question = backend.insert_question(FIELDS)
+    with pytest.raises(VersionConflictError) as error:
+        backend.update_questions([(question.id, edited('دفعة'), 1), (question.id + 1000, edited('دفعة'), None)])
+    assert error.value.conflicts == {question.id + 1000: None}
+    assert backend.get_question(question.id).version == 1
+
+
+def test_batch_delete(backend):
+    first = backend.insert_question(FIELDS)
+    second = backend.insert_question(FIELDS)
+    backend.update_question(second.id, edited('تعديل'))
+    with pytest.raises(VersionConflictError) as error:
+        backend.delete_questions([(first.id, 1), (second.id, 1)])
+    assert error.value.conflicts == {second.id: 2}
+    assert len(backend.fetch_questions()) == 2
+    # المعرفات غير الموجودة تُتجاهل
+    deleted = backend.delete_questions([(first.id, 1), (second.id, 2), (second.id + 1000, None)])
+    assert sorted(deleted) == [first.id, second.id]
+    assert backend.fetch_questions() == []
+
+
+def test_version_token_changes_on_write(backend):
+    before = backend.version_token()
+    question = backend.insert_question(FIELDS)
+    after_insert = backend.version_token()
+    assert after_insert != before
+    backend.update_question(question.id, edited('تعديل'))
+    after_update = backend.version_token()
+    assert after_update != after_insert
+    backend.delete_question(question.id)
+    after_delete = backend.version_token()
+    assert after_delete != after_update
+    backend.insert_question(FIELDS)
+    after_reinsert = backend.version_token()
+    backend.import_rows([], 'append', replace=True)
+    assert backend.version_token() != after_reinsert
@@ -0,0 +1,134 @@
+"""اختبارات الاستيراد والتصدير الجماعي: قراءة JSON التدريجية، الكل أو لا شيء، والتصدير كتيار"""
+
+import io
+import json
+import os
+
+import pytest
+
+import app as quiz_app
+from app import (
+    Database, ImportValidationError, MemoryBackend, PostgresBackend, QuestionCache, SQLiteBackend,
+    import_questions, iter_json_records
+)
+
+RECORDS = [
+    {'type': 'mcq', 'question': 'ما هو أساس الحب؟', 'options': ['الثقة', 'المال'], 'correct_answer': 0,
+     'category': 'مشاعر'},
+    {'type': 'tf', 'question': 'الحب يكفي وحده؟', 'options': ['صح', 'خطأ'], 'correct_answer': 'خطأ'},
+    {'type': 'mcq', 'question': 'سؤال "بعلامات" \\ وأرقام 12345', 'options': ['1', '2', '3'],
+     'correct_answer': '2', 'category': 'مستقبل'}
+]
+
+
+def records(data, chunk_size):
+    return [record for _, record in iter_json_records(io.BytesIO(data), chunk_size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 65536])
+def test_reads_array_and_ndjson_across_chunks(chunk_size):
+    lines = [json.dumps(r, ensure_ascii=False).encode('utf-8') for r in RECORDS]
+    array = b'\xef\xbb\xbf [\n' + b',\n'.join(lines) + b'\n]'
+    ndjson = b''.join(line + b'\n' for line in lines)
+    assert records(array, chunk_size) == RECORDS
+    assert records(ndjson, chunk_size) == RECORDS
+    # رقم مقسوم بين قطعتين في NDJSON
+    assert records(b'12345\n678', chunk_size) == [12345, 678]
+    assert records(b'[]', chunk_size) == []
+    assert records(b'', chunk_size) == []
+
+
+@pytest.mark.parametrize('data', [b'[{"a": 1}', b'[{"a": 1} {"b": 2}]', b'{"a": 1} {"b": '])
+def test_invalid_json_raises(data):
+    with pytest.raises(ValueError):
+        records(data, 4)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'postgres'])
+def backend(request, tmp_path, monkeypatch, config):
+    config(IMPORT_BATCH_SIZE=2)
+    if request.param == 'memory':
+        backend = MemoryBackend()
+    elif request.param == 'sqlite':
+        backend = SQLiteBackend(str(tmp_path / 'quiz.db'))
+    else:
+        if not os.environ.get('TEST_DATABASE_URL'):
+            pytest.skip('TEST_DATABASE_URL is not set')
+        backend = PostgresBackend()
+    backend.ensure_schema()
+    backend.import_rows([], 'append', replace=True)
+    monkeypatch.setattr(Database, '_backend', backend)
+    QuestionCache.invalidate(publish=False)
+    yield backend
+    monkeypatch.undo()
+    QuestionCache.invalidate(publish=False)
+
+
+def numbered(items):
+    return list(enumerate(items, 1))
+
+
+def test_import_append_then_upsert(backend):
+    assert import_questions(numbered(RECORDS)) == 3
+    questions = backend.fetch_questions()
+    assert [q.question for q in questions] == [r['question'] for r in RECORDS]
+    # الأرقام تُخزن كنص، والفئة الافتراضية عند غيابها
+    assert questions[0].correct_answer == '0'
+    assert questions[1].category == 'رومانسي'
+
+    edited = dict(RECORDS[0], id=questions[0].id, question='معدل')
+    added = dict(RECORDS[1], id=questions[-1].id + 10)
+    assert import_questions(numbered([edited, added]), mode='upsert') == 2
+    assert backend.get_question(questions[0].id).question == 'معدل'
+    assert len(backend.fetch_questions()) == 4
+
+
+def test_invalid_rows_roll_back_whole_import(backend):
+    import_questions(numbered(RECORDS[:1]))
+    bad = RECORDS * 2 + [{'type': 'mcq', 'question': 'بدون خيارات'}, 'ليس كائناً']
+    with pytest.raises(ImportValidationError) as error:
+        import_questions(numbered(bad), replace=True)
+    assert [e['row'] for e in error.value.errors] == [7, 8]
+    # الدفعات الأولى كُتبت ثم أُلغيت مع الاستبدال
+    assert [q.question for q in backend.fetch_questions()] == [RECORDS[0]['question']]
+
+
+def test_upsert_requires_ids(backend):
+    with pytest.raises(ImportValidationError) as error:
+        import_questions(numbered(RECORDS[:1]), mode='upsert')
+    assert error.value.errors[0]['row'] == 1
+
+
+@pytest.fixture
+def admin(backend):
+    client = quiz_app.app.test_client()
+    with client.session_transaction() as session:
+        session['admin_authenticated'] = True
+    return client
+
+
+def test_import_and_export_routes_round_trip(admin, backend):
+    ndjson = b''.join(json.dumps(r, ensure_ascii=False).encode('utf-8') + b'\n' for r in RECORDS)
+    response = admin.post('/api/admin/import-questions?replace=1', data=ndjson)
+    assert response.get_json() == {'success': True, 'imported': 3}
+
+    response = admin.get('/api/admin/export-questions')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert [line['question'] for line in lines] == [r['question'] for r in RECORDS]
+
+    exported = admin.get('/api/admin/export-questions?format=json').data
+    assert json.loads(exported) == lines
+    # ملف التصدير يُستورد كما هو (upsert بنفس المعرفات)
+    response = admin.post('/api/admin/import-questions?mode=upsert', data=exported)
+    assert response.get_json() == {'success': True, 'imported': 3}
+    assert len(backend.fetch_questions()) == 3
+
+
+def test_import_route_reports_errors(admin, backend):
+    response = admin.post('/api/admin/import-questions', data=b'[{"type": "mcq"}]')
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['row'] == 1
+    assert admin.post('/api/admin/import-questions?mode=bad', data=b'[]').status_code == 400
+    assert admin.post('/api/admin/import-questions', data=b'[{').status_code == 400
+    assert admin.get('/api/admin/export-questions?format=csv').status_code == 400
@@ -0,0 +1,112 @@
+"""اختبارات RateLimiter و SubmissionDeduper"""
+
+from collections import OrderedDict
+
+import pytest
+
+import app as quiz_app
+from app import LRUCache, RateLimiter, SubmissionDeduper
+
+
+class Clock:
+    """ساعة يدوية بدلاً من time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(quiz_app.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(monkeypatch, clock):
+    """submit_quiz: طلبان كل 10 ثوانٍ مع دفعة 2"""
+    monkeypatch.setattr(RateLimiter, '_buckets', OrderedDict())
+    monkeypatch.setattr(RateLimiter, '_limits', RateLimiter.parse('submit_quiz=2/10:2'))
+    return RateLimiter
+
+
+@pytest.fixture
+def deduper(monkeypatch, config, clock):
+    config(SUBMIT_DEDUP_WINDOW=60)
+    monkeypatch.setattr(SubmissionDeduper, '_results', LRUCache(100))
+    return SubmissionDeduper
+
+
+def test_parse_limits():
+    limits = RateLimiter.parse('submit_quiz=30/60:10, get_quiz=120/60,stats=5')
+    assert limits == {'submit_quiz': (0.5, 10.0), 'get_quiz': (2.0, 120.0), 'stats': (5.0, 5.0)}
+
+
+def test_parse_skips_invalid_entries():
+    assert RateLimiter.parse('a=0/60,b=x/1,c=10/0,d=1/1:0.5,e,,f=1/2') == {'f': (0.5, 1.0)}
+
+
+def test_burst_then_limited_then_refilled(limiter, clock):
+    assert limiter.check('submit_quiz', '1.1.1.1') is None
+    assert limiter.check('submit_quiz', '1.1.1.1') is None
+    assert limiter.check('submit_quiz', '1.1.1.1') == pytest.approx(5.0)
+    clock.now += 2.5
+    assert limiter.check('submit_quiz', '1.1.1.1') == pytest.approx(2.5)
+    clock.now += 2.5
+    assert limiter.check('submit_quiz', '1.1.1.1') is None
+    # الدلو لا يتجاوز الدفعة مهما طال الانتظار
+    clock.now += 3600
+    assert limiter.check('submit_quiz', '1.1.1.1') is None
+    assert limiter.check('submit_quiz', '1.1.1.1') is None
+    assert limiter.check('submit_quiz', '1.1.1.1') is not None
+
+
+def test_clients_and_endpoints_are_independent(limiter):
+    for _ in range(2):
+        limiter.check('submit_quiz', '1.1.1.1')
+    assert limiter.check('submit_quiz', '1.1.1.1') is not None
+    assert limiter.check('submit_quiz', '2.2.2.2') is None
+    assert limiter.check('get_quiz', '1.1.1.1') is None
+
+
+def test_least_recent_client_evicted(limiter, config):
+    config(RATE_LIMIT_MAX_CLIENTS=2)
+    limiter.check('submit_quiz', 'a')
+    limiter.check('submit_quiz', 'b')
+    limiter.check('submit_quiz', 'a')
+    limiter.check('submit_quiz', 'c')
+    assert list(limiter._buckets) == [('submit_quiz', 'a'), ('submit_quiz', 'c')]
+
+
+def test_limited_request_gets_429(limiter):
+    client = quiz_app.app.test_client()
+    for _ in range(2):
+        assert client.post('/api/submit', json={}).status_code != 429
+    response = client.post('/api/submit', json={})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_dedup_key(deduper, config):
+    data = {'answers': {'1': 0, '2': 1}}
+    key = deduper.key('1.1.1.1', None, data)
+    assert key == deduper.key('1.1.1.1', None, {'answers': {'2': 1, '1': 0}})
+    assert key != deduper.key('2.2.2.2', None, data)
+    assert deduper.key('1.1.1.1', 'abc', data) == deduper.key('1.1.1.1', 'abc', {'answers': {}})
+    assert deduper.key('1.1.1.1', 'abc', data) != key
+    assert deduper.key(None, None, data) is None
+    config(SUBMIT_DEDUP_WINDOW=0)
+    assert deduper.key('1.1.1.1', None, data) is None
+
+
+def test_dedup_replays_within_window(deduper, clock):
+    result = ({'success': True, 'score': 3}, 200)
+    assert deduper.get('k') is None
+    deduper.put('k', result)
+    clock.now += 59
+    assert deduper.get('k') == result
+    clock.now += 2
+    assert deduper.get('k') is None
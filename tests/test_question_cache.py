@@ -0,0 +1,90 @@
+"""اختبارات QuestionCache: التحميل خارج القفل العام والإبطال أثناء التحميل"""
+
+import threading
+
+import pytest
+
+import app as quiz_app
+from app import Question, QuestionCache
+
+
+def questions(text):
+    return [Question(1, 'mcq', text, ['أ', 'ب'], '0', 'مشاعر', 1)]
+
+
+class SlowDatabase:
+    """fetch_questions_from_db يتوقف حتى يُسمح له، لمحاكاة استعلام بطيء"""
+
+    def __init__(self, text):
+        self.text = text
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.loads = 0
+
+    def fetch(self):
+        self.loads += 1
+        rows = questions(self.text)
+        self.started.set()
+        assert self.release.wait(5)
+        return rows
+
+
+@pytest.fixture
+def database(monkeypatch, config):
+    config(QUESTION_CACHE_TTL=60, QUESTION_CACHE_CHECK_INTERVAL=60, CACHE_REDIS_URL='', QUESTION_WARM_FILE='')
+    database = SlowDatabase('الأول')
+    monkeypatch.setattr(quiz_app, 'fetch_questions_from_db', database.fetch)
+    monkeypatch.setattr(QuestionCache, '_probe', staticmethod(lambda: ('token', database.text)))
+    for name, value in (('_snapshot', None), ('_db_token', None), ('_loaded_at', 0.0),
+                        ('_checked_at', 0.0), ('_stale', True), ('_warmed', True),
+                        ('external_refresh', False)):
+        monkeypatch.setattr(QuestionCache, name, value)
+    yield database
+    database.release.set()
+    QuestionCache.invalidate(publish=False)
+
+
+def reload_in_thread():
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault('value', QuestionCache.get()))
+    thread.start()
+    return thread, result
+
+
+def test_expired_snapshot_served_while_reloading(database, config):
+    QuestionCache.get()
+    config(QUESTION_CACHE_TTL=0)
+    database.text = 'الثاني'
+    database.started.clear()
+    database.release.clear()
+    thread, result = reload_in_thread()
+    assert database.started.wait(5)
+
+    # التحميل جارٍ: القراء لا ينتظرونه ولا ينتظرون _lock
+    _, snapshot = QuestionCache.get()
+    assert snapshot[0].question == 'الأول'
+    assert QuestionCache._lock.acquire(timeout=1)
+    QuestionCache._lock.release()
+
+    database.release.set()
+    thread.join(5)
+    assert result['value'][1][0].question == 'الثاني'
+    assert database.loads == 2
+
+
+def test_invalidate_during_reload_keeps_snapshot_stale(database):
+    database.release.clear()
+    thread, result = reload_in_thread()
+    assert database.started.wait(5)
+    # كتابة بعد قراءة البصمة والأسئلة: التحميل الجاري لا يحتويها
+    database.text = 'بعد الكتابة'
+    QuestionCache.invalidate(publish=False)
+    database.release.set()
+    thread.join(5)
+    assert result['value'][1][0].question == 'الأول'
+    assert QuestionCache._stale
+
+    _, snapshot = QuestionCache.get()
+    assert snapshot[0].question == 'بعد الكتابة'
+    assert database.loads == 2
@@ -0,0 +1,86 @@
+"""اختبارات QuizAssembler: التوزيع على الفئات ورموز الاختبار"""
+
+from collections import Counter
+
+import pytest
+
+import app as quiz_app
+from app import Question, QuizAssembler, quiz_serializer
+
+QUESTIONS = [
+    Question(q_id, 'mcq', f'س{q_id}', ['أ', 'ب'], '0', category)
+    for q_id, category in enumerate(['مشاعر'] * 6 + ['معتقدات'] * 3 + ['مستقبل'] * 1, 1)
+]
+
+
+@pytest.fixture
+def questions(monkeypatch):
+    by_category = {}
+    for q in QUESTIONS:
+        by_category.setdefault(q.category, []).append(q.id)
+    state = ({c: tuple(ids) for c, ids in by_category.items()}, {q.id: q for q in QUESTIONS})
+    monkeypatch.setattr(QuizAssembler, 'get_state', staticmethod(lambda: state))
+    return QUESTIONS
+
+
+def test_allocate_is_proportional_and_exact():
+    counts = {'مشاعر': 6, 'معتقدات': 3, 'مستقبل': 1}
+    for size in range(1, 11):
+        quotas = QuizAssembler.allocate(size, counts)
+        assert sum(quotas.values()) == size
+        assert all(0 <= quotas[c] <= counts[c] for c in counts)
+    assert QuizAssembler.allocate(5, counts)['مشاعر'] == 3
+    assert QuizAssembler.allocate(50, counts) == counts
+
+
+def test_assemble_samples_without_repeats(questions):
+    quiz = QuizAssembler.assemble(5)
+    assert len(quiz) == len({q.id for q in quiz}) == 5
+    assert Counter(q.category for q in quiz)['مشاعر'] == 3
+    assert len(QuizAssembler.assemble(100)) == len(questions)
+
+
+def test_assemble_filters_categories(questions):
+    quiz = QuizAssembler.assemble(10, ['معتقدات', 'مستقبل'])
+    assert sorted(q.id for q in quiz) == [7, 8, 9, 10]
+    assert QuizAssembler.assemble(10, ['غير موجودة']) == []
+
+
+def test_token_round_trip(questions):
+    quiz = QuizAssembler.assemble(4)
+    assert QuizAssembler.read_token(QuizAssembler.issue_token(quiz)) == {q.id for q in quiz}
+
+
+def test_expired_token_rejected(questions, config):
+    token = QuizAssembler.issue_token(questions[:2])
+    config(QUIZ_TOKEN_MAX_AGE=-1)
+    with pytest.raises(ValueError, match='انتهت صلاحية'):
+        QuizAssembler.read_token(token)
+
+
+@pytest.mark.parametrize('token', [
+    'not-a-token',
+    quiz_serializer.dumps([1, 2]) + 'x',
+    quiz_serializer.dumps({'ids': [1]}),
+    quiz_serializer.dumps(['1', 2])
+], ids=['garbage', 'tampered', 'not-a-list', 'not-ints'])
+def test_invalid_token_rejected(token):
+    with pytest.raises(ValueError, match='غير صالح'):
+        QuizAssembler.read_token(token)
+
+
+def test_submit_scores_only_questions_in_token():
+    client = quiz_app.app.test_client()
+    response = client.get('/api/quiz?size=3')
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    quiz = response.get_json()
+    assert len(quiz['questions']) == 3
+
+    first = quiz['questions'][0]
+    answers = {str(q.id): q.correct_answer for q in quiz_app.load_questions()}
+    result = client.post('/api/submit', json={'answers': answers, 'quiz_token': quiz['quiz_token']}).get_json()
+    assert (result['score'], result['total']) == (3, 3)
+
+    bad = client.post('/api/submit', json={'answers': {str(first['id']): 0}, 'quiz_token': 'x'})
+    assert bad.status_code == 400
@@ -0,0 +1,109 @@
+"""اختبارات ScoreHistogram ودورة Ranking: record ثم sync ثم اللقطة"""
+
+from datetime import timedelta
+
+import pytest
+
+from app import Database, Ranking, ScoreHistogram, SQLiteBackend, utc_now
+
+
+@pytest.fixture
+def storage(config, tmp_path, monkeypatch):
+    """ترتيب مع حفظ الإرسالات على SQLite مؤقت، بدون خيط المزامنة"""
+    path = str(tmp_path / 'quiz.db')
+    config(
+        STORAGE_BACKEND='sqlite', SQLITE_PATH=path, PERSIST_SUBMISSIONS=True,
+        RANKING_SETTLE_SECONDS=0, RANKING_SNAPSHOT_PATH=str(tmp_path / 'ranking.json')
+    )
+    backend = SQLiteBackend(path)
+    backend.ensure_schema()
+    monkeypatch.setattr(Database, '_backend', backend)
+    Ranking.reset()
+    monkeypatch.setattr(Ranking, '_started', True)
+    yield backend
+    Ranking.reset()
+
+
+def write_attempts(backend, scores, total=10, submitted_at=None):
+    submitted_at = submitted_at or utc_now() - timedelta(seconds=1)
+    attempts = [
+        (f'attempt-{submitted_at.timestamp()}-{i}', submitted_at, score, total, score / total * 100)
+        for i, score in enumerate(scores)
+    ]
+    backend.write_submissions(attempts, [], {}, {})
+
+
+def test_histogram_counts_and_below():
+    histogram = ScoreHistogram(5)
+    for score in (0, 2, 2, 5):
+        histogram.add(score)
+    assert histogram.count == 4
+    assert histogram.counts() == [1, 0, 2, 0, 0, 1]
+    assert histogram.below(0) == 0
+    assert histogram.below(3) == 3
+    assert histogram.below(100) == 4
+    with pytest.raises(ValueError):
+        histogram.add(6)
+    with pytest.raises(ValueError):
+        histogram.add(-1)
+
+
+def test_not_ready_before_first_sync(storage):
+    assert Ranking.record(5, 10, utc_now()) == {'percentile': None, 'rank': None, 'players': None}
+
+
+def test_sync_adds_database_attempts_without_double_counting(storage):
+    # إرسال محلي دخل طابور الحفظ ثم وصل للقاعدة
+    submitted_at = utc_now() - timedelta(seconds=1)
+    Ranking.record(7, 10, submitted_at)
+    write_attempts(storage, [7], submitted_at=submitted_at)
+    # محاولات العمال الآخرين
+    write_attempts(storage, [2, 4, 9])
+
+    assert Ranking.sync() == 4
+    assert Ranking._histograms[10].counts()[:10] == [0, 0, 1, 0, 1, 0, 0, 1, 0, 1]
+    assert Ranking.stats()['pending'] == 0
+    # لا شيء جديد في القاعدة
+    assert Ranking.sync() == 0
+    assert Ranking._histograms[10].count == 4
+
+    result = Ranking.record(8, 10, utc_now())
+    assert result == {'percentile': 75.0, 'rank': 2, 'players': 5}
+
+
+def test_unstored_submission_ranked_but_not_added(storage):
+    Ranking.sync()
+    Ranking.record(5, 10, utc_now(), stored=False)
+    assert Ranking.stats()['players'] == 0
+    assert Ranking.stats()['pending'] == 0
+
+
+def test_score_clamped_to_total(storage):
+    Ranking.sync()
+    assert Ranking.record(15, 10, utc_now())['rank'] == 1
+    assert Ranking.record(-3, 10, utc_now())['rank'] == 2
+    assert Ranking._histograms[10].counts() == [1] + [0] * 9 + [1]
+
+
+def test_snapshot_round_trip_excludes_pending(storage):
+    assert Ranking.save_snapshot() is False    # قبل أول مزامنة
+    write_attempts(storage, [3, 3, 6])
+    Ranking.sync()
+    # إرسال محلي لم يُزامن بعد لا يدخل اللقطة
+    Ranking.record(1, 10, utc_now() + timedelta(seconds=60))
+    assert Ranking.save_snapshot() is True
+    synced_until = Ranking._synced_until
+
+    Ranking._histograms = {}
+    Ranking._ready = False
+    assert Ranking.load_snapshot() is True
+    assert Ranking._synced_until == synced_until
+    assert Ranking._histograms[10].counts()[:7] == [0, 0, 0, 2, 0, 0, 1]
+
+
+def test_snapshot_from_other_database_ignored(storage, config, tmp_path):
+    write_attempts(storage, [3])
+    Ranking.sync()
+    assert Ranking.save_snapshot() is True
+    config(SQLITE_PATH=str(tmp_path / 'other.db'))
+    assert Ranking.load_snapshot() is False
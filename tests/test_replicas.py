@@ -0,0 +1,139 @@
+"""اختبارات ReplicaRouter: التوجيه بالتناوب والرجوع للأساسي، بـ pools وهمية بدلاً من Postgres"""
+
+import time
+
+import pytest
+
+import app as quiz_app
+from app import Database, Replica, ReplicaRouter
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+
+class FakeCursor:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.pool.down:
+            raise psycopg2.OperationalError(f'{self.pool.name} is down')
+        self.pool.queries.append(query)
+
+    def fetchall(self):
+        return [{'served_by': self.pool.name}]
+
+    def fetchone(self):
+        return (self.pool.name,)
+
+    rowcount = 1
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self.pool)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    """pool يسجل الاستعلامات، و down=True يحاكي خادماً متوقفاً"""
+
+    def __init__(self, name, down=False):
+        self.name = name
+        self.down = down
+        self.queries = []
+        self.out = 0
+
+    def getconn(self):
+        self.out += 1
+        return FakeConnection(self)
+
+    def putconn(self, conn):
+        self.out -= 1
+
+    def stats(self):
+        return {'in_use': self.out}
+
+
+@pytest.fixture
+def router(monkeypatch, config):
+    """أساسي ونسختان سليمتان فُحصتا للتو"""
+    quiz_app.load_psycopg2()
+    urls = ['postgresql://replica-a/quiz', 'postgresql://replica-b/quiz']
+    config(DATABASE_REPLICA_URLS=urls, REPLICA_CHECK_INTERVAL=60, DB_PREPARED_STATEMENTS=False)
+    primary = FakePool('primary')
+    replicas = []
+    for url in urls:
+        replica = Replica(url)
+        replica.pool = FakePool(replica.name)
+        replica.healthy = True
+        replica.checked_at = time.monotonic()
+        replicas.append(replica)
+    monkeypatch.setattr(Database, '_connection_pool', primary)
+    monkeypatch.setattr(ReplicaRouter, '_replicas', replicas)
+    monkeypatch.setattr(ReplicaRouter, '_next', 0)
+    monkeypatch.setattr(ReplicaRouter, '_primary_until', 0.0)
+    monkeypatch.setattr(ReplicaRouter, 'primary_reads', 0)
+    monkeypatch.setattr(ReplicaRouter, 'replica_reads', 0)
+    return primary, replicas
+
+
+def served_by(rows):
+    return rows[0]['served_by']
+
+
+def test_reads_alternate_between_healthy_replicas(router):
+    primary, (a, b) = router
+    names = [served_by(Database.execute_query('SELECT 1', fetch=True, readonly=True)) for _ in range(4)]
+    assert names == [a.name, b.name, a.name, b.name]
+    assert primary.queries == []
+    assert ReplicaRouter.stats()['replica_reads'] == 4
+
+
+def test_writes_and_unhealthy_replicas_use_primary(router):
+    primary, (a, b) = router
+    assert Database.execute_query('UPDATE questions SET id = id') is True
+    b.healthy = False
+    assert served_by(Database.execute_query('SELECT 1', fetch=True, readonly=True)) == a.name
+    a.healthy = False
+    assert served_by(Database.execute_query('SELECT 1', fetch=True, readonly=True)) == 'primary'
+    assert len(primary.queries) == 2
+
+
+@pytest.mark.parametrize('execute', [
+    lambda: served_by(Database.execute_query('SELECT 1', fetch=True, readonly=True)),
+    lambda: Database.execute_prepared('probe', 'SELECT 1', fetch='one', readonly=True)[0]
+], ids=['execute_query', 'execute_prepared'])
+def test_failed_replica_marked_and_read_retried_on_primary(router, execute):
+    primary, (a, b) = router
+    a.pool.down = True
+    assert execute() == 'primary'
+    assert not a.healthy
+    assert a.failures == 1
+    assert a.pool.out == 0
+    # النسخة مستبعدة حتى الفحص التالي
+    assert execute() == b.name
+    assert execute() == b.name
+
+
+def test_primary_failure_is_not_retried(router):
+    primary, _ = router
+    primary.down = True
+    with pytest.raises(psycopg2.OperationalError):
+        Database.execute_query('UPDATE questions SET id = id')
+    assert primary.out == 0
@@ -0,0 +1,67 @@
+"""اختبارات ScoringEngine.score"""
+
+import pytest
+
+from app import Question, ScoringEngine
+
+QUESTIONS = [
+    Question(1, 'mcq', 'س1', ['أ', 'ب', 'ج'], 0, 'مشاعر'),
+    Question(2, 'mcq', 'س2', ['أ', 'ب', 'ج'], 2, 'مشاعر'),
+    Question(3, 'tf', 'س3', ['صح', 'خطأ'], 'صح', 'معتقدات'),
+    Question(4, 'mcq', 'س4', ['أ', 'ب'], '1', 'معتقدات')
+]
+
+
+@pytest.fixture
+def index():
+    return ScoringEngine.build_index(QUESTIONS)
+
+
+def score(index, answers, **kwargs):
+    return ScoringEngine.score(answers, index, len(QUESTIONS), **kwargs)
+
+
+def test_counts_correct_answers(index):
+    result = score(index, {'1': 0, '2': 1, '3': 'صح', '4': 1})
+    assert result == {'score': 3, 'total': 4, 'percentage': 75.0}
+
+
+def test_numeric_answers_match_as_int_or_string(index):
+    assert score(index, {'1': '0', '2': 2.0, '4': '1'})['score'] == 3
+    assert score(index, {1: 0, 2: '2'})['score'] == 2
+
+
+def test_text_answer_compared_as_string(index):
+    assert score(index, {'3': 'صح'})['score'] == 1
+    assert score(index, {'3': 'خطأ'})['score'] == 0
+
+
+def test_empty_and_unknown_ids(index):
+    assert score(index, {}) == {'score': 0, 'total': 4, 'percentage': 0.0}
+    assert score(index, {'99': 0, '1': 0})['score'] == 1
+
+
+def test_non_numeric_id_raises(index):
+    with pytest.raises(ValueError):
+        score(index, {'abc': 0})
+
+
+def test_same_question_under_two_keys_scored_once(index):
+    # الإجابة الأولى هي المعتمدة
+    assert score(index, {'1': 0, '01': 0, '001': 0})['score'] == 1
+    assert score(index, {'01': 2, '1': 0})['score'] == 0
+
+
+def test_allowed_restricts_questions(index):
+    result = score(index, {'1': 0, '2': 2}, allowed={2})
+    assert result['score'] == 1
+
+
+def test_details_one_entry_per_question(index):
+    details = []
+    score(index, {'1': 0, '01': 1, '2': 0}, details=details)
+    assert details == [(1, 0, True), (2, 0, False)]
+
+
+def test_zero_total():
+    assert ScoringEngine.score({'1': 0}, {}, 0) == {'score': 0, 'total': 0, 'percentage': 0}
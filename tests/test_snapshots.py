@@ -0,0 +1,105 @@
+"""اختبارات SnapshotPublisher: ملفات الإصدار والمؤشر، التقليم، النشر في الخلفية والتحويل من /api/questions"""
+
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app as quiz_app
+from app import Database, MemoryBackend, QuestionCache, SnapshotPublisher, get_questions_payload
+
+FIELDS = [
+    ('mcq', f'سؤال {n}', ['أ', 'ب'], '0', category)
+    for n, category in enumerate(['مشاعر'] * 7 + ['معتقدات'] * 4, 1)
+]
+
+
+@pytest.fixture
+def backend(monkeypatch, config, tmp_path):
+    config(SNAPSHOT_DIR=str(tmp_path / 'snapshots'), SNAPSHOT_PAGE_SIZE=5, SNAPSHOT_KEEP=2, SNAPSHOT_URL_PREFIX='')
+    os.makedirs(quiz_app.Config.SNAPSHOT_DIR)
+    backend = MemoryBackend()
+    for fields in FIELDS:
+        backend.insert_question(fields)
+    monkeypatch.setattr(Database, '_backend', backend)
+    monkeypatch.setattr(SnapshotPublisher, '_published', set())
+    QuestionCache.invalidate(publish=False)
+    yield backend
+    SnapshotPublisher.stop()
+    monkeypatch.undo()
+    QuestionCache.invalidate(publish=False)
+
+
+def read(*parts):
+    with open(os.path.join(quiz_app.Config.SNAPSHOT_DIR, *parts), 'rb') as f:
+        return f.read()
+
+
+def pointer():
+    return json.loads(read(SnapshotPublisher.POINTER))
+
+
+def test_publish_writes_version_files_and_pointer(backend):
+    version = SnapshotPublisher.publish()
+    # نفس بصمة حمولة /api/questions
+    assert version == SnapshotPublisher.version_of(get_questions_payload())
+    assert read(version, 'questions.json') == get_questions_payload().body
+    assert gzip.decompress(read(version, 'questions.json.gz')) == read(version, 'questions.json')
+
+    current = pointer()
+    assert (current['version'], current['total'], current['pages']) == (version, 11, 3)
+    assert current['questions'] == f'{version}/questions.json'
+    published_at = datetime.fromisoformat(current['published_at'].replace('Z', '+00:00'))
+    assert abs(datetime.now(timezone.utc) - published_at) < timedelta(minutes=1)
+
+    categories = json.loads(read(version, 'categories.json'))
+    assert sorted((c['name'], c['count']) for c in categories) == [('مشاعر', 7), ('معتقدات', 4)]
+    assert len(json.loads(read(version, categories[1]['file']))) == categories[1]['count']
+
+    last_page = json.loads(read(version, 'page-3.json'))
+    assert (last_page['page'], last_page['pages'], last_page['total']) == (3, 3, 11)
+    assert [q['question'] for q in last_page['questions']] == ['سؤال 11']
+
+
+def test_republish_same_content_keeps_version(backend):
+    version = SnapshotPublisher.publish()
+    mtime = os.stat(os.path.join(quiz_app.Config.SNAPSHOT_DIR, version, 'questions.json')).st_mtime_ns
+    assert SnapshotPublisher.publish() == version
+    assert os.stat(os.path.join(quiz_app.Config.SNAPSHOT_DIR, version, 'questions.json')).st_mtime_ns == mtime
+    assert not [name for name in os.listdir(quiz_app.Config.SNAPSHOT_DIR) if name.endswith('.tmp')]
+
+
+def test_old_versions_pruned(backend):
+    versions = []
+    for n in range(4):
+        backend.update_question(1, (None, f'تعديل {n}', None, None, None))
+        versions.append(SnapshotPublisher.publish())
+        # ترتيب التقليم بوقت التعديل؛ نثبته حتى لا تتساوى الأوقات على أنظمة الملفات الخشنة
+        os.utime(os.path.join(quiz_app.Config.SNAPSHOT_DIR, versions[-1]), (1000 + n, 1000 + n))
+    kept = sorted(name for name in os.listdir(quiz_app.Config.SNAPSHOT_DIR) if name != SnapshotPublisher.POINTER)
+    assert kept == sorted(versions[-2:])
+    assert pointer()['version'] == versions[-1]
+
+
+def test_writes_publish_in_background(backend):
+    admin = quiz_app.app.test_client()
+    with admin.session_transaction() as session:
+        session['admin_authenticated'] = True
+    response = admin.put('/api/admin/update-question/1', json={'question': 'بعد النشر'})
+    assert response.status_code == 200
+    SnapshotPublisher.stop()
+    assert 'بعد النشر'.encode('utf-8') in read(pointer()['questions'])
+    assert SnapshotPublisher.stats()['version'] == pointer()['version']
+
+
+def test_questions_redirect_to_published_snapshot(backend, config):
+    client = quiz_app.app.test_client()
+    config(SNAPSHOT_URL_PREFIX='https://cdn.example.com/quiz/')
+    # لم يُنشر هذا المحتوى بعد: الحمولة من التطبيق
+    assert client.get('/api/questions').status_code == 200
+    version = SnapshotPublisher.publish()
+    response = client.get('/api/questions')
+    assert response.status_code == 307
+    assert response.headers['Location'] == f'https://cdn.example.com/quiz/{version}/questions.json'